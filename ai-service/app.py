@@ -1,13 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, send_file, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import cv2
+import numpy as np
 import os
+import time
+import uuid
 import logging
 from logging.handlers import RotatingFileHandler
 
+from pose_analysis.frame_store import EXPORT_MIMETYPES
+from pose_analysis.lane_analyzer import parse_lanes
 from pose_analysis.pose_analyzer import PoseAnalyzer
+from pose_analysis.shot_consistency import collect_shots
+from target_analysis.session_grouping import collect_impacts
 from target_analysis.target_analyzer import TargetAnalyzer
+from utils.admission import AdmissionController
 from utils.error_handler import error_handler, APIError
+from utils import metrics, serialization, thread_budget
+from utils.profiling import RequestProfiler
+from utils.result_cache import ResultCache
 
 # 加载环境变量
 load_dotenv()
@@ -33,6 +45,98 @@ app.logger.info('AI服务启动')
 pose_analyzer = PoseAnalyzer()
 target_analyzer = TargetAnalyzer()
 
+# 箭靶分析结果缓存（客户端重试和重复上传时直接返回）
+target_cache = ResultCache.from_env('target')
+
+# 准入控制：按优先级分配执行槽位，过载时快速返回503
+admission = AdmissionController.from_env()
+
+# 按需请求剖析（管理员请求头或抽样触发）
+profiler = RequestProfiler.from_env()
+
+# 是否在响应中附带 Server-Timing 头：always 总是附带，request 仅当请求头 X-Server-Timing 为1时附带
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'request')
+
+@app.before_request
+def start_request_metrics():
+    """开始记录请求耗时"""
+    g.request_start = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    metrics.begin_request(
+        SERVER_TIMING == 'always'
+        or (SERVER_TIMING == 'request' and request.headers.get('X-Server-Timing') == '1')
+    )
+
+@app.after_request
+def finish_request_metrics(response):
+    """记录请求耗时并附加 Server-Timing 头"""
+    if request.endpoint and request.endpoint != 'metrics_endpoint':
+        metrics.observe_request(
+            request.endpoint, response.status_code,
+            time.perf_counter() - g.get('request_start', time.perf_counter())
+        )
+    header = metrics.server_timing_header()
+    if header:
+        response.headers['Server-Timing'] = header
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    if g.get('profile_id'):
+        response.headers['X-Profile-Id'] = g.profile_id
+    return response
+
+def request_timeout():
+    """客户端通过 X-Request-Timeout 头（秒）指定的排队期限"""
+    return request.headers.get('X-Request-Timeout', type=float)
+
+def run_analysis(label, analyze, *args):
+    """执行分析器调用，按需进行CPU/内存剖析"""
+    modes = profiler.requested_modes(request.headers)
+    with profiler.profile(g.request_id, label, modes) as profile_id:
+        result = analyze(*args)
+    if profile_id:
+        g.profile_id = profile_id
+    return result
+
+def admitted_analysis(priority, label, analyze, *args):
+    """获得执行槽位后执行分析，缓存命中等无需计算的请求不占用槽位"""
+    with admission.admit(priority, request_timeout()):
+        return run_analysis(label, analyze, *args)
+
+def analysis_response(result):
+    """序列化分析结果，客户端可通过 Accept 头请求 msgpack 二进制格式"""
+    mimetype = serialization.negotiate(request.accept_mimetypes)
+    pretty = app.config.get('JSONIFY_PRETTYPRINT_REGULAR') or app.debug
+    with metrics.stage('app', 'serialize'):
+        body = serialization.serialize(result, mimetype, pretty)
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def stream_events(label, events):
+    """将分析事件逐行编码为NDJSON，出错时以 error 事件结束"""
+    try:
+        for event in events:
+            yield serialization.dumps_ndjson(event)
+    except Exception as e:
+        app.logger.error(f'{label}失败: {str(e)}')
+        yield serialization.dumps_ndjson({'event': 'error', 'message': f'{label}失败'})
+
+def stream_response(label, events, ticket):
+    """NDJSON流式响应，逐帧结果计算完成即发送，响应结束（含客户端断开）后归还执行槽位"""
+    response = Response(
+        stream_with_context(stream_events(label, events)),
+        mimetype=serialization.NDJSON_MIMETYPE
+    )
+    response.call_on_close(lambda: admission.release(ticket))
+    # 禁止反向代理缓冲，保证逐行到达客户端
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus指标接口"""
+    data, content_type = metrics.render_metrics()
+    return Response(data, content_type=content_type)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -41,7 +145,12 @@ def health_check():
         'services': {
             'pose_analysis': pose_analyzer.is_ready(),
             'target_analysis': target_analyzer.is_ready()
-        }
+        },
+        'models': {
+            'pose': {'version': pose_analyzer.models.version, 'shadow': pose_analyzer.models.shadow_version},
+            'target': {'version': target_analyzer.models.version, 'shadow': target_analyzer.models.shadow_version}
+        },
+        'threads': thread_budget.current().to_dict() if thread_budget.current() else None
     })
 
 @app.route('/analyze/pose', methods=['POST'])
@@ -58,16 +167,41 @@ def analyze_pose():
     params = {
         'extract_frames': request.form.get('extract_frames', 'true').lower() == 'true',
         'frame_rate': int(request.form.get('frame_rate', 30)),
-        'save_keyframes': request.form.get('save_keyframes', 'true').lower() == 'true'
+        'save_keyframes': request.form.get('save_keyframes', 'true').lower() == 'true',
+        'tracking': request.form.get('tracking', 'full'),  # full: 逐帧推理, keyframe: 锚帧推理+光流传播
+        'anchor_interval': int(request.form.get('anchor_interval', 10)),
+        'deadline': request.form.get('deadline', type=float),  # 限时（秒），到期返回已分析部分的结果
+        'frame_format': request.form.get('frame_format', 'records')  # records: 逐帧字典列表, columnar: 列式数组
     }
     
+    # 排队期限不超过分析限时，排队消耗的时间从限时中扣除
+    timeout = request_timeout()
+    if params['deadline']:
+        timeout = min(timeout, params['deadline']) if timeout is not None else params['deadline']
+    ticket = admission.acquire('video', timeout)
+    if params['deadline']:
+        params['deadline'] -= ticket.waited
+    
+    # 流式模式：逐帧以NDJSON返回分数和角度，最后返回总体分析和建议
+    if (request.form.get('stream', 'false').lower() == 'true'
+            or serialization.wants_ndjson(request.accept_mimetypes)):
+        try:
+            events = pose_analyzer.iter_video_analysis(video, params)
+        except Exception as e:
+            admission.release(ticket)
+            app.logger.error(f'姿态分析失败: {str(e)}')
+            raise APIError('姿态分析失败', 500)
+        return stream_response('姿态分析', events, ticket)
+    
     try:
         # 执行姿态分析
-        result = pose_analyzer.analyze_video(video, params)
-        return jsonify(result)
+        result = run_analysis('pose', pose_analyzer.analyze_video, video, params)
+        return analysis_response(result)
     except Exception as e:
         app.logger.error(f'姿态分析失败: {str(e)}')
         raise APIError('姿态分析失败', 500)
+    finally:
+        admission.release(ticket)
 
 @app.route('/analyze/target', methods=['POST'])
 def analyze_target():
@@ -88,12 +222,49 @@ def analyze_target():
     
     try:
         # 执行箭靶分析
-        result = target_analyzer.analyze_image(image, params)
-        return jsonify(result)
+        image_data = image.stream.read()
+        image.stream.seek(0)
+        # 键包含模型版本，热更新、发布或回滚后不再返回旧模型的检测结果
+        cache_key = target_cache.make_key(image_data, params, namespace=target_analyzer.models.version or '')
+        result, source = target_cache.get_or_compute(
+            cache_key,
+            lambda: admitted_analysis('target', 'target', target_analyzer.analyze_image, image, params)
+        )
+        response = analysis_response(result)
+        response.headers['X-Cache'] = 'miss' if source == 'computed' else 'hit'
+        return response
+    except APIError:
+        raise
     except Exception as e:
         app.logger.error(f'箭靶分析失败: {str(e)}')
         raise APIError('箭靶分析失败', 500)
 
+@app.route('/analyze/target/session', methods=['POST'])
+def analyze_target_session():
+    """训练箭群统计接口：每组（end）调用一次，增量更新整个训练的箭群统计"""
+    # JSON请求体：impacts 为本组的靶面归一化落点，或 analysis 为本组的箭靶分析结果；state 为上一组返回的状态
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise APIError('请求体应为JSON对象', 400)
+    
+    try:
+        points = collect_impacts(body.get('impacts'), body.get('analysis'))
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f'落点数据无效: {str(e)}', 400)
+    
+    try:
+        result = admitted_analysis(
+            'target', 'target_session', target_analyzer.analyze_session_end, points, body.get('state')
+        )
+        return analysis_response(result)
+    except APIError:
+        raise
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f'箭群状态无效: {str(e)}', 400)
+    except Exception as e:
+        app.logger.error(f'箭群统计失败: {str(e)}')
+        raise APIError('箭群统计失败', 500)
+
 @app.route('/analyze/realtime', methods=['POST'])
 def analyze_realtime():
     """实时分析接口"""
@@ -106,19 +277,112 @@ def analyze_realtime():
     
     analysis_type = request.form.get('type', 'pose')
     
+    if analysis_type == 'pose':
+        analyze = pose_analyzer.analyze_frame
+    elif analysis_type == 'target':
+        analyze = target_analyzer.analyze_frame
+    else:
+        raise APIError('不支持的分析类型', 400)
+    
     try:
-        if analysis_type == 'pose':
-            result = pose_analyzer.analyze_frame(frame)
-        elif analysis_type == 'target':
-            result = target_analyzer.analyze_frame(frame)
-        else:
-            raise APIError('不支持的分析类型', 400)
-        
-        return jsonify(result)
+        result = admitted_analysis('realtime', f'realtime_{analysis_type}', analyze, frame)
+        return analysis_response(result)
+    except APIError:
+        raise
     except Exception as e:
         app.logger.error(f'实时分析失败: {str(e)}')
         raise APIError('实时分析失败', 500)
 
+@app.route('/analyze/lanes', methods=['POST'])
+def analyze_lanes():
+    """多人泳道分析接口：一帧画面中多条射箭道的射手分别评分"""
+    if 'frame' not in request.files:
+        raise APIError('未找到帧图像', 400)
+    
+    frame = request.files['frame']
+    if not frame.filename:
+        raise APIError('未选择文件', 400)
+    
+    try:
+        lanes = parse_lanes(request.form.get('lanes'))
+    except (ValueError, TypeError) as e:
+        raise APIError(f'泳道配置无效: {str(e)}', 400)
+    
+    with metrics.stage('pose', 'decode'):
+        image = cv2.imdecode(np.frombuffer(frame.read(), np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise APIError('无法解码帧图像', 400)
+    
+    try:
+        result = admitted_analysis('realtime', 'lanes', pose_analyzer.analyze_lanes, image, lanes)
+        return analysis_response(result)
+    except APIError:
+        raise
+    except ValueError as e:
+        raise APIError(str(e), 400)
+    except Exception as e:
+        app.logger.error(f'泳道分析失败: {str(e)}')
+        raise APIError('泳道分析失败', 500)
+
+@app.route('/analyze/consistency', methods=['POST'])
+def analyze_consistency():
+    """多射次一致性比较接口"""
+    # JSON请求体：shots 为各射次的关节角度序列，analyses 为带逐帧角度序列的姿态分析结果，phases 可覆盖动作阶段划分
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise APIError('请求体应为JSON对象', 400)
+    
+    try:
+        shots = collect_shots(body.get('shots'), body.get('analyses'))
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f'射次数据无效: {str(e)}', 400)
+    
+    try:
+        result = admitted_analysis(
+            'video', 'consistency', pose_analyzer.analyze_consistency, shots, body.get('phases')
+        )
+        return analysis_response(result)
+    except APIError:
+        raise
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(str(e), 400)
+    except Exception as e:
+        app.logger.error(f'一致性分析失败: {str(e)}')
+        raise APIError('一致性分析失败', 500)
+
+@app.route('/analyses/export', methods=['GET'])
+@app.route('/analyses/<analysis_id>/export', methods=['GET'])
+def export_analyses(analysis_id=None):
+    """导出逐帧分析结果：format 为 arrow（Arrow IPC 文件）或 parquet，ids 为逗号分隔的分析ID，省略时导出全部"""
+    store = pose_analyzer.store
+    if store is None:
+        raise APIError('未启用分析结果存储', 404)
+    
+    fmt = request.args.get('format', 'arrow')
+    if fmt not in EXPORT_MIMETYPES:
+        raise APIError('不支持的导出格式', 400)
+    if analysis_id is not None:
+        analysis_ids = [analysis_id]
+    else:
+        analysis_ids = [i for i in request.args.get('ids', '').split(',') if i] or store.ids()
+    
+    # 整个赛季的数据可能较大，先写入临时文件再发送，文件在响应结束后关闭并删除
+    try:
+        with metrics.stage('app', 'export'):
+            output = store.export_file(analysis_ids, fmt)
+    except KeyError as e:
+        raise APIError(e.args[0], 404)
+    except ValueError as e:
+        raise APIError(str(e), 400)
+    except ImportError as e:
+        raise APIError(str(e), 501)
+    except Exception as e:
+        app.logger.error(f'导出分析结果失败: {str(e)}')
+        raise APIError('导出分析结果失败', 500)
+    
+    return send_file(output, mimetype=EXPORT_MIMETYPES[fmt], as_attachment=True,
+                     download_name=f'{analysis_id or "analyses"}.{fmt}')
+
 # 注册错误处理器
 app.register_error_handler(APIError, error_handler)
 
@@ -0,0 +1,453 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import synthetic
+from utils import thread_budget
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+# 回归判定容差：延迟/内存上升或帧率下降超过该比例即视为回归
+DEFAULT_TOLERANCE = {
+    'p95_ms': 0.15,
+    'fps': 0.15,
+    'peak_rss_mb': 0.10
+}
+
+
+class UploadedFile:
+    """模拟 werkzeug 上传文件对象，提供 save() 和 stream"""
+
+    def __init__(self, data, filename):
+        self.data = data
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+
+def _pose_analyzer():
+    from pose_analysis.pose_analyzer import PoseAnalyzer
+    return PoseAnalyzer()
+
+
+def _target_analyzer():
+    from target_analysis.target_analyzer import TargetAnalyzer
+    return TargetAnalyzer()
+
+
+def _encode_image(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+# 各基准用例：setup(data_dir) 返回 (run函数, 每次运行处理的帧/图片数)；返回None表示跳过
+def setup_pose_analyze_frame(data_dir):
+    analyzer = _pose_analyzer()
+    frames = [synthetic.make_pose_frame(seed=i, t=i) for i in range(16)]
+    state = {'i': 0}
+
+    def run():
+        frame = frames[state['i'] % len(frames)]
+        state['i'] += 1
+        analyzer.analyze_frame(frame)
+    return run, 1
+
+
+def _setup_pose_video(data_dir, params):
+    analyzer = _pose_analyzer()
+    video_path = data_dir / 'pose.mp4'
+    upload = UploadedFile(video_path.read_bytes(), 'pose.mp4')
+    frames = int(np.ceil(90 / max(1, 30 // params['frame_rate'])))
+
+    def run():
+        analyzer.analyze_video(upload, params)
+    return run, frames
+
+
+def setup_pose_analyze_video(data_dir):
+    return _setup_pose_video(data_dir, {
+        'extract_frames': True, 'frame_rate': 30, 'save_keyframes': False
+    })
+
+
+def setup_pose_analyze_video_keyframe(data_dir):
+    return _setup_pose_video(data_dir, {
+        'extract_frames': True, 'frame_rate': 30, 'save_keyframes': False,
+        'tracking': 'keyframe', 'anchor_interval': 10
+    })
+
+
+def setup_target_analyze_image(data_dir):
+    analyzer = _target_analyzer()
+    if not analyzer.is_ready():
+        return None
+    data = (data_dir / 'target.jpg').read_bytes()
+    params = {'distance': 18, 'target_type': 'standard', 'detect_arrows': True}
+
+    def run():
+        analyzer.analyze_image(UploadedFile(data, 'target.jpg'), params)
+    return run, 1
+
+
+def setup_target_analyze_frame(data_dir):
+    analyzer = _target_analyzer()
+    if not analyzer.is_ready():
+        return None
+    data = (data_dir / 'target.jpg').read_bytes()
+
+    def run():
+        analyzer.analyze_frame(UploadedFile(data, 'target.jpg'))
+    return run, 1
+
+
+def setup_pose_aggregation(data_dir):
+    analyzer = _pose_analyzer()
+    frame_scores = synthetic.make_frame_scores(seed=0, num_frames=900)
+
+    def run():
+        analysis = analyzer._calculate_overall_analysis(frame_scores)
+        analyzer._generate_recommendations(analysis)
+    return run, len(frame_scores)
+
+
+def setup_pose_consistency(data_dir):
+    analyzer = _pose_analyzer()
+    shots = synthetic.make_shot_angles(seed=0, num_shots=300)
+
+    def run():
+        analyzer.analyze_consistency(shots)
+    return run, len(shots)
+
+
+def setup_target_aggregation(data_dir):
+    analyzer = _target_analyzer()
+    config = analyzer.target_configs['standard']
+    target_box = np.array([240.0, 80.0, 1040.0, 880.0])
+    arrows = synthetic.make_arrow_boxes(seed=0, num_arrows=12)
+
+    def run():
+        for arrow in arrows:
+            analyzer._calculate_score(arrow, target_box, config)
+        analyzer._analyze_grouping(arrows)
+    return run, len(arrows)
+
+
+def setup_target_session_grouping(data_dir):
+    analyzer = _target_analyzer()
+    ends = synthetic.make_session_impacts(seed=0, num_ends=60, arrows_per_end=6)
+
+    def run():
+        # 与接口相同：每组携带上一组返回的状态
+        state = None
+        for points in ends:
+            state = analyzer.analyze_session_end(points, state)['state']
+    return run, len(ends)
+
+
+CASES = {
+    'pose.analyze_frame': setup_pose_analyze_frame,
+    'pose.analyze_video': setup_pose_analyze_video,
+    'pose.analyze_video.keyframe': setup_pose_analyze_video_keyframe,
+    'target.analyze_image': setup_target_analyze_image,
+    'target.analyze_frame': setup_target_analyze_frame,
+    'pose.aggregation': setup_pose_aggregation,
+    'pose.consistency': setup_pose_consistency,
+    'target.aggregation': setup_target_aggregation,
+    'target.session_grouping': setup_target_session_grouping
+}
+
+
+def generate_data(data_dir):
+    """生成基准测试所需的合成数据（固定随机种子，结果可复现）"""
+    data_dir = Path(data_dir)
+    synthetic.make_pose_video(data_dir / 'pose.mp4', seed=0, num_frames=90)
+    image, _ = synthetic.make_target_image(seed=0)
+    (data_dir / 'target.jpg').write_bytes(_encode_image(image))
+    return data_dir
+
+
+def run_case(name, data_dir, iterations, warmup, min_seconds):
+    """在独立子进程中运行单个用例，保证峰值内存互不干扰"""
+    setup = CASES[name](Path(data_dir))
+    if setup is None:
+        return {'name': name, 'skipped': True, 'reason': '模型未就绪'}
+    run, items = setup
+
+    errors = 0
+    measured_errors = 0
+    last_error = None
+    latencies_ms = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        try:
+            run()
+        except ValueError as e:
+            # 例如合成画面中未检测到姿态，仍计入耗时
+            errors += 1
+            measured_errors += i >= warmup
+            last_error = str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            latencies_ms.append(elapsed_ms)
+        if i >= warmup and sum(latencies_ms) >= min_seconds * 1000 and len(latencies_ms) >= 5:
+            break
+
+    if measured_errors == len(latencies_ms):
+        # 每次都出错时只测到了错误路径，耗时没有意义
+        return {'name': name, 'failed': True,
+                'reason': f'全部 {measured_errors} 次运行出错: {last_error}'}
+
+    latencies_ms = np.array(latencies_ms)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    # Linux 下 ru_maxrss 单位为KB，macOS 为字节
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+    return {
+        'name': name,
+        'iterations': len(latencies_ms),
+        'items_per_iteration': items,
+        'errors': errors,
+        'fps': items * len(latencies_ms) / (latencies_ms.sum() / 1000),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'peak_rss_mb': float(peak_rss_mb)
+    }
+
+
+# 自动调优子进程：全部worker完成加载和预热后同时开始计时
+_start_barrier = None
+
+
+def _init_autotune_worker(budget, barrier):
+    global _start_barrier
+    _start_barrier = barrier
+    budget.apply(override=True)
+
+
+def run_autotune_case(name, data_dir, seconds):
+    """自动调优的单个worker：预热后与其他worker并发运行固定时长，返回 (每次处理的帧数, 各次延迟ms)"""
+    setup = CASES[name](Path(data_dir))
+    if setup is None:
+        return None
+    run, items = setup
+    try:
+        run()
+    except ValueError:
+        pass
+    _start_barrier.wait(timeout=600)
+
+    errors = 0
+    last_error = None
+    latencies_ms = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        begin = time.perf_counter()
+        try:
+            run()
+        except ValueError as e:
+            errors += 1
+            last_error = str(e)
+        latencies_ms.append((time.perf_counter() - begin) * 1000)
+    if errors == len(latencies_ms):
+        # 只测到了错误路径，不能据此调优
+        raise RuntimeError(f'用例 {name} 全部 {errors} 次运行出错: {last_error}')
+    return items, latencies_ms
+
+
+def autotune(name, data_dir, seconds):
+    """对每种 (worker数, 库线程数) 划分并发运行用例，返回各划分的总帧率和延迟分位数
+
+    "未限制" 为各库默认按全部核数开线程的对照组。
+    """
+    cpus = thread_budget.available_cpus()
+    candidates = [
+        (f'{workers}x{threads}', thread_budget.ThreadBudget(
+            cpus, workers, overrides={'intra_op': threads, 'opencv': threads, 'classifier': threads}
+        ))
+        for workers, threads in thread_budget.candidate_splits(cpus)
+    ]
+    total = max(1, int(cpus))
+    candidates.append(('未限制', thread_budget.ThreadBudget(
+        cpus, total, overrides={'intra_op': os.cpu_count(), 'opencv': os.cpu_count(),
+                                'classifier': os.cpu_count(), 'inter_op': os.cpu_count()}
+    )))
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for label, budget in candidates:
+        # 环境变量须在子进程导入 numpy 等库之前生效，spawn 时继承父进程环境
+        saved = dict(os.environ)
+        os.environ.update(budget.environ())
+        try:
+            barrier = context.Barrier(budget.workers)
+            with ProcessPoolExecutor(max_workers=budget.workers, mp_context=context,
+                                     initializer=_init_autotune_worker,
+                                     initargs=(budget, barrier)) as executor:
+                futures = [executor.submit(run_autotune_case, name, str(data_dir), seconds)
+                           for _ in range(budget.workers)]
+                outputs = [future.result() for future in futures]
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+
+        if any(output is None for output in outputs):
+            return None
+        latencies_ms = np.concatenate([output[1] for output in outputs])
+        p50, p95 = np.percentile(latencies_ms, [50, 95])
+        results.append({
+            'split': label,
+            'workers': budget.workers,
+            'threads': budget.config['intra_op'],
+            'fps': sum(items * len(lat) for items, lat in outputs) / seconds,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95)
+        })
+        print(f"  {label:<8}fps={results[-1]['fps']:.1f} p95={p95:.1f}ms")
+    return results
+
+
+def recommend(results, latency_slack=1.5):
+    """在 p95 不超过最低 p95 的 latency_slack 倍的划分中选帧率最高的"""
+    measured = [r for r in results if r['split'] != '未限制']
+    best_p95 = min(r['p95_ms'] for r in measured)
+    eligible = [r for r in measured if r['p95_ms'] <= best_p95 * latency_slack]
+    return max(eligible, key=lambda r: r['fps'])
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较，返回回归列表"""
+    regressions = []
+    for result in results:
+        base = baseline.get(result['name'])
+        if result.get('skipped') or result.get('failed') or base is None \
+                or base.get('skipped') or base.get('failed'):
+            continue
+        for metric, limit in tolerance.items():
+            current, reference = result[metric], base[metric]
+            if not reference:
+                continue
+            change = (current - reference) / reference
+            worse = -change if metric == 'fps' else change
+            if worse > limit:
+                regressions.append(
+                    f"{result['name']} {metric}: {reference:.2f} -> {current:.2f} ({change:+.1%})"
+                )
+    return regressions
+
+
+def print_table(results):
+    print(f"{'用例':<30}{'fps':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'RSS(MB)':>10}{'错误':>6}")
+    for r in results:
+        if r.get('skipped'):
+            print(f"{r['name']:<30}跳过: {r['reason']}")
+            continue
+        if r.get('failed'):
+            print(f"{r['name']:<30}失败: {r['reason']}")
+            continue
+        print(f"{r['name']:<30}{r['fps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['peak_rss_mb']:>10.1f}{r['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI服务分析器性能基准测试')
+    parser.add_argument('--cases', nargs='*', default=list(CASES), help='要运行的用例')
+    parser.add_argument('--iterations', type=int, default=50, help='每个用例的最大迭代次数')
+    parser.add_argument('--warmup', type=int, default=3, help='预热迭代次数')
+    parser.add_argument('--min-seconds', type=float, default=5.0, help='每个用例的最短计时时长，达到后提前结束')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='基线文件')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--output', type=Path, help='将结果写入JSON文件')
+    parser.add_argument('--autotune', action='store_true',
+                        help='自动调优：比较不同 worker数/库线程数 划分的吞吐和延迟，给出推荐配置')
+    parser.add_argument('--autotune-case', default='pose.analyze_frame', help='自动调优使用的用例')
+    args = parser.parse_args()
+
+    if args.autotune:
+        data_dir = Path(tempfile.mkdtemp(prefix='ai-bench-'))
+        try:
+            generate_data(data_dir)
+            print(f"可用CPU: {thread_budget.available_cpus():.2f}，用例: {args.autotune_case}")
+            results = autotune(args.autotune_case, data_dir, args.min_seconds)
+        except RuntimeError as e:
+            print(f'自动调优失败: {e}')
+            sys.exit(1)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        if results is None:
+            print('用例被跳过: 模型未就绪')
+            return
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        best = recommend(results)
+        print(f"\n推荐: gunicorn --workers {best['workers']}，每个worker库线程数 {best['threads']}"
+              f"（fps={best['fps']:.1f}, p95={best['p95_ms']:.1f}ms）")
+        print(f"  环境变量: WEB_CONCURRENCY={best['workers']} THREADS_INTRA_OP={best['threads']} "
+              f"THREADS_OPENCV={best['threads']}")
+        return
+
+    data_dir = Path(tempfile.mkdtemp(prefix='ai-bench-'))
+    try:
+        generate_data(data_dir)
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for name in args.cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(
+                    run_case, name, str(data_dir), args.iterations, args.warmup, args.min_seconds
+                ).result())
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = [r['name'] for r in results if r.get('failed')]
+    if failed:
+        # 失败的用例不写入基线，也不参与回归比较
+        print(f"\n用例失败: {', '.join(failed)}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        baseline = {r['name']: r for r in results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\n未找到基线文件 {args.baseline}，跳过回归检查")
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, DEFAULT_TOLERANCE)
+    if regressions:
+        print("\n性能回归:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n未发现性能回归")
+
+
+if __name__ == '__main__':
+    main()
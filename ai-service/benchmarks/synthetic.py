@@ -0,0 +1,160 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+# 靶面各环颜色（由外到内，BGR）
+RING_COLORS = [
+    (255, 255, 255), (255, 255, 255),
+    (30, 30, 30), (30, 30, 30),
+    (200, 120, 0), (200, 120, 0),
+    (0, 0, 220), (0, 0, 220),
+    (0, 220, 255), (0, 220, 255)
+]
+
+
+def make_target_image(seed, size=(1280, 960), num_arrows=6):
+    """生成确定性的箭靶图片，返回 (PIL图像, [cls, x1, y1, x2, y2] 标注数组)"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = np.full((height, width, 3), (90, 140, 90), dtype=np.uint8)
+    image = cv2.add(image, rng.integers(0, 20, image.shape, dtype=np.uint8))
+
+    center = (width // 2 + int(rng.integers(-40, 40)), height // 2 + int(rng.integers(-40, 40)))
+    radius = int(min(width, height) * 0.4)
+    for i, color in enumerate(RING_COLORS):
+        cv2.circle(image, center, int(radius * (1 - i / len(RING_COLORS))), color, -1, cv2.LINE_AA)
+
+    boxes = [[0, center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius]]
+    for _ in range(num_arrows):
+        distance = radius * min(abs(rng.normal(0, 0.35)), 0.95)
+        angle = rng.uniform(0, 2 * np.pi)
+        x = int(center[0] + distance * np.cos(angle))
+        y = int(center[1] + distance * np.sin(angle))
+        cv2.circle(image, (x, y), 6, (20, 20, 20), -1, cv2.LINE_AA)
+        cv2.line(image, (x, y), (x + 40, y - 25), (0, 160, 40), 4, cv2.LINE_AA)
+        boxes.append([1, x - 8, y - 8, x + 8, y + 8])
+
+    return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)), np.array(boxes, dtype=np.float64)
+
+
+def _archer_joints(t, rng_offsets, width, height):
+    """射箭站姿的二维关节位置，随时间轻微摆动"""
+    sway = 6 * np.sin(2 * np.pi * t / 45)
+    draw = 25 * min(1.0, t / 30)
+    cx = width * 0.5 + sway
+    joints = {
+        'head': (cx, height * 0.22),
+        'neck': (cx, height * 0.30),
+        'l_shoulder': (cx - 35, height * 0.32),
+        'r_shoulder': (cx + 35, height * 0.32),
+        'l_elbow': (cx - 110, height * 0.32),
+        'l_wrist': (cx - 185, height * 0.31),
+        'r_elbow': (cx + 60 - draw, height * 0.30),
+        'r_wrist': (cx + 5 - draw, height * 0.31),
+        'hip': (cx, height * 0.58),
+        'l_knee': (cx - 30, height * 0.74),
+        'r_knee': (cx + 30, height * 0.74),
+        'l_ankle': (cx - 35, height * 0.92),
+        'r_ankle': (cx + 35, height * 0.92)
+    }
+    return {name: (int(x + rng_offsets[i][0]), int(y + rng_offsets[i][1]))
+            for i, (name, (x, y)) in enumerate(joints.items())}
+
+
+def make_pose_frame(seed, t=0, size=(640, 480)):
+    """生成确定性的射箭姿态帧（BGR）"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    frame = np.full((height, width, 3), (170, 180, 190), dtype=np.uint8)
+    frame = cv2.add(frame, rng.integers(0, 12, frame.shape, dtype=np.uint8))
+
+    offsets = rng.normal(0, 1.5, (13, 2))
+    j = _archer_joints(t, offsets, width, height)
+    skin = (140, 170, 220)
+    shirt = (150, 80, 40)
+    trousers = (60, 50, 40)
+
+    limbs = [
+        ('l_shoulder', 'l_elbow', shirt, 18), ('l_elbow', 'l_wrist', skin, 14),
+        ('r_shoulder', 'r_elbow', shirt, 18), ('r_elbow', 'r_wrist', skin, 14),
+        ('hip', 'l_knee', trousers, 24), ('l_knee', 'l_ankle', trousers, 20),
+        ('hip', 'r_knee', trousers, 24), ('r_knee', 'r_ankle', trousers, 20)
+    ]
+    torso = np.array([j['l_shoulder'], j['r_shoulder'],
+                      (j['hip'][0] + 28, j['hip'][1]), (j['hip'][0] - 28, j['hip'][1])])
+    cv2.fillConvexPoly(frame, torso, shirt, cv2.LINE_AA)
+    for a, b, color, thickness in limbs:
+        cv2.line(frame, j[a], j[b], color, thickness, cv2.LINE_AA)
+    cv2.line(frame, j['neck'], j['head'], skin, 14, cv2.LINE_AA)
+    cv2.ellipse(frame, j['head'], (22, 28), 0, 0, 360, skin, -1, cv2.LINE_AA)
+
+    # 弓
+    bow_x = j['l_wrist'][0] - 5
+    cv2.ellipse(frame, (bow_x + 40, j['l_wrist'][1]), (40, 110), 0, 110, 250, (30, 30, 30), 5, cv2.LINE_AA)
+    return frame
+
+
+def make_pose_video(path, seed, num_frames=90, fps=30, size=(640, 480)):
+    """生成确定性的射箭姿态视频文件"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    try:
+        for t in range(num_frames):
+            writer.write(make_pose_frame(seed, t, size))
+    finally:
+        writer.release()
+    return path
+
+
+def make_frame_scores(seed, num_frames=300, joints=('shoulder', 'elbow', 'wrist')):
+    """生成确定性的逐帧姿势评分（PoseAnalyzer._evaluate_pose 的输出格式）"""
+    rng = np.random.default_rng(seed)
+    scores = []
+    for _ in range(num_frames):
+        joint_scores = {joint: float(np.clip(rng.normal(85, 8), 0, 100)) for joint in joints}
+        scores.append({
+            'joint_scores': joint_scores,
+            'stability': sum(joint_scores.values()) / len(joint_scores)
+        })
+    return scores
+
+
+def make_shot_angles(seed, num_shots=300, joints=('shoulder', 'elbow', 'wrist')):
+    """生成确定性的多射次关节角度序列（ShotConsistencyAnalyzer.analyze 的输入格式）
+
+    各射次帧数和节奏不同，每25个射次中有一个噪声较大的异常射次。
+    """
+    rng = np.random.default_rng(seed)
+    shots = []
+    for i in range(num_shots):
+        num_frames = int(rng.integers(60, 140))
+        t = np.linspace(0, 1, num_frames) ** rng.uniform(0.8, 1.25)
+        curves = {
+            'shoulder': 90 + 30 * np.sin(np.pi * t),
+            'elbow': 60 + 100 * t,
+            'wrist': 170 - 20 * t ** 2
+        }
+        noise = 6 if i % 25 == 7 else 1
+        shots.append({
+            'id': f'shot-{i}',
+            'angles': {joint: curves[joint] + rng.normal(0, noise, num_frames) for joint in joints}
+        })
+    return shots
+
+
+def make_arrow_boxes(seed, num_arrows=12, center=(640, 480), spread=60):
+    """生成确定性的箭矢检测框列表"""
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for x, y in rng.normal(center, spread, (num_arrows, 2)):
+        boxes.append(np.array([x - 8, y - 8, x + 8, y + 8]))
+    return boxes
+
+
+def make_session_impacts(seed, num_ends=60, arrows_per_end=6, spread=0.12):
+    """生成确定性的一次训练各组落点（靶面归一化坐标），箭群重心随组数缓慢漂移"""
+    rng = np.random.default_rng(seed)
+    drift = np.array([0.002, -0.001])
+    return [
+        rng.normal(drift * end, spread, (arrows_per_end, 2))
+        for end in range(num_ends)
+    ]
@@ -0,0 +1,77 @@
+# gunicorn 配置：多进程模式下的 Prometheus 指标目录管理、本机推理服务进程和CPU线程预算
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+
+# 每个worker多线程处理请求：分析请求由准入控制按优先级分配执行槽位（ADMISSION_CAPACITY），
+# 其余线程用于过载时快速返回503以及健康检查、指标接口
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    """主进程启动时清空上次运行残留的指标文件，按需启动推理服务"""
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    # 设置 INFERENCE_SERVER_SOCKET 时由一个推理服务进程持有模型，worker只做请求处理；
+    # INFERENCE_SERVER_SPAWN=0 表示推理服务由外部（如同一Pod的另一个容器）启动
+    if os.getenv('INFERENCE_SERVER_SOCKET') and os.getenv('INFERENCE_SERVER_SPAWN', '1') == '1':
+        from utils.thread_budget import ThreadBudget
+        
+        # 推理服务的线程预算通过环境变量传入，在其导入各库之前生效（显式设置的环境变量优先）
+        budget = ThreadBudget.from_env(role='inference_server')
+        server.inference_server = subprocess.Popen(
+            [sys.executable, '-m', 'inference.serve'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**budget.environ(), **os.environ}
+        )
+
+
+def pre_fork(server, worker):
+    """主进程中为即将启动的worker分配CPU槽位：取最小的空闲槽位，重启的worker复用退出worker的槽位"""
+    if not hasattr(server, 'free_cpu_slots'):
+        server.free_cpu_slots = set(range(server.cfg.workers))
+    if server.free_cpu_slots:
+        worker.cpu_slot = min(server.free_cpu_slots)
+        server.free_cpu_slots.discard(worker.cpu_slot)
+    else:
+        # 运行中增加了worker数（TTIN）：取存活worker未占用的最小槽位，预算中按worker数取模
+        used = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+        worker.cpu_slot = next(slot for slot in itertools.count(server.cfg.workers) if slot not in used)
+
+
+def post_fork(server, worker):
+    """worker启动后、加载应用（导入 TensorFlow、PyTorch 等）之前设置线程预算"""
+    # 配置文件加载时应用目录尚未加入 sys.path，在钩子中导入
+    from utils.thread_budget import ThreadBudget
+    
+    budget = ThreadBudget.from_env(workers=server.cfg.workers)
+    budget.apply(slot=worker.cpu_slot)
+    server.log.info('worker %s 槽位 %s 线程预算: %s', worker.pid, worker.cpu_slot, budget.to_dict())
+
+
+def on_exit(server):
+    """主进程退出时停止推理服务"""
+    process = getattr(server, 'inference_server', None)
+    if process is not None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def child_exit(server, worker):
+    """worker退出时归还其CPU槽位，并标记其指标文件，避免仪表类指标残留"""
+    slot = getattr(worker, 'cpu_slot', None)
+    if slot is not None and slot < server.cfg.workers:
+        server.free_cpu_slots.add(slot)
+    
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,205 @@
+import copy
+import os
+import time
+import uuid
+from multiprocessing.connection import Client
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from pose_analysis.pose_classifier import PoseClassifier
+
+
+class InferenceError(RuntimeError):
+    """推理服务端执行失败"""
+
+
+class RemoteDetections:
+    """推理服务返回的检测结果，与 YOLOv5 结果的 pred 接口一致"""
+
+    def __init__(self, pred):
+        self.pred = [pred]
+
+
+class _Channel:
+    """一条到推理服务的连接及其独占的共享内存，一次只处理一个请求"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.shm = None
+
+    def payload(self, array):
+        """将数组写入共享内存，返回其描述"""
+        array = np.ascontiguousarray(array)
+        if self.shm is None or self.shm.size < array.nbytes:
+            self._release_shm()
+            # 按2的幂扩容，避免帧尺寸变化时反复重建
+            size = 1 << max(array.nbytes - 1, 1).bit_length()
+            self.shm = SharedMemory(create=True, size=size)
+        np.ndarray(array.shape, array.dtype, buffer=self.shm.buf)[...] = array
+        return {'shm': self.shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+    def _release_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        self._release_shm()
+
+
+class InferenceClient:
+    """本机推理服务的客户端
+
+    请求头通过 Unix socket 发送，帧和关键点序列等大块数据写入连接独占的共享内存，
+    服务端直接从共享内存读取，不经过 socket 复制。多线程并发请求时各用一条连接。
+    """
+
+    def __init__(self, socket_path, connect_timeout=60):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        # 空闲连接（list 的 append/pop 是原子操作）
+        self._channels = []
+
+    @classmethod
+    def from_env(cls):
+        """设置 INFERENCE_SERVER_SOCKET 时创建客户端，否则返回None（进程内推理）"""
+        socket_path = os.getenv('INFERENCE_SERVER_SOCKET')
+        if not socket_path:
+            return None
+        return cls(socket_path, connect_timeout=float(os.getenv('INFERENCE_SERVER_CONNECT_TIMEOUT', 60)))
+
+    def _connect(self):
+        """连接推理服务，服务启动加载模型期间重试"""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.socket_path, family='AF_UNIX')
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise InferenceError(f'无法连接推理服务: {self.socket_path}')
+                time.sleep(0.5)
+
+    def request(self, op, array=None, **kwargs):
+        """发送请求并等待结果，连接断开（如推理服务重启）时重连一次"""
+        message = {'op': op, **kwargs}
+        for attempt in range(2):
+            try:
+                channel = self._channels.pop()
+            except IndexError:
+                channel = _Channel(self._connect())
+            try:
+                if array is not None:
+                    message['payload'] = channel.payload(array)
+                channel.conn.send(message)
+                response = channel.conn.recv()
+            except (EOFError, OSError):
+                channel.close()
+                if attempt:
+                    raise InferenceError('推理服务连接中断')
+                continue
+            self._channels.append(channel)
+            break
+
+        if 'error' in response:
+            if response.get('type') == 'ValueError':
+                raise ValueError(response['error'])
+            raise InferenceError(response['error'])
+        return response
+
+    def info(self):
+        """各模型的当前版本、影子版本和是否就绪"""
+        return self.request('info')['models']
+
+    def new_session(self):
+        """新建姿态跟踪会话（服务端在首次推理时创建跟踪实例）"""
+        return uuid.uuid4().hex
+
+    def close_session(self, session):
+        self.request('close_session', session=session)
+
+    def pose_landmarks(self, frame, session):
+        """在指定会话中做姿态推理，返回 (33, 4) 的关键点数组，未检测到时返回None"""
+        return self.request('pose_landmarks', frame, session=session)['landmarks']
+
+    def classify_windows(self, sequence):
+        """姿态序列的滑动窗口分类，返回 (窗口起点, 各类别概率, 标签, 模型版本, 配置)"""
+        response = self.request('pose_classify', np.asarray(sequence, dtype=np.float32))
+        return (response['starts'], response['probabilities'], response['labels'],
+                response['version'], response['config'])
+
+    def detect_targets(self, image):
+        """箭靶检测，image 为 PIL 图像"""
+        response = self.request('target_detect', np.asarray(image.convert('RGB')))
+        return RemoteDetections(response['pred'])
+
+    def close(self):
+        """关闭空闲连接并释放共享内存"""
+        while self._channels:
+            self._channels.pop().close()
+
+
+class RemotePoseClassifier(PoseClassifier):
+    """由推理服务执行的姿态分类器，窗口切分和概率推理在服务端完成"""
+
+    def __init__(self, client):
+        self.client = client
+        self.config = {}
+        self.labels = None
+        self.backend = 'remote'
+
+    def predict_windows(self, sequence):
+        starts, probabilities, _, _, _ = self.client.classify_windows(sequence)
+        return starts, probabilities
+
+    def classify(self, sequence, frame_indices, fps):
+        starts, probabilities, labels, version, config = self.client.classify_windows(sequence)
+        # 标签和窗口配置以服务端当前模型为准；各请求使用独立副本，并发分类互不影响
+        classifier = copy.copy(self)
+        classifier.labels = labels
+        classifier.config = config
+        classification = classifier.build_classification(starts, probabilities, frame_indices, fps)
+        classification['model_version'] = version
+        return classification
+
+
+class RemoteModel:
+    """推理服务持有的模型，接口与 ReloadableModel 一致（热更新和影子模式在服务端进行）"""
+
+    def __init__(self, client, name, handle):
+        self.client = client
+        self.name = name
+        self.handle = handle
+
+    def _info(self):
+        return self.client.info().get(self.name, {})
+
+    def get(self):
+        info = self._info()
+        return info.get('version'), (self.handle if info.get('ready') else None)
+
+    @property
+    def model(self):
+        return self.get()[1]
+
+    @property
+    def version(self):
+        return self._info().get('version')
+
+    @property
+    def shadow_version(self):
+        return self._info().get('shadow_version')
+
+    def shadow(self, run, primary_output, primary_seconds):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,11 @@
+# 推理服务入口：python -m inference.serve
+# 线程预算须在 numpy、OpenCV、MediaPipe、TensorFlow 导入之前生效，
+# inference.server 在模块顶层导入各分析器，因此先在这里设置再导入
+from utils.thread_budget import ThreadBudget
+
+if __name__ == '__main__':
+    # 推理服务自身在进程内加载模型，使用节点的全部线程预算
+    ThreadBudget.from_env(role='inference_server').apply()
+
+    from inference.server import main
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from PIL import Image
+
+from pose_analysis.pose_analyzer import PoseAnalyzer, create_pose, detect_landmarks
+from target_analysis.target_analyzer import TargetAnalyzer
+from utils import thread_budget
+from utils.thread_budget import ThreadBudget
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """跨连接合批：第一个请求到达后最多等待 max_wait 秒或凑满 max_batch 个请求再统一推理"""
+
+    def __init__(self, run_batch, max_batch, max_wait):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, item):
+        """提交一个请求并等待其结果"""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            # 不保留对共享内存的引用，客户端扩容时服务端才能释放旧映射
+            batch = results = None
+
+
+class _PoseSession:
+    """一个客户端的姿态跟踪会话：MediaPipe 视频模式跨帧跟踪，会话间不能共享实例"""
+
+    def __init__(self):
+        self.pose = create_pose()
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pose.close()
+
+
+class InferenceServer:
+    """本机推理服务
+
+    一个节点只运行一个该进程，持有姿态分类、箭靶检测模型（含热更新和影子模式），
+    各web worker通过 Unix socket 发送请求、通过共享内存传递帧，
+    姿态分类和箭靶检测的请求跨worker合批推理。
+    """
+
+    def __init__(self, socket_path, config=None):
+        self.socket_path = socket_path
+        self.config = {
+            'max_batch': 8,                # 每批最多合并的请求数
+            'max_wait_ms': 5,              # 凑批的最长等待时间
+            'max_pose_sessions': 16,       # 同时保留的姿态跟踪会话数
+            'session_idle_seconds': 300    # 空闲会话的回收时间
+        }
+        if config:
+            self.config.update(config)
+
+        self.pose_analyzer = PoseAnalyzer()
+        self.target_analyzer = TargetAnalyzer()
+
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+        max_wait = self.config['max_wait_ms'] / 1000
+        self.classify_batcher = MicroBatcher(self._classify_batch, self.config['max_batch'], max_wait)
+        self.detect_batcher = MicroBatcher(self._detect_batch, self.config['max_batch'], max_wait)
+
+        self.handlers = {
+            'info': self._info,
+            'pose_landmarks': self._pose_landmarks,
+            'close_session': self._close_session,
+            'pose_classify': self._pose_classify,
+            'target_detect': self._target_detect
+        }
+
+    @classmethod
+    def from_env(cls, socket_path=None):
+        """从环境变量创建"""
+        return cls(socket_path or os.environ['INFERENCE_SERVER_SOCKET'], {
+            'max_batch': int(os.getenv('INFERENCE_MAX_BATCH', 8)),
+            'max_wait_ms': float(os.getenv('INFERENCE_MAX_WAIT_MS', 5)),
+            'max_pose_sessions': int(os.getenv('INFERENCE_POSE_SESSIONS', 16)),
+            'session_idle_seconds': float(os.getenv('INFERENCE_SESSION_IDLE', 300))
+        })
+
+    def serve_forever(self):
+        """监听 Unix socket，每个连接一个线程"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        listener = Listener(self.socket_path, family='AF_UNIX')
+        logger.info('推理服务已启动: %s', self.socket_path)
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_connection(self, conn):
+        attached = {}
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                array = None
+                try:
+                    if 'payload' in message:
+                        array = self._attach(attached, message['payload'])
+                    response = self.handlers[message['op']](message, array)
+                except Exception as e:
+                    response = {'error': str(e), 'type': type(e).__name__}
+                array = None
+                conn.send(response)
+        finally:
+            conn.close()
+            for shm in attached.values():
+                self._detach(shm)
+
+    def _attach(self, attached, payload):
+        """映射客户端的共享内存，返回其中的数组视图"""
+        name = payload['shm']
+        shm = attached.get(name)
+        if shm is None:
+            # 客户端扩容后旧的共享内存不再使用
+            for old in attached.values():
+                self._detach(old)
+            attached.clear()
+            shm = attached[name] = SharedMemory(name=name)
+            # 共享内存由客户端创建和删除，服务端退出时不应删除
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return np.ndarray(payload['shape'], np.dtype(payload['dtype']), buffer=shm.buf)
+
+    def _detach(self, shm):
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有视图引用该映射，由垃圾回收释放
+            pass
+
+    def _info(self, message, array):
+        return {'models': {
+            name: {
+                'version': models.version,
+                'shadow_version': models.shadow_version,
+                'ready': models.model is not None
+            }
+            for name, models in (('pose', self.pose_analyzer.models),
+                                 ('target', self.target_analyzer.models))
+        }}
+
+    def _pose_session(self, session):
+        """取出（必要时创建）会话，并回收空闲和超出数量上限的会话"""
+        now = time.monotonic()
+        evicted = []
+        with self._sessions_lock:
+            entry = self._sessions.pop(session, None)
+            if entry is None:
+                entry = _PoseSession()
+            entry.last_used = now
+            self._sessions[session] = entry
+
+            while self._sessions:
+                oldest_key, oldest = next(iter(self._sessions.items()))
+                if (len(self._sessions) <= self.config['max_pose_sessions']
+                        and now - oldest.last_used < self.config['session_idle_seconds']):
+                    break
+                del self._sessions[oldest_key]
+                evicted.append(oldest)
+
+        for oldest in evicted:
+            oldest.close()
+        return entry
+
+    def _close_session(self, message, array):
+        with self._sessions_lock:
+            entry = self._sessions.pop(message['session'], None)
+        if entry is not None:
+            entry.close()
+        return {}
+
+    def _pose_landmarks(self, message, frame):
+        while True:
+            entry = self._pose_session(message['session'])
+            with entry.lock:
+                if not entry.closed:
+                    return {'landmarks': detect_landmarks(entry.pose, frame)}
+
+    def _pose_classify(self, message, sequence):
+        models = self.pose_analyzer.models
+        _, classifier = models.get()
+        if classifier is None:
+            raise ValueError('姿态分类模型未加载')
+
+        starts, windows = classifier.make_windows(sequence)
+        start = time.perf_counter()
+        probabilities, version, classifier = self.classify_batcher.submit(windows)
+        elapsed = time.perf_counter() - start
+
+        if models.shadow_version is not None:
+            # 影子推理在后台执行，此时共享内存可能已被客户端复用，需要复制
+            sequence = sequence.copy()
+            indices = list(range(len(sequence)))
+            models.shadow(
+                lambda candidate: candidate.classify(sequence, indices, 1.0),
+                classifier.build_classification(starts, probabilities, indices, 1.0),
+                elapsed
+            )
+
+        return {
+            'starts': starts,
+            'probabilities': probabilities,
+            'labels': classifier.labels,
+            'version': version,
+            'config': classifier.config
+        }
+
+    def _classify_batch(self, windows_list):
+        """合并多个请求的窗口统一推理，再按请求拆分"""
+        version, classifier = self.pose_analyzer.models.get()
+        if classifier is None:
+            raise ValueError('姿态分类模型未加载')
+        counts = [len(windows) for windows in windows_list]
+        probabilities = classifier.predict_batch(np.concatenate(windows_list))
+        return [
+            (probs, version, classifier)
+            for probs in np.split(probabilities, np.cumsum(counts)[:-1])
+        ]
+
+    def _target_detect(self, message, image):
+        return {'pred': self.detect_batcher.submit(image)}
+
+    def _detect_batch(self, images):
+        if self.target_analyzer.model is None:
+            raise ValueError('箭靶检测模型未加载')
+        results = self.target_analyzer.detect_batch([Image.fromarray(image) for image in images])
+        return [pred.cpu().numpy() for pred in results.pred]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本机推理服务')
+    parser.add_argument('--socket', default=os.getenv('INFERENCE_SERVER_SOCKET'),
+                        help='Unix socket 路径（默认 INFERENCE_SERVER_SOCKET）')
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error('需要 --socket 或 INFERENCE_SERVER_SOCKET')
+    # 独立进程，启动信息和模型热更新失败等日志输出到标准错误
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # 推理服务自身在进程内加载模型；线程预算由入口 inference.serve 在导入各库之前设置，
+    # 直接以 python -m inference.server 启动时在此补设（此时 numpy 等已导入，OpenMP/BLAS 线程数不受限制）
+    if thread_budget.current() is None:
+        ThreadBudget.from_env(role='inference_server').apply()
+    os.environ.pop('INFERENCE_SERVER_SOCKET', None)
+    InferenceServer.from_env(args.socket).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from utils.file_hash import hash_file
+
+
+def _atomic_write(path, write_fn, suffix=''):
+    """先写入同目录临时文件再原子替换，保证中断时不会留下半个文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-', suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class LandmarkFeatureStore:
+    """关键点特征库
+
+    每个视频的完整关键点序列 (帧数, 99) 以 float32 .npy 形式保存，
+    按视频内容哈希的前两位分片存放，可直接内存映射读取。
+    manifest.json 记录视频路径 -> (大小, 修改时间, 哈希)，未变化的视频无需重新哈希。
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / 'manifest.json'
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {'videos': {}}
+
+    def save_manifest(self):
+        """原子地保存清单"""
+        data = json.dumps(self.manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        _atomic_write(self.manifest_path, lambda f: f.write(data), suffix='.json')
+
+    def shard_path(self, key):
+        """特征文件路径"""
+        return self.root / 'shards' / key[:2] / f'{key}.npy'
+
+    def has(self, key):
+        return self.shard_path(key).exists()
+
+    def lookup(self, video_path):
+        """若视频自上次提取后未变化，返回其清单条目，否则返回None"""
+        entry = self.manifest['videos'].get(str(Path(video_path).resolve()))
+        if entry is None or not self.has(entry['key']):
+            return None
+
+        stat = os.stat(video_path)
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def record(self, video_path, key, num_frames):
+        """登记视频的提取结果（需调用save_manifest持久化）"""
+        stat = os.stat(video_path)
+        entry = {
+            'key': key,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'frames': num_frames
+        }
+        self.manifest['videos'][str(Path(video_path).resolve())] = entry
+        return entry
+
+    def put(self, key, sequence):
+        """写入关键点序列"""
+        sequence = np.ascontiguousarray(sequence, dtype=np.float32)
+        _atomic_write(self.shard_path(key), lambda f: np.save(f, sequence), suffix='.npy')
+
+    def load(self, key, mmap=True):
+        """读取关键点序列，默认以只读内存映射方式打开"""
+        return np.load(self.shard_path(key), mmap_mode='r' if mmap else None)
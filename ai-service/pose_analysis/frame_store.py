@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from utils.serialization import dumps_json
+
+# 每帧的关键点数组形状：33个关键点 * (x, y, z, visibility)
+LANDMARK_SHAPE = (33, 4)
+
+JOINTS = ('shoulder', 'elbow', 'wrist')
+
+# 持久化时的列类型：关键点为归一化坐标、关节评分为0-100，float16 的精度足够
+STORAGE_DTYPES = {
+    'frame_index': np.int32,
+    'timestamp': np.float32,
+    'interpolated': np.bool_,
+    'landmarks': np.float16,
+    'angles': np.float32,
+    'joint_scores': np.float16,
+    'stability': np.float32
+}
+
+EXPORT_MIMETYPES = {
+    'arrow': 'application/vnd.apache.arrow.file',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+_ANALYSIS_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('导出 Arrow/Parquet 需要安装 pyarrow')
+    return pyarrow
+
+
+def _replace_file(path, write):
+    """写入同目录的临时文件后重命名为 path"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class FrameColumns:
+    """逐帧分析结果的列式容器
+
+    帧号、时间戳、关键点、关节角度和评分分别存放在预分配的定型数组中（容量不足时倍增），
+    不为每帧创建嵌套字典。关键点保持 float32 供姿态分类使用，持久化时按 STORAGE_DTYPES 压缩。
+    """
+
+    def __init__(self, joints=JOINTS, capacity=256):
+        self.joints = tuple(joints)
+        self._size = 0
+        self._columns = {
+            'frame_index': np.empty(capacity, dtype=np.int32),
+            'timestamp': np.empty(capacity, dtype=np.float32),
+            'interpolated': np.empty(capacity, dtype=np.bool_),
+            'landmarks': np.empty((capacity,) + LANDMARK_SHAPE, dtype=np.float32),
+            'angles': np.empty((capacity, len(self.joints)), dtype=np.float32),
+            'joint_scores': np.empty((capacity, len(self.joints)), dtype=np.float32),
+            'stability': np.empty(capacity, dtype=np.float32)
+        }
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, name):
+        """列视图，只含已追加的帧"""
+        return self._columns[name][:self._size]
+
+    def append(self, frame_index, timestamp, landmarks, frame_result, interpolated=False):
+        """追加一帧，frame_result 为 _analyze_landmarks 的结果"""
+        if self._size == len(self._columns['frame_index']):
+            self._grow()
+        i = self._size
+        columns = self._columns
+        angles = frame_result['angles']
+        joint_scores = frame_result['scores']['joint_scores']
+        columns['frame_index'][i] = frame_index
+        columns['timestamp'][i] = timestamp
+        columns['interpolated'][i] = interpolated
+        columns['landmarks'][i] = landmarks
+        columns['angles'][i] = [angles.get(joint, np.nan) for joint in self.joints]
+        columns['joint_scores'][i] = [joint_scores.get(joint, np.nan) for joint in self.joints]
+        columns['stability'][i] = frame_result['scores']['stability']
+        self._size += 1
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.empty((len(column) * 2,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def columns(self):
+        return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def sort(self):
+        """按帧号排序（渐进模式按粗到细的顺序追加）"""
+        order = np.argsort(self['frame_index'], kind='stable')
+        for column in self._columns.values():
+            column[:self._size] = column[:self._size][order]
+
+    def features(self):
+        """姿态分类的输入：(帧数, 99) 的 x, y, z 序列"""
+        return self['landmarks'][:, :, :3].reshape(self._size, -1)
+
+    def _scored_joints(self):
+        """有评分的关节序号（评分规则中理想角度为 null 的关节整列为NaN）"""
+        return [j for j in range(len(self.joints)) if not np.isnan(self['joint_scores'][:, j]).any()]
+
+    def posture_scores(self):
+        """逐帧评分列表（_evaluate_pose 的输出格式，不含没有评分的关节）"""
+        return [
+            {
+                'joint_scores': {
+                    joint: score for joint, score in zip(self.joints, scores) if not math.isnan(score)
+                },
+                'stability': stability
+            }
+            for scores, stability in zip(self['joint_scores'].tolist(), self['stability'].tolist())
+        ]
+
+    def frame_series(self):
+        """逐帧角度序列"""
+        return {
+            'frame_indices': self['frame_index'].tolist(),
+            'timestamps': self['timestamp'].tolist(),
+            'angles': {joint: self['angles'][:, j].tolist() for j, joint in enumerate(self.joints)},
+            'interpolated': self['interpolated'].tolist()
+        }
+
+    def to_dict(self):
+        """列式的逐帧结果（不含关键点），msgpack 响应中各列打包为定长二进制数组"""
+        return {
+            'frame_index': self['frame_index'],
+            'timestamp': self['timestamp'],
+            'interpolated': self['interpolated'],
+            'angles': {joint: self['angles'][:, j] for j, joint in enumerate(self.joints)},
+            'joint_scores': {self.joints[j]: self['joint_scores'][:, j] for j in self._scored_joints()},
+            'stability': self['stability']
+        }
+
+
+class AnalysisStore:
+    """逐帧分析结果的列式存储库
+
+    每次分析保存为一个目录（以分析ID命名），各列为一个 .npy 文件，可只读内存映射零拷贝读取；
+    meta.json 记录帧率、关节名和总体分析结果。可将一个或多个分析导出为 Arrow IPC 或 Parquet（需要 pyarrow）。
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """设置 ANALYSIS_STORE_DIR 时创建，否则返回None（不保存逐帧结果）"""
+        root = os.getenv('ANALYSIS_STORE_DIR')
+        return cls(root) if root else None
+
+    def path(self, analysis_id):
+        if not _ANALYSIS_ID.match(analysis_id):
+            raise KeyError(f'分析结果不存在: {analysis_id}')
+        return self.root / analysis_id
+
+    def ids(self):
+        """全部分析ID，按保存时间排序"""
+        paths = [p for p in self.root.iterdir() if _ANALYSIS_ID.match(p.name)]
+        return [p.name for p in sorted(paths, key=lambda p: p.stat().st_mtime)]
+
+    def save(self, columns, meta=None):
+        """保存一次分析的逐帧列，返回分析ID
+
+        先写入临时目录再整体重命名，读取方不会看到写了一半的分析。
+        """
+        analysis_id = uuid.uuid4().hex
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.root, prefix='.tmp-'))
+        try:
+            for name, column in columns.columns().items():
+                np.save(tmp_dir / f'{name}.npy', column.astype(STORAGE_DTYPES[name], copy=False))
+            meta = {
+                'analysis_id': analysis_id,
+                'created_at': time.time(),
+                'frames': len(columns),
+                'joints': list(columns.joints),
+                **(meta or {})
+            }
+            (tmp_dir / 'meta.json').write_bytes(dumps_json(meta))
+            os.replace(tmp_dir, self.root / analysis_id)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return analysis_id
+
+    def load(self, analysis_id, mmap=True, columns=None):
+        """读取一次分析，返回 (meta, {列名: 数组})，默认以只读内存映射方式打开，columns 指定只读取的列"""
+        path = self.path(analysis_id)
+        meta_path = path / 'meta.json'
+        if not meta_path.exists():
+            raise KeyError(f'分析结果不存在: {analysis_id}')
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(path / f'{name}.npy', mmap_mode='r' if mmap else None)
+            for name in (columns or STORAGE_DTYPES)
+        }
+        return meta, arrays
+
+    def update(self, analysis_id, columns, meta):
+        """替换一次分析的部分列并合并 meta（如重新评分的结果）
+
+        各文件先写临时文件再重命名，已内存映射旧列的读取方不受影响；meta.json 最后替换。
+        """
+        path = self.path(analysis_id)
+        meta_path = path / 'meta.json'
+        if not meta_path.exists():
+            raise KeyError(f'分析结果不存在: {analysis_id}')
+        with open(meta_path, 'r') as f:
+            merged = {**json.load(f), **meta}
+        saved = path.stat()
+
+        for name, column in columns.items():
+            column = np.asarray(column).astype(STORAGE_DTYPES[name], copy=False)
+            _replace_file(path / f'{name}.npy', lambda f: np.save(f, column))
+        _replace_file(meta_path, lambda f: f.write(dumps_json(merged)))
+        # 保持目录的修改时间，ids() 的顺序仍为保存时间
+        os.utime(path, ns=(saved.st_atime_ns, saved.st_mtime_ns))
+        return merged
+
+    def _frame_table(self, pa, analysis_id, position, dictionary, half):
+        """一次分析的 Arrow 表，数值列直接引用内存映射的数组"""
+        meta, columns = self.load(analysis_id)
+        count = meta['frames']
+        widen = (lambda array: array) if half else (lambda array: array.astype(np.float32))
+
+        fields = {
+            'analysis_id': pa.DictionaryArray.from_arrays(
+                pa.array(np.full(count, position, dtype=np.int32)), dictionary
+            ),
+            'frame_index': pa.array(columns['frame_index']),
+            'timestamp': pa.array(columns['timestamp']),
+            'interpolated': pa.array(columns['interpolated']),
+            'stability': pa.array(columns['stability'])
+        }
+        for j, joint in enumerate(meta['joints']):
+            fields[f'angle_{joint}'] = pa.array(np.ascontiguousarray(columns['angles'][:, j]))
+            fields[f'score_{joint}'] = pa.array(widen(np.ascontiguousarray(columns['joint_scores'][:, j])))
+        landmarks = columns['landmarks']
+        fields['landmarks'] = pa.FixedSizeListArray.from_arrays(
+            pa.array(widen(landmarks.reshape(-1))), int(np.prod(landmarks.shape[1:]))
+        )
+        return pa.table(fields)
+
+    def to_arrow(self, analysis_ids=None):
+        """多个分析（默认全部）合并为一个 Arrow 表，供 notebook 直接分析"""
+        pa = _pyarrow()
+        analysis_ids = list(analysis_ids or self.ids())
+        dictionary = pa.array(analysis_ids, type=pa.string())
+        return pa.concat_tables([
+            self._frame_table(pa, analysis_id, i, dictionary, half=True)
+            for i, analysis_id in enumerate(analysis_ids)
+        ])
+
+    def export(self, analysis_ids, fmt, sink):
+        """将多个分析的逐帧列写入 sink（文件路径或文件对象）
+
+        arrow 为 Arrow IPC 文件格式，可内存映射零拷贝读取，保留 float16 列；
+        parquet 以 zstd 压缩，float16 列转为 float32 以兼容各版本的读取端。
+        逐个分析写入，内存占用与分析数量无关。
+        """
+        if fmt not in EXPORT_MIMETYPES:
+            raise ValueError(f'不支持的导出格式: {fmt}')
+        analysis_ids = list(analysis_ids)
+        if not analysis_ids:
+            raise ValueError('没有可导出的分析结果')
+        pa = _pyarrow()
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+
+        # 所有批次共用同一个分析ID字典，IPC 文件格式不允许批次间替换字典
+        dictionary = pa.array(analysis_ids, type=pa.string())
+        writer = None
+        try:
+            for i, analysis_id in enumerate(analysis_ids):
+                table = self._frame_table(pa, analysis_id, i, dictionary, half=fmt == 'arrow')
+                if writer is None:
+                    if fmt == 'arrow':
+                        writer = pa.ipc.new_file(sink, table.schema)
+                    else:
+                        writer = pq.ParquetWriter(sink, table.schema, compression='zstd')
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def export_file(self, analysis_ids, fmt):
+        """导出到临时文件，返回定位到开头的文件对象（关闭时删除）"""
+        output = tempfile.TemporaryFile()
+        try:
+            self.export(analysis_ids, fmt, output)
+        except BaseException:
+            output.close()
+            raise
+        output.seek(0)
+        return output
@@ -0,0 +1,149 @@
+import cv2
+import numpy as np
+
+from utils.metrics import stage
+
+
+class KeyframeTracker:
+    """锚帧姿态跟踪器
+
+    仅在锚帧上执行完整的姿态推理，锚帧之间的帧通过LK光流传播关键点。
+    当传播置信度下降、帧间运动过大或距上一锚帧过远时触发新的完整推理。
+    新锚帧到达时，将传播累积的漂移按时间线性分摊回中间帧（插值校正）。
+    """
+
+    def __init__(self, detect_fn, config=None):
+        # detect_fn(frame) -> (33, 4) 关键点数组 [x, y, z, visibility] 或 None
+        self.detect_fn = detect_fn
+
+        # 跟踪配置
+        self.config = {
+            'anchor_interval': 10,   # 两次完整推理之间的最大帧数
+            'min_confidence': 0.6,   # 传播置信度低于该值时重新推理
+            'max_motion': 0.03,      # 帧间中位位移（相对画面对角线）超过该值时重新推理
+            'min_visibility': 0.5,   # 参与光流跟踪的关键点最小可见度
+            'max_flow_error': 30.0,  # LK光流单点误差上限
+            'win_size': 21,          # LK光流窗口大小
+            'max_level': 3           # LK光流金字塔层数
+        }
+        if config:
+            self.config.update({k: v for k, v in config.items() if v is not None})
+
+        self.reset()
+
+    def reset(self):
+        """清空跟踪状态"""
+        self.prev_gray = None
+        self.landmarks = None
+        self.since_anchor = 0
+        self.pending = []  # 尚未被下一锚帧校正的传播帧 [(frame_idx, landmarks)]
+        self.stats = {
+            'anchor_frames': 0,
+            'interpolated_frames': 0,
+            'missing_frames': 0,
+            'triggers': {'interval': 0, 'confidence': 0, 'motion': 0, 'lost': 0}
+        }
+
+    def process(self, frame_idx, frame):
+        """处理一帧
+
+        返回已确定的帧列表 [(frame_idx, landmarks, interpolated)]。
+        传播帧会暂存到下一锚帧到达后才输出，因此输出最多滞后 anchor_interval 帧。
+        未检测到姿态的帧不会输出。
+        """
+        with stage('pose', 'color_convert'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        predicted = None
+        if self.landmarks is not None:
+            with stage('pose', 'optical_flow'):
+                predicted, reason = self._propagate(gray)
+            if predicted is not None and self.since_anchor < self.config['anchor_interval']:
+                self.prev_gray = gray
+                self.landmarks = predicted
+                self.since_anchor += 1
+                self.pending.append((frame_idx, predicted))
+                return []
+            self.stats['triggers'][reason or 'interval'] += 1
+
+        # 完整推理
+        landmarks = self.detect_fn(frame)
+        self.prev_gray = gray
+
+        if landmarks is None:
+            self.stats['missing_frames'] += 1
+            self.landmarks = None
+            self.since_anchor = 0
+            return self._flush_pending()
+
+        # 用本帧的传播预测与真实推理之差校正中间帧
+        if predicted is not None and self.pending:
+            self._correct_pending(landmarks[:, :2] - predicted[:, :2])
+
+        output = self._flush_pending()
+        output.append((frame_idx, landmarks, False))
+        self.stats['anchor_frames'] += 1
+        self.landmarks = landmarks
+        self.since_anchor = 0
+        return output
+
+    def flush(self):
+        """视频结束时输出剩余的传播帧"""
+        return self._flush_pending()
+
+    def _flush_pending(self):
+        output = [(idx, landmarks, True) for idx, landmarks in self.pending]
+        self.stats['interpolated_frames'] += len(self.pending)
+        self.pending = []
+        return output
+
+    def _correct_pending(self, residual):
+        """将锚帧残差按时间线性分摊到中间帧"""
+        n = len(self.pending)
+        for k, (idx, landmarks) in enumerate(self.pending):
+            corrected = landmarks.copy()
+            corrected[:, :2] += residual * ((k + 1) / (n + 1))
+            self.pending[k] = (idx, corrected)
+
+    def _propagate(self, gray):
+        """用光流将上一帧关键点传播到当前帧，返回 (landmarks, 失败原因)"""
+        height, width = gray.shape[:2]
+        scale = np.array([width, height], dtype=np.float32)
+
+        points = (self.landmarks[:, :2] * scale).astype(np.float32).reshape(-1, 1, 2)
+        next_points, status, error = cv2.calcOpticalFlowPyrLK(
+            self.prev_gray, gray, points, None,
+            winSize=(self.config['win_size'], self.config['win_size']),
+            maxLevel=self.config['max_level']
+        )
+        if next_points is None:
+            return None, 'lost'
+
+        points = points.reshape(-1, 2)
+        next_points = next_points.reshape(-1, 2)
+        visible = self.landmarks[:, 3] >= self.config['min_visibility']
+        tracked = (
+            visible
+            & (status.ravel() == 1)
+            & (error.ravel() < self.config['max_flow_error'])
+        )
+
+        # 传播置信度：可见关键点中成功跟踪的比例
+        if not visible.any() or not tracked.any():
+            return None, 'lost'
+        confidence = tracked.sum() / visible.sum()
+        if confidence < self.config['min_confidence']:
+            return None, 'confidence'
+
+        displacement = next_points[tracked] - points[tracked]
+        motion = np.median(np.linalg.norm(displacement, axis=1)) / np.hypot(width, height)
+        if motion > self.config['max_motion']:
+            return None, 'motion'
+
+        # 跟踪失败的关键点沿用整体的中位位移
+        shift = np.median(displacement, axis=0)
+        new_points = np.where(tracked[:, None], next_points, points + shift)
+
+        landmarks = self.landmarks.copy()
+        landmarks[:, :2] = new_points / scale
+        return landmarks, None
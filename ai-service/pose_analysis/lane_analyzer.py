@@ -0,0 +1,155 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from utils.metrics import stage
+
+
+def parse_lanes(value):
+    """解析泳道配置：JSON数组，每条泳道为归一化坐标 [x0, y0, x1, y1]"""
+    if not value:
+        return None
+    lanes = json.loads(value) if isinstance(value, str) else value
+    parsed = []
+    for lane in lanes:
+        if len(lane) != 4:
+            raise ValueError('泳道格式应为 [x0, y0, x1, y1]')
+        x0, y0, x1, y1 = (float(v) for v in lane)
+        if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+            raise ValueError('泳道坐标应为0到1之间的归一化坐标，且 x0 < x1、y0 < y1')
+        parsed.append((x0, y0, x1, y1))
+    return parsed
+
+
+class LaneAnalyzer:
+    """多人泳道模式：一个画面中同时分析多条射箭道上的射手
+
+    泳道来自配置的区域（ROI），未配置时用 OpenCV 的 HOG 行人检测器定位射手并按从左到右编号。
+    各泳道裁剪后并行做姿态推理。跟踪实例按泳道编号分池，携带的上一帧ROI只来自同一泳道的射手。
+    """
+
+    def __init__(self, pose_analyzer, config=None):
+        self.pose_analyzer = pose_analyzer
+        self.config = {
+            'lanes': parse_lanes(os.getenv('LANE_ROIS')),  # 默认泳道区域
+            'max_lanes': 4,            # 最多分析的射手数
+            'detect_width': 640,       # 行人检测前缩放到的宽度
+            'detect_threshold': 0.5,   # 行人检测置信度阈值
+            'nms_threshold': 0.3,      # 行人框非极大值抑制的IoU阈值
+            'padding': 0.15            # 检测框向外扩展的比例（HOG框常截掉手臂和弓）
+        }
+        if config:
+            self.config.update(config)
+
+        # 行人检测器仅在未配置泳道时使用，首次检测时创建
+        self._hog = None
+        # 各泳道空闲的姿态跟踪实例（list 的 pop/append 是原子操作）
+        self._lane_trackers = [[] for _ in range(self.config['max_lanes'])]
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config['max_lanes'], thread_name_prefix='lane'
+        )
+
+    def analyze_frame(self, frame, lanes=None):
+        """分析一帧中的所有泳道，lanes 为归一化ROI列表，省略时使用配置或行人检测"""
+        height, width = frame.shape[:2]
+        lanes = lanes or self.config['lanes']
+        if lanes:
+            boxes = [
+                (int(x0 * width), int(y0 * height), int(x1 * width), int(y1 * height))
+                for x0, y0, x1, y1 in lanes[:self.config['max_lanes']]
+            ]
+            source = 'roi'
+        else:
+            boxes = self._detect_archers(frame)
+            source = 'detector'
+            if not boxes:
+                raise ValueError('未检测到射手')
+
+        results = list(self._executor.map(
+            lambda lane: self._analyze_lane(frame, *lane), enumerate(boxes)
+        ))
+        return {
+            'frame_size': [width, height],
+            'source': source,
+            'archers_detected': sum(result['detected'] for result in results),
+            'lanes': [{'lane': i, **result} for i, result in enumerate(results)]
+        }
+
+    def _detect_archers(self, frame):
+        """HOG行人检测，返回按从左到右排序的像素框 (x0, y0, x1, y1)"""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.config['detect_width'] / width)
+        hog = self._person_detector()
+        with stage('pose', 'person_detect'):
+            small = cv2.resize(frame, None, fx=scale, fy=scale) if scale < 1.0 else frame
+            rects, weights = hog.detectMultiScale(
+                small, winStride=(8, 8), padding=(8, 8), scale=1.05
+            )
+        if not len(rects):
+            return []
+
+        weights = np.asarray(weights, dtype=np.float32).ravel()
+        keep = cv2.dnn.NMSBoxes(
+            [list(map(int, r)) for r in rects], weights.tolist(),
+            self.config['detect_threshold'], self.config['nms_threshold']
+        )
+        keep = np.asarray(keep, dtype=np.int64).ravel()
+        # 置信度最高的 max_lanes 个
+        keep = keep[np.argsort(-weights[keep])][:self.config['max_lanes']]
+
+        pad = self.config['padding']
+        boxes = []
+        for x, y, w, h in rects[keep] / scale:
+            boxes.append((
+                int(max(0, x - w * pad)), int(max(0, y - h * pad)),
+                int(min(width, x + w * (1 + pad))), int(min(height, y + h * (1 + pad)))
+            ))
+        return sorted(boxes, key=lambda box: box[0] + box[2])
+
+    def _person_detector(self):
+        if self._hog is None:
+            if not hasattr(cv2, 'HOGDescriptor'):
+                raise ValueError('当前 OpenCV 版本不支持行人检测，请配置泳道区域')
+            hog = cv2.HOGDescriptor()
+            hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+            self._hog = hog
+        return self._hog
+
+    @contextmanager
+    def _lane_tracker(self, lane):
+        """取出该泳道的一个空闲跟踪实例，用完归还"""
+        idle = self._lane_trackers[lane]
+        try:
+            tracker = idle.pop()
+        except IndexError:
+            tracker = self.pose_analyzer._create_tracker()
+        try:
+            yield tracker
+        finally:
+            idle.append(tracker)
+
+    def _analyze_lane(self, frame, lane, box):
+        x0, y0, x1, y1 = box
+        result = {'box': [x0, y0, x1, y1], 'detected': False}
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return result
+        crop = np.ascontiguousarray(frame[y0:y1, x0:x1])
+
+        with self._lane_tracker(lane) as tracker:
+            landmarks = self.pose_analyzer._detect_landmarks(crop, tracker)
+        if landmarks is None:
+            return result
+
+        # 角度和评分基于裁剪区域内的坐标，与单人模式一致；返回的关键点换算为整帧的归一化坐标
+        result.update(self.pose_analyzer._analyze_landmarks(landmarks))
+        height, width = frame.shape[:2]
+        mapped = landmarks.copy()
+        mapped[:, 0] = (landmarks[:, 0] * (x1 - x0) + x0) / width
+        mapped[:, 1] = (landmarks[:, 1] * (y1 - y0) + y0) / height
+        result['detected'] = True
+        result['landmarks'] = mapped
+        return result
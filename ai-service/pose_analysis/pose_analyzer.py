@@ -1,45 +1,180 @@
 import cv2
 import numpy as np
 import mediapipe as mp
-import tensorflow as tf
+from contextlib import contextmanager
 from pathlib import Path
 import tempfile
+import time
 import os
 
+from inference.client import InferenceClient, RemoteModel, RemotePoseClassifier
+from pose_analysis.frame_store import AnalysisStore, FrameColumns
+from pose_analysis.keyframe_tracker import KeyframeTracker
+from pose_analysis.lane_analyzer import LaneAnalyzer, parse_lanes
+from pose_analysis.pose_classifier import PoseClassifier, compare_classifications
+from pose_analysis.scoring import (
+    generate_recommendations, load_rules, overall_analysis, rules_version, score_angles
+)
+from pose_analysis.shot_consistency import ShotConsistencyAnalyzer
+from utils.metrics import count_frames, stage
+from utils.model_registry import ReloadableModel
+
+
+# 渐进分析时，目标帧在当前位置之后不超过该帧数则顺序跳过，否则按帧号定位
+MAX_SEQUENTIAL_SKIP = 15
+
+
+def progressive_levels(n):
+    """粗到细的采样顺序，产出 (stride, positions)
+    
+    第一级取间隔最大的均匀样本，之后每级填充上一级相邻样本的中点；
+    完成 stride 对应的级别后，0..n-1 中所有 stride 的倍数均已覆盖。
+    """
+    stride = 1
+    while stride * 2 < n:
+        stride *= 2
+    yield stride, range(0, n, stride)
+    while stride > 1:
+        half = stride // 2
+        yield half, range(half, n, stride)
+        stride = half
+
+
+def create_pose():
+    """创建MediaPipe姿态检测实例（视频模式，跨帧跟踪）"""
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=2,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.7
+    )
+
+
+def detect_landmarks(pose, frame):
+    """用给定的姿态检测实例推理一帧，返回 (33, 4) 的关键点数组 [x, y, z, visibility]"""
+    # 转换颜色空间
+    with stage('pose', 'color_convert'):
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    # 检测姿态
+    with stage('pose', 'inference'):
+        pose_results = pose.process(frame_rgb)
+    
+    if pose_results.pose_landmarks is None:
+        return None
+    
+    return np.array([
+        [lm.x, lm.y, lm.z, lm.visibility]
+        for lm in pose_results.pose_landmarks.landmark
+    ])
+
+
+class RunningAnalysis:
+    """流式累计总体分析结果，与 _calculate_overall_analysis 的计算方式一致
+    
+    稳定性的均值和标准差用 Welford 算法在线更新，无需保留逐帧分数。
+    """
+    
+    def __init__(self, consistency_penalty=10):
+        self.consistency_penalty = consistency_penalty
+        self.count = 0
+        self.stability_mean = 0.0
+        self.stability_m2 = 0.0
+        self.accuracy_sum = 0.0
+    
+    def add(self, scores):
+        self.count += 1
+        delta = scores['stability'] - self.stability_mean
+        self.stability_mean += delta / self.count
+        self.stability_m2 += delta * (scores['stability'] - self.stability_mean)
+        
+        joint_scores = scores['joint_scores']
+        self.accuracy_sum += sum(joint_scores.values()) / len(joint_scores)
+    
+    def stability_ci95(self):
+        """平均稳定性分数的95%置信区间半宽"""
+        return 1.96 * np.sqrt(self.stability_m2 / self.count) / np.sqrt(self.count)
+    
+    def result(self):
+        std_stability = np.sqrt(self.stability_m2 / self.count)
+        return {
+            'stability': self.stability_mean,
+            'consistency': 100 - (std_stability * self.consistency_penalty),
+            'accuracy': self.accuracy_sum / self.count
+        }
+
+
 class PoseAnalyzer:
     def __init__(self):
-        # 初始化MediaPipe姿态检测
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=2,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.7
-        )
         
-        # 加载TensorFlow模型
-        self.model = self._load_model()
+        # 设置 INFERENCE_SERVER_SOCKET 时，姿态检测和分类由本机推理服务执行，本进程不加载模型
+        self.inference = InferenceClient.from_env()
         
-        # 理想姿势的关键点角度
-        self.ideal_angles = {
-            'shoulder': 90,  # 肩部角度
-            'elbow': 90,    # 肘部角度
-            'wrist': 180,   # 手腕角度
-            'spine': 180,   # 脊柱角度
-            'knee': 175     # 膝盖角度
-        }
+        # 空闲的姿态跟踪实例（本地为MediaPipe实例，推理服务模式为会话ID）：
+        # 并发的分析各取一个，实例数等于历史最大并发数，由准入控制的并发上限约束
+        self._idle_trackers = [self._create_tracker()]
+        
+        if self.inference is not None:
+            self.models = RemoteModel(self.inference, 'pose', RemotePoseClassifier(self.inference))
+        else:
+            # 加载姿态分类模型：模型注册表的当前版本，后台检测到新版本时预热后切换
+            self.models = ReloadableModel(
+                'pose', self._load_model,
+                fallback_dir=Path(__file__).parent / 'models',
+                warmup=self._warmup_model,
+                compare=compare_classifications
+            )
+            self.models.start()
+        
+        # 多人泳道模式
+        self.lane_analyzer = LaneAnalyzer(self)
+        
+        # 多射次一致性比较
+        self.consistency_analyzer = ShotConsistencyAnalyzer()
+        
+        # 设置 ANALYSIS_STORE_DIR 时保存逐帧分析结果的列式数据，供导出和离线分析
+        self.store = AnalysisStore.from_env()
+        
+        # 评分规则（理想角度、扣分和建议阈值），SCORING_RULES_FILE 可覆盖默认值
+        self.scoring = load_rules()
+        self.ideal_angles = self.scoring['ideal_angles']
 
-    def _load_model(self):
+    @property
+    def model(self):
+        return self.models.model
+
+    def _load_model(self, model_dir):
         """加载预训练模型"""
-        model_path = Path(__file__).parent / 'models' / 'archery_pose_model.h5'
-        if model_path.exists():
-            return tf.keras.models.load_model(str(model_path))
-        return None
+        return PoseClassifier.load(model_dir / 'archery_pose_model.h5')
+
+    def _warmup_model(self, model):
+        """切换前先执行一次推理，完成张量分配和图构建"""
+        model.predict_windows(np.zeros(
+            (model.config['sequence_length'], model.config['num_features']), dtype=np.float32
+        ))
 
     def is_ready(self):
         """检查服务是否准备就绪"""
         return self.model is not None
 
+    def _create_tracker(self):
+        if self.inference is not None:
+            return self.inference.new_session()
+        return create_pose()
+
+    @contextmanager
+    def _tracker(self):
+        """取出一个空闲的姿态跟踪实例，用完归还（list 的 pop/append 是原子操作）"""
+        try:
+            tracker = self._idle_trackers.pop()
+        except IndexError:
+            tracker = self._create_tracker()
+        try:
+            yield tracker
+        finally:
+            self._idle_trackers.append(tracker)
+
     def analyze_video(self, video_file, params):
         """分析视频文件"""
         # 保存上传的视频文件
@@ -68,65 +203,391 @@ class PoseAnalyzer:
                 'recommendations': []
             }
             
+            # 限时渐进模式不使用锚帧跟踪
+            keyframe_mode = params.get('tracking') == 'keyframe' and not params.get('deadline')
+            stats = {}
+            # 逐帧结果以列式数组累计，不为每帧保留嵌套字典
+            columns = FrameColumns()
+            
+            for idx, landmarks, frame_result, interpolated, frame in self._iter_frame_results(cap, fps, params, stats):
+                columns.append(idx, idx / fps, landmarks, frame_result, interpolated)
+                
+                if params['save_keyframes'] and frame is not None and len(results['keyframes']) < 5:
+                    self._save_keyframe(results, frame, idx / fps, frame_result['scores'])
+            
+            if (keyframe_mode or 'coverage' in stats) and not len(columns):
+                raise ValueError('未检测到姿态')
+            
+            if 'coverage' in stats:
+                # 渐进模式按粗到细的顺序分析，结果按时间排序
+                columns.sort()
+                results['coverage'] = stats['coverage']
+                results['coverage']['stability_ci95'] = self._stability_ci95(columns['stability'])
+            
+            if keyframe_mode:
+                # 锚帧推理 + 光流传播的稠密逐帧角度序列
+                results['frame_series'] = columns.frame_series()
+                results['interpolated_frames'] = columns['frame_index'][columns['interpolated']].tolist()
+                results['tracking'] = stats['tracking']
+            
+            classification = self._classify_sequence(
+                columns['frame_index'].tolist(), columns.features(), fps, stats
+            )
+            if classification is not None:
+                results['classification'] = classification
+            
+            # 计算总体分析结果
+            with stage('pose', 'aggregate'):
+                results['analysis'] = self._calculate_overall_analysis(columns)
+                results['recommendations'] = self._generate_recommendations(results['analysis'])
+            
+            # frame_format=columnar 时逐帧结果以列式数组返回，默认为逐帧字典列表
+            if params.get('frame_format') == 'columnar':
+                del results['posture_scores']
+                results['frames'] = columns.to_dict()
+            else:
+                results['posture_scores'] = columns.posture_scores()
+            
+            if self.store is not None:
+                results['analysis_id'] = self.store.save(columns, {
+                    'fps': fps,
+                    'frame_count': frame_count,
+                    'tracking': 'progressive' if 'coverage' in stats else params.get('tracking', 'full'),
+                    'analysis': results['analysis'],
+                    'recommendations': results['recommendations'],
+                    'scoring_version': rules_version(self.scoring)
+                })
+            
+            return results
+            
+        finally:
+            # 清理临时文件
+            os.unlink(video_path)
+            cap.release()
+
+    def iter_video_analysis(self, video_file, params):
+        """流式分析视频，返回事件迭代器
+        
+        依次产出 start、逐帧的 frame（及 keyframe）事件，最后产出包含总体分析和建议的 result 事件。
+        总体分析由流式累计得到；逐帧结果仅在需要分类或存储时以列式数组保留。
+        上传文件在调用时立即保存（流式响应开始后请求中的文件可能已关闭）。
+        """
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_video:
+            video_path = temp_video.name
+        try:
+            video_file.save(video_path)
+        except BaseException:
+            os.unlink(video_path)
+            raise
+        
+        events = self._iter_video_events(video_path, params)
+        # 先取出 start 事件，使生成器进入 try 块：之后无论迭代完成、关闭还是被回收都会清理临时文件
+        start = next(events)
+        
+        def chained():
+            yield start
+            yield from events
+        
+        return chained()
+
+    def _iter_video_events(self, video_path, params):
+        """iter_video_analysis 的事件生成器，结束时删除视频文件"""
+        cap = None
+        try:
+            cap = cv2.VideoCapture(video_path)
+            fps = int(cap.get(cv2.CAP_PROP_FPS))
+            stats = {}
+            yield {
+                'event': 'start',
+                'fps': fps,
+                'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                'tracking': 'progressive' if params.get('deadline') else params.get('tracking', 'full')
+            }
+            
+            running = RunningAnalysis(self.scoring['consistency_penalty'])
+            keyframes = {'keyframes': []}
+            # 分类和结果存储需要完整的逐帧数据，以列式数组累计
+            columns = FrameColumns() if self.model is not None or self.store is not None else None
+            for idx, landmarks, frame_result, interpolated, frame in self._iter_frame_results(cap, fps, params, stats):
+                running.add(frame_result['scores'])
+                if columns is not None:
+                    columns.append(idx, idx / fps, landmarks, frame_result, interpolated)
+                yield {
+                    'event': 'frame',
+                    'frame_index': idx,
+                    'timestamp': idx / fps,
+                    'interpolated': interpolated,
+                    'scores': frame_result['scores'],
+                    'angles': frame_result['angles']
+                }
+                
+                if params['save_keyframes'] and frame is not None and len(keyframes['keyframes']) < 5:
+                    self._save_keyframe(keyframes, frame, idx / fps, frame_result['scores'])
+                    yield {'event': 'keyframe', **keyframes['keyframes'][-1]}
+            
+            if running.count == 0:
+                raise ValueError('未检测到姿态')
+            
+            with stage('pose', 'aggregate'):
+                analysis = running.result()
+                result = {
+                    'event': 'result',
+                    'frames': running.count,
+                    'analysis': analysis,
+                    'recommendations': self._generate_recommendations(analysis),
+                    'keyframes': keyframes['keyframes']
+                }
+            result.update(stats)
+            if 'coverage' in stats:
+                result['coverage']['stability_ci95'] = running.stability_ci95()
+            if columns is not None:
+                classification = self._classify_sequence(
+                    columns['frame_index'].tolist(), columns.features(), fps, stats
+                )
+                if classification is not None:
+                    result['classification'] = classification
+                if self.store is not None:
+                    columns.sort()
+                    result['analysis_id'] = self.store.save(columns, {
+                        'fps': fps,
+                        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                        'tracking': 'progressive' if 'coverage' in stats else params.get('tracking', 'full'),
+                        'analysis': analysis,
+                        'recommendations': result['recommendations'],
+                        'scoring_version': rules_version(self.scoring)
+                    })
+            yield result
+        
+        finally:
+            if cap is not None:
+                cap.release()
+            os.unlink(video_path)
+
+    def _iter_frame_results(self, cap, fps, params, stats):
+        """逐帧产出 (frame_idx, landmarks, frame_result, interpolated, frame)
+        
+        frame 仅在完整推理的帧上提供（用于保存关键帧），传播帧为 None。
+        结束后将锚帧跟踪统计写入 stats['tracking']，渐进模式的覆盖率写入 stats['coverage']。
+        """
+        # 每个视频独占一个姿态跟踪实例，并发分析的视频互不干扰
+        with self._tracker() as tracker:
+            yield from self._iter_tracked_frames(
+                cap, fps, params, stats, lambda frame: self._detect_landmarks(frame, tracker)
+            )
+
+    def _iter_tracked_frames(self, cap, fps, params, stats, detect):
+        frame_interval = max(1, fps // params['frame_rate'])
+        
+        if params.get('deadline'):
+            # 限时渐进分析：由粗到细采样，到期返回已有结果
+            yield from self._iter_progressive(cap, fps, frame_interval, params['deadline'], stats, detect)
+            return
+        
+        if params.get('tracking') != 'keyframe':
             frame_idx = 0
             while cap.isOpened():
-                ret, frame = cap.read()
+                with stage('pose', 'video_decode'):
+                    ret, frame = cap.read()
                 if not ret:
                     break
-                    
+                
                 if frame_idx % frame_interval == 0:
                     # 分析帧
-                    frame_result = self.analyze_frame(frame)
-                    results['posture_scores'].append(frame_result['scores'])
-                    
-                    if params['save_keyframes'] and len(results['keyframes']) < 5:
-                        # 保存关键帧
-                        keyframe_path = f'keyframe_{len(results["keyframes"])}.jpg'
-                        cv2.imwrite(keyframe_path, frame)
-                        results['keyframes'].append({
-                            'path': keyframe_path,
-                            'timestamp': frame_idx / fps,
-                            'scores': frame_result['scores']
-                        })
+                    landmarks = detect(frame)
+                    if landmarks is None:
+                        raise ValueError('未检测到姿态')
+                    count_frames('pose', 'inferred')
+                    yield frame_idx, landmarks, self._analyze_landmarks(landmarks), False, frame
                 
                 frame_idx += 1
+            return
+        
+        # 仅在锚帧执行完整推理，其余帧由光流传播关键点
+        tracker = KeyframeTracker(detect, {
+            'anchor_interval': params.get('anchor_interval')
+        })
+        
+        def analyze_entries(entries, frame=None, current_idx=None):
+            for idx, landmarks, interpolated in entries:
+                frame_result = self._analyze_landmarks(landmarks)
+                count_frames('pose', 'interpolated' if interpolated else 'inferred')
+                # 关键帧仅取自完整推理的锚帧
+                anchor_frame = frame if not interpolated and idx == current_idx else None
+                yield idx, landmarks, frame_result, interpolated, anchor_frame
+        
+        frame_idx = 0
+        while cap.isOpened():
+            with stage('pose', 'video_decode'):
+                ret, frame = cap.read()
+            if not ret:
+                break
             
-            # 计算总体分析结果
-            results['analysis'] = self._calculate_overall_analysis(results['posture_scores'])
-            results['recommendations'] = self._generate_recommendations(results['analysis'])
+            if frame_idx % frame_interval == 0:
+                yield from analyze_entries(tracker.process(frame_idx, frame), frame, frame_idx)
             
-            return results
+            frame_idx += 1
+        
+        yield from analyze_entries(tracker.flush())
+        stats['tracking'] = {'mode': 'keyframe', **tracker.stats}
+
+    def _iter_progressive(self, cap, fps, frame_interval, deadline, stats, detect):
+        """限时渐进分析
+        
+        先以最大间隔均匀采样整段视频，再逐级填充相邻样本的中点，直到全部采样帧分析完或时间用尽。
+        每帧开始前按平均单帧耗时预测，来不及完成则停止（至少分析一帧）。
+        """
+        deadline_at = time.monotonic() + deadline
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        sample_frames = range(0, max(frame_count, 0), frame_interval)
+        
+        analyzed = []
+        detected = 0
+        completed_stride = None
+        frame_cost = 0.0
+        position = 0
+        timed_out = False
+        
+        for stride, positions in progressive_levels(len(sample_frames)):
+            for pos in positions:
+                now = time.monotonic()
+                if analyzed and now + frame_cost > deadline_at:
+                    timed_out = True
+                    break
+                
+                frame_idx = sample_frames[pos]
+                frame, position = self._read_frame_at(cap, frame_idx, position)
+                if frame is not None:
+                    landmarks = detect(frame)
+                    analyzed.append(frame_idx)
+                    count_frames('pose', 'inferred')
+                    if landmarks is not None:
+                        detected += 1
+                        yield frame_idx, landmarks, self._analyze_landmarks(landmarks), False, frame
+                
+                # 单帧耗时（含定位解码）的滑动平均
+                cost = time.monotonic() - now
+                frame_cost = cost if frame_cost == 0.0 else 0.8 * frame_cost + 0.2 * cost
             
-        finally:
-            # 清理临时文件
-            os.unlink(video_path)
-            cap.release()
+            if timed_out:
+                break
+            completed_stride = stride
+        
+        # 相邻已分析帧之间（含首尾）的最大时间间隔
+        duration = max(frame_count, 1) / fps if fps > 0 else 0.0
+        edges = [0.0] + sorted(idx / fps for idx in analyzed) + [duration] if fps > 0 else [0.0]
+        
+        stats['coverage'] = {
+            'deadline': deadline,
+            'complete': not timed_out,
+            'target_frames': len(sample_frames),
+            'analyzed_frames': len(analyzed),
+            'detected_frames': detected,
+            'ratio': len(analyzed) / len(sample_frames) if len(sample_frames) else 0.0,
+            'sample_stride_frames': completed_stride * frame_interval if completed_stride else None,
+            'max_gap_seconds': max(b - a for a, b in zip(edges, edges[1:])) if len(edges) > 1 else 0.0
+        }
+
+    def _read_frame_at(self, cap, frame_idx, position):
+        """读取指定帧，返回 (帧或None, 读取后的位置)
+        
+        目标帧在当前位置之后不远时顺序跳过（grab 不解码像素），否则按帧号定位。
+        """
+        with stage('pose', 'video_decode'):
+            skip = frame_idx - position
+            if 0 <= skip <= MAX_SEQUENTIAL_SKIP:
+                for _ in range(skip):
+                    cap.grab()
+            else:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            ret, frame = cap.read()
+        return (frame if ret else None), frame_idx + 1
+
+    def _classify_sequence(self, frame_indices, features, fps, stats):
+        """对逐帧关键点序列做滑动窗口分类
+        
+        渐进模式未完成时帧不连续，不进行分类；未加载模型时返回None。
+        """
+        version, model = self.models.get()
+        if model is None:
+            return None
+        if 'coverage' in stats and not stats['coverage']['complete']:
+            return None
+        
+        order = np.argsort(frame_indices, kind='stable')
+        sequence = np.asarray(features, dtype=np.float32).reshape(-1, 99)[order]
+        indices = [frame_indices[i] for i in order]
+        
+        start = time.perf_counter()
+        classification = model.classify(sequence, indices, fps)
+        elapsed = time.perf_counter() - start
+        classification.setdefault('model_version', version)
+        
+        # 影子模式：按抽样在后台用候选版本重复分类并记录差异
+        self.models.shadow(
+            lambda candidate: candidate.classify(sequence, indices, fps), classification, elapsed
+        )
+        return classification
+
+    def _stability_ci95(self, stabilities):
+        """平均稳定性分数的95%置信区间半宽，采样越少越宽"""
+        return 1.96 * np.std(stabilities) / np.sqrt(len(stabilities))
+
+    def _save_keyframe(self, results, frame, timestamp, scores):
+        """保存关键帧"""
+        keyframe_path = f'keyframe_{len(results["keyframes"])}.jpg'
+        cv2.imwrite(keyframe_path, frame)
+        results['keyframes'].append({
+            'path': keyframe_path,
+            'timestamp': timestamp,
+            'scores': scores
+        })
 
     def analyze_frame(self, frame):
         """分析单帧图像"""
         if isinstance(frame, (str, Path)):
-            frame = cv2.imread(str(frame))
-        
-        # 转换颜色空间
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            with stage('pose', 'decode'):
+                frame = cv2.imread(str(frame))
         
         # 检测姿态
-        pose_results = self.pose.process(frame_rgb)
+        with self._tracker() as tracker:
+            landmarks = self._detect_landmarks(frame, tracker)
         
-        if pose_results.pose_landmarks is None:
+        if landmarks is None:
             raise ValueError('未检测到姿态')
         
-        # 提取关键点
-        landmarks = pose_results.pose_landmarks.landmark
+        return self._analyze_landmarks(landmarks)
+
+    def analyze_lanes(self, frame, lanes=None):
+        """多人泳道模式：分析一帧中各泳道的射手，lanes 为归一化ROI列表或其JSON"""
+        if isinstance(frame, (str, Path)):
+            with stage('pose', 'decode'):
+                frame = cv2.imread(str(frame))
         
+        return self.lane_analyzer.analyze_frame(frame, parse_lanes(lanes))
+
+    def analyze_consistency(self, shots, phases=None):
+        """比较多个射次的关节角度序列，返回距离矩阵、参考模板和各阶段偏差"""
+        return self.consistency_analyzer.analyze(shots, phases)
+
+    def _detect_landmarks(self, frame, tracker):
+        """用给定的姿态跟踪实例执行完整姿态推理，返回 (33, 4) 的关键点数组 [x, y, z, visibility]"""
+        if self.inference is not None:
+            with stage('pose', 'inference'):
+                return self.inference.pose_landmarks(frame, tracker)
+        return detect_landmarks(tracker, frame)
+
+    def _analyze_landmarks(self, landmarks):
+        """根据关键点计算角度、评分和建议"""
         # 计算关键角度
-        angles = self._calculate_angles(landmarks)
+        with stage('pose', 'angles'):
+            angles = self._calculate_angles(landmarks)
         
-        # 评估姿势
-        scores = self._evaluate_pose(angles)
-        
-        # 生成建议
-        suggestions = self._generate_pose_suggestions(scores)
+        with stage('pose', 'scoring'):
+            # 评估姿势
+            scores = self._evaluate_pose(angles)
+            
+            # 生成建议
+            suggestions = self._generate_pose_suggestions(scores)
         
         return {
             'scores': scores,
@@ -137,9 +598,9 @@ class PoseAnalyzer:
     def _calculate_angles(self, landmarks):
         """计算关键点之间的角度"""
         def calculate_angle(a, b, c):
-            a = np.array([a.x, a.y])
-            b = np.array([b.x, b.y])
-            c = np.array([c.x, c.y])
+            a = a[:2]
+            b = b[:2]
+            c = c[:2]
             
             radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
             angle = np.abs(radians * 180.0 / np.pi)
@@ -178,82 +639,44 @@ class PoseAnalyzer:
 
     def _evaluate_pose(self, angles):
         """评估姿势质量"""
-        scores = {}
+        # 与离线重新评分共用向量化的评分规则
+        joints = list(angles)
+        joint_scores, stability = score_angles([list(angles.values())], joints, self.scoring)
         
-        # 计算每个角度与理想角度的差异
-        for joint, angle in angles.items():
-            ideal = self.ideal_angles.get(joint)
-            if ideal is not None:
-                diff = abs(angle - ideal)
-                score = max(0, 100 - (diff * 2))  # 每偏差1度扣2分
-                scores[joint] = score
-        
-        # 计算总体稳定性分数
-        stability = sum(scores.values()) / len(scores)
+        # 只保留有理想角度的关节
+        scores = {
+            joint: score for joint, score in zip(joints, joint_scores[0].tolist())
+            if not np.isnan(score)
+        }
         
         return {
             'joint_scores': scores,
-            'stability': stability
+            'stability': float(stability[0])
         }
 
     def _calculate_overall_analysis(self, frame_scores):
-        """计算视频的总体分析结果"""
-        # 计算稳定性（帧间分数的一致性）
-        stabilities = [score['stability'] for score in frame_scores]
-        mean_stability = np.mean(stabilities)
-        std_stability = np.std(stabilities)
-        
-        # 计算一致性（动作的重复性）
-        consistency = 100 - (std_stability * 10)  # 标准差越小，一致性越高
-        
-        # 计算准确性（与理想姿势的接近程度）
-        accuracies = []
-        for score in frame_scores:
-            joint_scores = score['joint_scores']
-            accuracy = sum(joint_scores.values()) / len(joint_scores)
-            accuracies.append(accuracy)
-        
-        mean_accuracy = np.mean(accuracies)
+        """计算视频的总体分析结果，frame_scores 为逐帧评分列表或 FrameColumns"""
+        if isinstance(frame_scores, FrameColumns):
+            return overall_analysis(frame_scores['stability'], frame_scores['joint_scores'], self.scoring)
         
-        return {
-            'stability': mean_stability,
-            'consistency': consistency,
-            'accuracy': mean_accuracy
-        }
+        stabilities = [score['stability'] for score in frame_scores]
+        # 每帧的准确性为该帧各关节评分的平均值
+        accuracies = [
+            [sum(score['joint_scores'].values()) / len(score['joint_scores'])]
+            for score in frame_scores
+        ]
+        return overall_analysis(stabilities, accuracies, self.scoring)
 
     def _generate_recommendations(self, analysis):
         """生成改进建议"""
-        recommendations = []
-        
-        if analysis['stability'] < 85:
-            recommendations.append({
-                'type': 'warning',
-                'title': '姿势稳定性',
-                'description': '建议加强核心力量训练，保持重心稳定。可以尝试单腿站立练习来提升平衡能力。'
-            })
-        
-        if analysis['consistency'] < 80:
-            recommendations.append({
-                'type': 'warning',
-                'title': '动作一致性',
-                'description': '动作重复性不够，建议增加基础动作练习，培养肌肉记忆。'
-            })
-        
-        if analysis['accuracy'] < 90:
-            recommendations.append({
-                'type': 'warning',
-                'title': '姿势准确性',
-                'description': '与标准姿势有一定差距，建议对照标准姿势视频进行练习。'
-            })
-        
-        return recommendations
+        return generate_recommendations(analysis, self.scoring)
 
     def _generate_pose_suggestions(self, scores):
         """生成单帧姿势的改进建议"""
         suggestions = []
         
         for joint, score in scores['joint_scores'].items():
-            if score < 80:
+            if score < self.scoring['suggestion_threshold']:
                 suggestions.append({
                     'type': 'warning',
                     'joint': joint,
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from utils.metrics import observe_batch_size, stage
+
+logger = logging.getLogger(__name__)
+
+
+class PoseClassifier:
+    """LSTM姿态分类器的滑动窗口批量推理
+
+    输入为逐帧的99维关键点向量（33个关键点 * x,y,z，与 PoseModelTrainer 的训练格式一致），
+    按 sequence_length 帧的窗口、window_stride 帧的步长切分后成批推理。
+    优先使用由 .h5 转换并缓存的 TFLite 模型，转换失败时使用固定输入签名的 tf.function 图执行。
+    """
+
+    def __init__(self, model_path, config=None):
+        self.model_path = Path(model_path)
+        self.tflite_path = self.model_path.with_suffix('.tflite')
+
+        # 推理配置
+        self.config = {
+            'sequence_length': 30,  # 窗口帧数（与训练一致）
+            'num_features': 99,     # 33个关键点 * 3(x,y,z)
+            'window_stride': 5,     # 相邻窗口的起点间隔（帧）
+            'batch_size': 32,       # 每次推理的窗口数
+            'backend': os.getenv('POSE_CLASSIFIER_BACKEND', 'auto'),  # auto / tflite / tf_function
+            'num_threads': int(os.getenv('POSE_CLASSIFIER_THREADS', 2))
+        }
+        if config:
+            self.config.update(config)
+
+        self.labels = self._load_labels()
+        self.backend = None
+        self._predict = None
+        # TFLite 解释器不是线程安全的
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def load(cls, model_path, config=None):
+        """模型文件存在时创建分类器，否则返回None"""
+        if not Path(model_path).exists():
+            return None
+        return cls(model_path, config)
+
+    def _load_labels(self):
+        """加载训练时保存的标签映射，缺失时以类别序号作为标签"""
+        label_path = self.model_path.parent / 'label_map.json'
+        if not label_path.exists():
+            return None
+        with open(label_path, 'r') as f:
+            label_map = json.load(f)
+        return [label_map[str(i)] for i in range(len(label_map))]
+
+    def _load(self):
+        backend = self.config['backend']
+        if backend in ('auto', 'tflite'):
+            try:
+                self._load_tflite()
+                return
+            except Exception as e:
+                if backend == 'tflite':
+                    raise
+                logger.warning('TFLite模型不可用，使用tf.function推理: %s', e)
+        self._load_tf_function()
+
+    def _load_tflite(self):
+        """加载（必要时转换并缓存）TFLite模型"""
+        if (not self.tflite_path.exists()
+                or self.tflite_path.stat().st_mtime < self.model_path.stat().st_mtime):
+            self._convert_tflite()
+
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        interpreter = Interpreter(
+            model_path=str(self.tflite_path), num_threads=self.config['num_threads']
+        )
+        input_index = interpreter.get_input_details()[0]['index']
+        # 固定批大小，末批补零，避免不同批大小反复分配张量
+        interpreter.resize_tensor_input(input_index, [
+            self.config['batch_size'], self.config['sequence_length'], self.config['num_features']
+        ])
+        interpreter.allocate_tensors()
+        output_index = interpreter.get_output_details()[0]['index']
+
+        def predict(batch):
+            with self._lock:
+                interpreter.set_tensor(input_index, batch)
+                interpreter.invoke()
+                return interpreter.get_tensor(output_index).copy()
+
+        self._predict = predict
+        self.backend = 'tflite'
+
+    def _convert_tflite(self):
+        """将Keras模型转换为TFLite，原子写入 .tflite（多个worker可能同时转换）"""
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(str(self.model_path))
+        converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            [self._graph_function(model).get_concrete_function()], model
+        )
+        tflite_model = converter.convert()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.tflite_path.parent, prefix='.tmp-', suffix='.tflite')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(tflite_model)
+        os.replace(tmp_path, self.tflite_path)
+
+    def _graph_function(self, model):
+        """固定输入签名（批次维度可变）的图执行函数"""
+        import tensorflow as tf
+
+        return tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(
+                [None, self.config['sequence_length'], self.config['num_features']], tf.float32
+            )]
+        )
+
+    def _load_tf_function(self):
+        """图执行推理"""
+        import tensorflow as tf
+
+        run_model = self._graph_function(tf.keras.models.load_model(str(self.model_path)))
+        self._predict = lambda batch: run_model(batch).numpy()
+        self.backend = 'tf_function'
+
+    def window_starts(self, num_frames):
+        """滑动窗口的起始位置"""
+        sequence_length = self.config['sequence_length']
+        if num_frames < sequence_length:
+            return np.zeros(0, dtype=np.int64)
+        return np.arange(0, num_frames - sequence_length + 1, self.config['window_stride'])
+
+    def make_windows(self, sequence):
+        """将 (帧数, 99) 的序列切分为窗口，返回 (窗口起点, (窗口数, sequence_length, 99) 的视图)"""
+        sequence = np.ascontiguousarray(sequence, dtype=np.float32)
+        starts = self.window_starts(len(sequence))
+        if not len(starts):
+            return starts, np.zeros(
+                (0, self.config['sequence_length'], self.config['num_features']), dtype=np.float32
+            )
+        windows = np.lib.stride_tricks.sliding_window_view(
+            sequence, self.config['sequence_length'], axis=0
+        )[starts].transpose(0, 2, 1)
+        return starts, windows
+
+    def predict_windows(self, sequence):
+        """对 (帧数, 99) 的序列做滑动窗口推理，返回 (窗口起点, 各类别概率)"""
+        starts, windows = self.make_windows(sequence)
+        return starts, self.predict_batch(windows)
+
+    def predict_batch(self, windows):
+        """按 batch_size 分批推理 (窗口数, sequence_length, 99) 的窗口，返回各类别概率"""
+        if not len(windows):
+            return np.zeros((0, len(self.labels or ())), dtype=np.float32)
+
+        batch_size = self.config['batch_size']
+        probabilities = []
+        for offset in range(0, len(windows), batch_size):
+            batch = np.ascontiguousarray(windows[offset:offset + batch_size])
+            count = len(batch)
+            if self.backend == 'tflite' and count < batch_size:
+                batch = np.concatenate([
+                    batch, np.zeros((batch_size - count,) + batch.shape[1:], dtype=np.float32)
+                ])
+            observe_batch_size('pose_classifier', count)
+            with stage('pose', 'classify'):
+                probabilities.append(self._predict(batch)[:count])
+        return np.concatenate(probabilities)
+
+    def classify(self, sequence, frame_indices, fps):
+        """分类逐帧关键点序列，返回每个窗口的类别和置信度及整体汇总"""
+        starts, probabilities = self.predict_windows(sequence)
+        return self.build_classification(starts, probabilities, frame_indices, fps)
+
+    def build_classification(self, starts, probabilities, frame_indices, fps):
+        """由窗口概率生成分类结果"""
+        sequence_length = self.config['sequence_length']
+        labels = self.labels or [str(i) for i in range(probabilities.shape[1])]
+
+        windows = []
+        for start, probs in zip(starts, probabilities):
+            class_idx = int(np.argmax(probs))
+            start_frame = frame_indices[start]
+            end_frame = frame_indices[start + sequence_length - 1]
+            windows.append({
+                'start_frame': start_frame,
+                'end_frame': end_frame,
+                'start_time': start_frame / fps,
+                'end_time': end_frame / fps,
+                'class': labels[class_idx],
+                'confidence': float(probs[class_idx])
+            })
+
+        summary = None
+        if windows:
+            # 各窗口概率的平均作为整段视频的分类
+            mean_probs = probabilities.mean(axis=0)
+            class_idx = int(np.argmax(mean_probs))
+            summary = {
+                'class': labels[class_idx],
+                'confidence': float(mean_probs[class_idx]),
+                'distribution': {
+                    label: sum(w['class'] == label for w in windows) / len(windows)
+                    for label in labels
+                }
+            }
+
+        return {
+            'backend': self.backend,
+            'window_length': sequence_length,
+            'window_stride': self.config['window_stride'],
+            'windows': windows,
+            'summary': summary
+        }
+
+
+def compare_classifications(primary, candidate):
+    """影子模式下比较两个版本的分类结果"""
+    primary_windows = primary['windows']
+    candidate_windows = candidate['windows']
+    agreement = None
+    confidence_diff = None
+    if primary_windows and len(primary_windows) == len(candidate_windows):
+        agreement = float(np.mean([
+            p['class'] == c['class'] for p, c in zip(primary_windows, candidate_windows)
+        ]))
+        confidence_diff = float(np.mean([
+            abs(p['confidence'] - c['confidence']) for p, c in zip(primary_windows, candidate_windows)
+        ]))
+
+    primary_class = primary['summary']['class'] if primary['summary'] else None
+    candidate_class = candidate['summary']['class'] if candidate['summary'] else None
+    return {
+        'agree': primary_class == candidate_class,
+        'primary_class': primary_class,
+        'candidate_class': candidate_class,
+        'window_agreement': agreement,
+        'confidence_diff': confidence_diff
+    }
@@ -0,0 +1,139 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from pose_analysis.frame_store import AnalysisStore
+from pose_analysis.scoring import (
+    generate_recommendations, load_rules, rules_version, score_angles, segment_analysis
+)
+from utils.thread_budget import available_cpus
+
+STAT_KEYS = ('rescored', 'skipped', 'missing', 'frames', 'recommendations_changed')
+
+
+def rescore_chunk(root, analysis_ids, rules, force=False, dry_run=False):
+    """重新评分一批分析（在worker进程中执行），返回统计
+
+    批内关节相同的分析的角度列合并为一个数组，逐帧评分和各分析的总体结果各做一次向量化计算，再逐个写回。
+    评分规则版本与保存时相同的分析跳过（force 时仍重新评分）。
+    """
+    store = AnalysisStore(root)
+    version = rules_version(rules)
+    stats = dict.fromkeys(STAT_KEYS, 0)
+
+    groups = {}
+    for analysis_id in analysis_ids:
+        try:
+            meta, columns = store.load(analysis_id, columns=('angles',))
+        except (KeyError, FileNotFoundError):
+            # 评分期间被删除
+            stats['missing'] += 1
+            continue
+        if not meta['frames'] or (meta.get('scoring_version') == version and not force):
+            stats['skipped'] += 1
+            continue
+        groups.setdefault(tuple(meta['joints']), []).append((analysis_id, meta, columns['angles']))
+
+    for joints, entries in groups.items():
+        counts = np.array([len(angles) for _, _, angles in entries])
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        joint_scores, stability = score_angles(
+            np.concatenate([angles for _, _, angles in entries]), joints, rules
+        )
+        analyses = segment_analysis(stability, joint_scores, offsets, rules)
+
+        for i, (analysis_id, meta, _) in enumerate(entries):
+            analysis = {name: float(values[i]) for name, values in analyses.items()}
+            recommendations = generate_recommendations(analysis, rules)
+            previous = meta.get('recommendations')
+            if previous is not None and previous != recommendations:
+                stats['recommendations_changed'] += 1
+            if not dry_run:
+                frames = slice(offsets[i], offsets[i] + counts[i])
+                store.update(analysis_id, {
+                    'joint_scores': joint_scores[frames],
+                    'stability': stability[frames]
+                }, {
+                    'analysis': analysis,
+                    'recommendations': recommendations,
+                    'scoring_version': version,
+                    'rescored_at': time.time()
+                })
+            stats['rescored'] += 1
+            stats['frames'] += int(counts[i])
+    return stats
+
+
+def rescore(store, analysis_ids, rules, workers=1, chunk_size=256, force=False, dry_run=False, progress=None):
+    """按 chunk_size 个分析一批重新评分，workers 大于1时分发到进程池，返回汇总统计
+
+    同时提交的批次不超过 worker 数的两倍，ID列表之外不在主进程中保留分析数据。
+    """
+    chunks = [analysis_ids[i:i + chunk_size] for i in range(0, len(analysis_ids), chunk_size)]
+    totals = dict.fromkeys(STAT_KEYS, 0)
+
+    def collect(stats):
+        for key in STAT_KEYS:
+            totals[key] += stats[key]
+        if progress is not None:
+            progress(totals)
+
+    if workers <= 1:
+        for chunk in chunks:
+            collect(rescore_chunk(str(store.root), chunk, rules, force, dry_run))
+        return totals
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+            pending.add(executor.submit(rescore_chunk, str(store.root), chunk, rules, force, dry_run))
+        for future in pending:
+            collect(future.result())
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评分规则修改后批量重新评分已保存的姿态分析')
+    parser.add_argument('--store', default=os.getenv('ANALYSIS_STORE_DIR'),
+                        help='分析结果存储目录（默认 ANALYSIS_STORE_DIR）')
+    parser.add_argument('--rules', default=None,
+                        help='评分规则 JSON 文件（默认 SCORING_RULES_FILE，均未设置时为默认规则）')
+    parser.add_argument('--ids', nargs='+', default=None, help='只重新评分指定的分析ID')
+    parser.add_argument('--workers', type=int, default=max(1, math.floor(available_cpus())),
+                        help='进程数（默认为可用CPU数）')
+    parser.add_argument('--chunk-size', type=int, default=256, help='每批的分析数')
+    parser.add_argument('--force', action='store_true', help='规则版本未变化的分析也重新评分')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不写回')
+    args = parser.parse_args()
+    if not args.store:
+        parser.error('需要 --store 或 ANALYSIS_STORE_DIR')
+
+    store = AnalysisStore(args.store)
+    rules = load_rules(args.rules)
+    analysis_ids = args.ids or store.ids()
+    print(f'评分规则版本 {rules_version(rules)}，共 {len(analysis_ids)} 个分析，{args.workers} 个进程')
+
+    def progress(totals):
+        done = totals['rescored'] + totals['skipped'] + totals['missing']
+        print(f'  {done}/{len(analysis_ids)} 个分析，{totals["frames"]} 帧')
+
+    start = time.perf_counter()
+    totals = rescore(store, analysis_ids, rules, args.workers, args.chunk_size,
+                     args.force, args.dry_run, progress)
+    elapsed = time.perf_counter() - start
+    print(f'重新评分 {totals["rescored"]} 个（跳过 {totals["skipped"]}，不存在 {totals["missing"]}），'
+          f'{totals["frames"]} 帧，建议变化 {totals["recommendations_changed"]} 个，'
+          f'耗时 {elapsed:.1f}s（{totals["frames"] / max(elapsed, 1e-9):.0f} 帧/秒）'
+          + ('，未写回' if args.dry_run else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import copy
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# 姿势评分规则，修改后可用 python -m pose_analysis.rescore 重新评分已保存的分析
+DEFAULT_RULES = {
+    # 理想姿势的关键点角度
+    'ideal_angles': {
+        'shoulder': 90,  # 肩部角度
+        'elbow': 90,    # 肘部角度
+        'wrist': 180,   # 手腕角度
+        'spine': 180,   # 脊柱角度
+        'knee': 175     # 膝盖角度
+    },
+    'degree_penalty': 2,         # 每偏差1度扣的分数
+    'consistency_penalty': 10,   # 稳定性标准差每增加1扣的一致性分数
+    'suggestion_threshold': 80,  # 单帧关节评分低于该值时给出调整建议
+    # 总体分析低于阈值时给出改进建议
+    'recommendation_thresholds': {
+        'stability': 85,
+        'consistency': 80,
+        'accuracy': 90
+    }
+}
+
+RECOMMENDATIONS = (
+    ('stability', '姿势稳定性', '建议加强核心力量训练，保持重心稳定。可以尝试单腿站立练习来提升平衡能力。'),
+    ('consistency', '动作一致性', '动作重复性不够，建议增加基础动作练习，培养肌肉记忆。'),
+    ('accuracy', '姿势准确性', '与标准姿势有一定差距，建议对照标准姿势视频进行练习。')
+)
+
+
+def load_rules(path=None):
+    """评分规则：DEFAULT_RULES 合并 JSON 文件（path，默认 SCORING_RULES_FILE）中的覆盖项
+
+    字典类规则按键合并，理想角度设为 null 时该关节不参与评分。
+    """
+    rules = copy.deepcopy(DEFAULT_RULES)
+    path = path or os.getenv('SCORING_RULES_FILE')
+    if not path:
+        return rules
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+    for key, value in overrides.items():
+        if key not in rules:
+            raise ValueError(f'未知的评分规则: {key}')
+        if isinstance(rules[key], dict):
+            rules[key].update(value)
+        else:
+            rules[key] = value
+    return rules
+
+
+def rules_version(rules):
+    """评分规则的指纹，随分析结果保存，用于判断是否需要重新评分"""
+    canonical = json.dumps(rules, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+
+def score_angles(angles, joints, rules):
+    """向量化的关节评分，angles 为 (帧数, 关节数) 数组，返回 (关节评分, 稳定性)
+
+    没有理想角度的关节评分为NaN，稳定性为有评分关节的平均分。
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    ideal = np.array([rules['ideal_angles'].get(joint) for joint in joints], dtype=np.float64)
+    scores = np.fmax(0, 100 - np.abs(angles - ideal) * rules['degree_penalty'])
+    scores[:, np.isnan(ideal)] = np.nan
+
+    scored = ~np.isnan(scores)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stability = np.where(scored, scores, 0).sum(axis=1) / scored.sum(axis=1)
+    return scores, stability
+
+
+def segment_analysis(stabilities, joint_scores, offsets, rules):
+    """多个分析的总体结果，offsets 为各分析在逐帧数组中的起始位置（各段非空）
+
+    返回 {'stability', 'consistency', 'accuracy'} 三个数组，每个分析一项。
+    """
+    stabilities = np.asarray(stabilities, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(np.append(offsets, len(stabilities)))
+
+    mean_stability = np.add.reduceat(stabilities, offsets) / counts
+    deviation = stabilities - np.repeat(mean_stability, counts)
+    std_stability = np.sqrt(np.add.reduceat(deviation * deviation, offsets) / counts)
+
+    # 每帧的准确性为有评分关节的平均分
+    joint_scores = np.asarray(joint_scores, dtype=np.float64)
+    scored = ~np.isnan(joint_scores)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        accuracy = np.where(scored, joint_scores, 0).sum(axis=1) / scored.sum(axis=1)
+
+    return {
+        'stability': mean_stability,
+        'consistency': 100 - std_stability * rules['consistency_penalty'],  # 标准差越小，一致性越高
+        'accuracy': np.add.reduceat(accuracy, offsets) / counts
+    }
+
+
+def overall_analysis(stabilities, joint_scores, rules):
+    """一次分析的总体结果，没有帧时各项为NaN"""
+    if not len(stabilities):
+        return {'stability': np.nan, 'consistency': np.nan, 'accuracy': np.nan}
+    analysis = segment_analysis(stabilities, joint_scores, [0], rules)
+    return {name: float(values[0]) for name, values in analysis.items()}
+
+
+def generate_recommendations(analysis, rules):
+    """总体分析低于阈值的指标给出改进建议"""
+    thresholds = rules['recommendation_thresholds']
+    return [
+        {'type': 'warning', 'title': title, 'description': description}
+        for metric, title, description in RECOMMENDATIONS
+        if analysis[metric] < thresholds[metric]
+    ]
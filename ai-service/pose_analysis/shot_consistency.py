@@ -0,0 +1,299 @@
+import numpy as np
+
+from utils.metrics import stage
+
+# 默认动作阶段：(名称, 在整个射次中的起点比例)，依次为举弓、开弓、靠位瞄准、撒放随势
+DEFAULT_PHASES = (('raise', 0.0), ('draw', 0.25), ('anchor', 0.5), ('release', 0.85))
+
+
+def shots_from_series(frame_series, boundaries=None, prefix=''):
+    """按射次边界切分逐帧角度序列（姿态分析的 frame_series）
+
+    boundaries 为 [[起始帧, 结束帧], ...]（含两端），省略时整段作为一个射次。
+    """
+    frame_indices = np.asarray(frame_series['frame_indices'])
+    angles = {
+        joint: np.asarray(values, dtype=np.float32)
+        for joint, values in frame_series['angles'].items()
+    }
+    if not boundaries:
+        boundaries = [(frame_indices[0], frame_indices[-1])] if len(frame_indices) else []
+
+    shots = []
+    for i, (start, end) in enumerate(boundaries):
+        mask = (frame_indices >= start) & (frame_indices <= end)
+        shots.append({
+            'id': f'{prefix}{i}',
+            'angles': {joint: values[mask] for joint, values in angles.items()}
+        })
+    return shots
+
+
+def collect_shots(shots=None, analyses=None):
+    """合并直接给出的射次和从多次分析结果中切分出的射次
+
+    analyses 中每项为带 frame_series 的姿态分析结果，可附带 shot_boundaries 和 id。
+    """
+    collected = list(shots or [])
+    for i, analysis in enumerate(analyses or []):
+        if 'frame_series' not in analysis:
+            raise ValueError('分析结果缺少逐帧角度序列（需使用 tracking=keyframe 分析）')
+        prefix = f"{analysis.get('id', i)}-"
+        collected.extend(shots_from_series(
+            analysis['frame_series'], analysis.get('shot_boundaries'), prefix
+        ))
+    return collected
+
+
+def banded_dtw(a, b, radius, keep_cost=False):
+    """带 Sakoe-Chiba 约束带的DTW，在所有序列对上向量化计算
+
+    a、b 为 (关节数, 帧数, 对数) 的等长序列（序列对在最内层，每步都是连续内存上的向量运算），
+    逐帧代价为各关节角度差的平均绝对值。累计代价按约束带坐标保存：
+    第 i 行第 k 列对应 (i, i + k - radius)。
+    返回每对的累计代价 (对数,)，keep_cost 时另返回 (帧数, 2*radius+1, 对数) 的累计代价矩阵。
+    """
+    joints, length, pairs = a.shape
+    width = 2 * radius + 1
+
+    # 约束带内的逐帧代价 (2*radius+1, 帧数, 对数)，超出序列范围的位置为无穷大
+    cost = np.full((width, length, pairs), np.inf, dtype=np.float32)
+    buffer = np.empty((length, pairs), dtype=np.float32)
+    for k in range(width):
+        offset = k - radius
+        lo, hi = max(0, -offset), min(length, length - offset)
+        band, diff = cost[k, lo:hi], buffer[:hi - lo]
+        band[...] = 0
+        for j in range(joints):
+            np.subtract(a[j, lo:hi], b[j, lo + offset:hi + offset], out=diff)
+            band += np.abs(diff, out=diff)
+        band /= joints
+
+    accumulated = np.empty((length, width, pairs), dtype=np.float32) if keep_cost else None
+    # 首行只能从 (0, 0) 水平前进
+    previous = np.full((width, pairs), np.inf, dtype=np.float32)
+    previous[radius:] = np.cumsum(cost[radius:, 0], axis=0)
+    if keep_cost:
+        accumulated[0] = previous
+
+    vertical = np.full((width, pairs), np.inf, dtype=np.float32)
+    for i in range(1, length):
+        row = cost[:, i]
+        # 对角前驱 (i-1, j-1) 在上一行同一列，竖直前驱 (i-1, j) 在上一行右侧一列
+        vertical[:-1] = previous[1:]
+        current = row + np.minimum(previous, vertical)
+        # 水平前驱 (i, j-1) 在同一行，按列依次递推
+        for k in range(1, width):
+            np.minimum(current[k], row[k] + current[k - 1], out=current[k])
+        if keep_cost:
+            accumulated[i] = current
+        previous = current
+
+    if keep_cost:
+        return previous[radius], accumulated
+    return previous[radius]
+
+
+def dtw_align(template, sequences, radius):
+    """将各序列对齐到模板
+
+    template 为 (关节数, 帧数)，sequences 为 (关节数, 帧数, 序列数)，
+    返回 (序列数, 帧数, 关节数)：模板每帧对应的序列帧的平均值。
+    """
+    joints, length, count = sequences.shape
+    _, accumulated = banded_dtw(
+        np.broadcast_to(template[:, :, None], sequences.shape), sequences, radius, keep_cost=True
+    )
+    values = sequences.transpose(2, 1, 0)
+
+    sums = np.zeros((count, length, joints), dtype=np.float64)
+    counts = np.zeros((count, length), dtype=np.int64)
+    rows = np.arange(count)
+    i = np.full(count, length - 1)
+    k = np.full(count, radius)
+    active = np.ones(count, dtype=bool)
+    # 从终点回溯最优路径，所有序列同步后退
+    while active.any():
+        idx = rows[active]
+        ia, ka = i[active], k[active]
+        j = ia + ka - radius
+        np.add.at(sums, (idx, ia), values[idx, j])
+        np.add.at(counts, (idx, ia), 1)
+
+        finished = (ia == 0) & (j == 0)
+        previous_row = np.maximum(ia - 1, 0)
+        diagonal = np.where(ia > 0, accumulated[previous_row, ka, idx], np.inf)
+        vertical = np.where(
+            (ia > 0) & (ka < 2 * radius),
+            accumulated[previous_row, np.minimum(ka + 1, 2 * radius), idx], np.inf
+        )
+        horizontal = np.where(ka > 0, accumulated[ia, np.maximum(ka - 1, 0), idx], np.inf)
+        step = np.argmin(np.stack([diagonal, vertical, horizontal]), axis=0)
+
+        i[idx] = np.where(step == 2, ia, ia - 1)
+        k[idx] = np.where(step == 1, ka + 1, np.where(step == 2, ka - 1, ka))
+        active[idx[finished]] = False
+
+    return (sums / counts[:, :, None]).astype(np.float32)
+
+
+class ShotConsistencyAnalyzer:
+    """多射次动作一致性分析
+
+    各射次的关节角度序列重采样到相同帧数后，用带约束带的动态时间规整（DTW）两两对齐，
+    得到射次间距离矩阵（单位为度：对齐后逐帧角度偏差的平均值）。
+    与其余射次距离之和最小的射次（medoid）作为参考模板，各射次对齐到模板后按动作阶段统计偏差。
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            'resample_length': 64,   # 每个射次重采样到的帧数
+            'band': 0.1,             # 约束带半宽占序列长度的比例
+            'min_frames': 5,         # 射次的最少帧数
+            'max_shots': 1000,       # 单次请求的最大射次数
+            'pair_chunk': 4096,      # 每批计算的射次对数，限制代价矩阵的内存占用
+            'phases': DEFAULT_PHASES
+        }
+        if config:
+            self.config.update(config)
+
+    def analyze(self, shots, phases=None):
+        """比较多个射次，shots 为 [{'id', 'angles': {关节: [逐帧角度]}}]"""
+        if len(shots) < 2:
+            raise ValueError('至少需要两个射次')
+        if len(shots) > self.config['max_shots']:
+            raise ValueError(f"射次数超过上限 {self.config['max_shots']}")
+        phases = self._parse_phases(phases or self.config['phases'])
+
+        with stage('pose', 'consistency_prepare'):
+            ids, joints, frames, sequences = self._resample(shots)
+        length = self.config['resample_length']
+        radius = max(1, int(round(self.config['band'] * length)))
+
+        with stage('pose', 'consistency_dtw'):
+            # 关节优先布局 (关节数, 帧数, 射次数)
+            planes = np.ascontiguousarray(sequences.transpose(2, 1, 0))
+            distances = self.distance_matrix(planes, radius)
+            template = int(np.argmin(distances.sum(axis=1)))
+            aligned = dtw_align(planes[:, :, template], planes, radius)
+
+        with stage('pose', 'consistency_phases'):
+            return self._build_result(
+                ids, joints, frames, sequences, distances, template, aligned, phases, radius
+            )
+
+    def distance_matrix(self, planes, radius):
+        """所有射次两两的DTW距离，planes 为 (关节数, 帧数, 射次数)，返回 (射次数, 射次数) 的对称矩阵"""
+        _, length, count = planes.shape
+        first, second = np.triu_indices(count, 1)
+        distances = np.zeros((count, count), dtype=np.float32)
+        chunk = self.config['pair_chunk']
+        for offset in range(0, len(first), chunk):
+            a = first[offset:offset + chunk]
+            b = second[offset:offset + chunk]
+            values = banded_dtw(
+                np.take(planes, a, axis=2), np.take(planes, b, axis=2), radius
+            ) / length
+            distances[a, b] = values
+            distances[b, a] = values
+        return distances
+
+    def _resample(self, shots):
+        """校验射次并将角度序列线性重采样为 (射次数, resample_length, 关节数)"""
+        joints = None
+        for shot in shots:
+            shot_joints = [joint for joint in shot['angles']]
+            joints = shot_joints if joints is None else [j for j in joints if j in shot_joints]
+        if not joints:
+            raise ValueError('射次之间没有共同的关节角度')
+
+        length = self.config['resample_length']
+        target = np.linspace(0, 1, length)
+        ids, frames = [], []
+        sequences = np.empty((len(shots), length, len(joints)), dtype=np.float32)
+        for i, shot in enumerate(shots):
+            ids.append(str(shot.get('id', i)))
+            series = np.asarray([shot['angles'][joint] for joint in joints], dtype=np.float64)
+            if series.ndim != 2 or series.shape[1] < self.config['min_frames']:
+                raise ValueError(f"射次 {ids[-1]} 的帧数不足 {self.config['min_frames']}")
+            if not np.isfinite(series).all():
+                raise ValueError(f'射次 {ids[-1]} 包含无效的角度值')
+            source = np.linspace(0, 1, series.shape[1])
+            for j, values in enumerate(series):
+                sequences[i, :, j] = np.interp(target, source, values)
+            frames.append(series.shape[1])
+        return ids, joints, frames, sequences
+
+    def _parse_phases(self, phases):
+        """阶段配置 [(名称, 起点比例), ...]，起点需从0开始递增"""
+        parsed = [(str(name), float(start)) for name, start in phases]
+        starts = [start for _, start in parsed]
+        if not parsed or starts[0] != 0 or any(b <= a for a, b in zip(starts, starts[1:])) or starts[-1] >= 1:
+            raise ValueError('动作阶段的起点应从0开始递增且小于1')
+        return parsed
+
+    def _build_result(self, ids, joints, frames, sequences, distances, template, aligned, phases, radius):
+        length = sequences.shape[1]
+        others = np.arange(len(ids)) != template
+        template_distance = distances[template]
+
+        # 对齐后与模板的逐帧偏差，(射次数, 帧数, 关节数)
+        difference = aligned - sequences[template]
+        deviation = np.abs(difference)
+
+        # 距模板的距离超出四分位距1.5倍的射次视为异常
+        q1, q3 = np.percentile(template_distance[others], [25, 75])
+        outlier_limit = q3 + 1.5 * (q3 - q1)
+
+        bounds = [int(round(start * length)) for _, start in phases] + [length]
+        phase_results = []
+        shot_phase_deviation = np.empty((len(ids), len(phases)), dtype=np.float32)
+        for p, (name, start) in enumerate(phases):
+            lo, hi = bounds[p], max(bounds[p + 1], bounds[p] + 1)
+            # (射次数, 关节数)
+            phase_deviation = deviation[:, lo:hi].mean(axis=1)
+            phase_bias = difference[:, lo:hi].mean(axis=1)
+            shot_phase_deviation[:, p] = phase_deviation.mean(axis=1)
+            phase_results.append({
+                'name': name,
+                'start': start,
+                'end': phases[p + 1][1] if p + 1 < len(phases) else 1.0,
+                'deviation': float(phase_deviation[others].mean()),
+                'joints': {
+                    joint: {
+                        'deviation': float(phase_deviation[others, j].mean()),
+                        'bias': float(phase_bias[others, j].mean())
+                    }
+                    for j, joint in enumerate(joints)
+                }
+            })
+
+        mean_distance = float(template_distance[others].mean())
+        return {
+            'shot_count': len(ids),
+            'joints': joints,
+            'resample_length': length,
+            'band_radius': radius,
+            # 与单帧评分一致：每偏差1度扣2分
+            'consistency': max(0.0, 100 - mean_distance * 2),
+            'mean_distance': mean_distance,
+            'template': {
+                'id': ids[template],
+                'index': template,
+                'angles': {joint: sequences[template, :, j] for j, joint in enumerate(joints)}
+            },
+            'shots': [
+                {
+                    'id': shot_id,
+                    'frames': frames[i],
+                    'distance_to_template': float(template_distance[i]),
+                    'outlier': bool(others[i] and template_distance[i] > outlier_limit),
+                    'phase_deviation': {
+                        name: float(shot_phase_deviation[i, p]) for p, (name, _) in enumerate(phases)
+                    }
+                }
+                for i, shot_id in enumerate(ids)
+            ],
+            'phases': phase_results,
+            'distance_matrix': distances
+        }
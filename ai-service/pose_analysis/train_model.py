@@ -9,87 +9,193 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Dropout, LSTM
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
 import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from pose_analysis.feature_store import LandmarkFeatureStore
+from pose_analysis.pose_classifier import PoseClassifier
+from pose_analysis.window_dataset import build_window_dataset
+from utils.evaluation import classification_metrics, run_batched, write_report
+from utils.file_hash import hash_file
+from utils.model_registry import ModelRegistry
+
+# 特征提取子进程各自持有的MediaPipe实例和特征库
+_worker_pose = None
+_worker_store = None
+
+
+def _create_pose():
+    """创建用于训练数据提取的MediaPipe姿态检测实例"""
+    return mp.solutions.pose.Pose(
+        static_image_mode=True,
+        model_complexity=2,
+        min_detection_confidence=0.7
+    )
+
+
+def _init_extraction_worker(store_root):
+    """特征提取子进程初始化"""
+    global _worker_pose, _worker_store
+    _worker_pose = _create_pose()
+    _worker_store = LandmarkFeatureStore(store_root)
+
+
+def _extract_worker(video_path):
+    """在子进程中哈希并提取单个视频，特征直接写入特征库"""
+    store = _worker_store
+    key = hash_file(video_path)
+    
+    # 内容相同的视频（如上次提取中断前已写入）无需重新提取
+    if store.has(key):
+        return video_path, key, len(store.load(key))
+    
+    sequence = extract_landmark_sequence(_worker_pose, video_path)
+    store.put(key, sequence)
+    return video_path, key, len(sequence)
+
+
+def extract_landmark_sequence(pose, video_path, max_frames=None):
+    """从视频中提取关键点序列，返回 (帧数, 99) 的float32数组"""
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        
+        # 转换颜色空间
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        
+        # 检测姿态
+        results = pose.process(frame_rgb)
+        if results.pose_landmarks is None:
+            continue
+        
+        # 提取关键点坐标
+        landmarks = np.array([[lm.x, lm.y, lm.z] for lm in results.pose_landmarks.landmark])
+        frames.append(landmarks.flatten())  # 展平为一维数组
+        
+        if max_frames is not None and len(frames) >= max_frames:
+            break
+    
+    cap.release()
+    
+    if not frames:
+        return np.zeros((0, 99), dtype=np.float32)
+    return np.array(frames, dtype=np.float32)
 
 class PoseModelTrainer:
     def __init__(self):
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
-            min_detection_confidence=0.7
-        )
+        # 串行提取时才创建，避免特征提取进程池 fork 时继承已初始化的MediaPipe图
+        self._pose = None
         
         # 模型保存路径
         self.model_dir = Path(__file__).parent / 'models'
         self.model_dir.mkdir(exist_ok=True)
         
+        # 关键点特征库路径
+        self.feature_store = LandmarkFeatureStore(Path(__file__).parent / 'feature_store')
+        
         # 训练配置
         self.config = {
             'sequence_length': 30,  # 每个训练序列的帧数
             'num_features': 99,     # 33个关键点 * 3(x,y,z)
-            'num_classes': 5,       # 动作类别数
+            'num_classes': 5,       # 动作类别数，prepare_dataset 按标签映射更新
             'batch_size': 32,
             'epochs': 100,
-            'validation_split': 0.2
+            'validation_split': 0.2,
+            'window_stride': 5,        # 相邻滑动窗口的起点间隔（帧）
+            'shuffle_buffer': 10000,   # 窗口索引打乱缓冲区大小
+            'num_workers': os.cpu_count() or 1,  # 特征提取进程数
+            'manifest_flush_interval': 20  # 每提取多少个视频保存一次清单
         }
 
+    @property
+    def pose(self):
+        """串行路径（_extract_pose_sequence）使用的MediaPipe实例，首次使用时创建"""
+        if self._pose is None:
+            self._pose = _create_pose()
+        return self._pose
+
+    def extract_features(self, data_dir):
+        """并行提取数据目录下所有视频的关键点序列到特征库，未变化的视频直接跳过"""
+        videos = sorted(Path(data_dir).glob('**/*.mp4'))
+        store = self.feature_store
+        
+        pending = [video_path for video_path in videos if store.lookup(video_path) is None]
+        print(f"共 {len(videos)} 个视频，需提取 {len(pending)} 个")
+        if not pending:
+            return
+        
+        completed = 0
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.config['num_workers'],
+                initializer=_init_extraction_worker,
+                initargs=(store.root,)
+            ) as executor:
+                futures = [executor.submit(_extract_worker, video_path) for video_path in pending]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="提取姿态特征"):
+                    video_path, key, num_frames = future.result()
+                    store.record(video_path, key, num_frames)
+                    
+                    completed += 1
+                    if completed % self.config['manifest_flush_interval'] == 0:
+                        store.save_manifest()
+        finally:
+            # 中断时保留已完成的进度，下次运行从断点继续
+            store.save_manifest()
+
     def prepare_dataset(self, data_dir):
-        """准备训练数据集"""
+        """准备训练数据集，按视频划分训练集和验证集
+
+        返回 (train_entries, val_entries)，每项为 (特征键, 类别序号, 帧数)。
+        """
         data_dir = Path(data_dir)
-        sequences = []
-        labels = []
+        videos = []
+        
+        # 提取（或复用）所有训练视频的关键点特征
+        self.extract_features(data_dir)
         
         # 遍历所有训练视频
-        for video_path in data_dir.glob('**/*.mp4'):
+        for video_path in sorted(data_dir.glob('**/*.mp4')):
+            entry = self.feature_store.lookup(video_path)
+            
+            # 如果帧数不足一个窗口，则丢弃该视频
+            if entry is None or entry['frames'] < self.config['sequence_length']:
+                continue
+            
             label = video_path.parent.name  # 使用父目录名作为标签
-            sequence = self._extract_pose_sequence(video_path)
-            if sequence is not None:
-                sequences.append(sequence)
-                labels.append(label)
-        
-        # 转换为numpy数组
-        X = np.array(sequences)
-        y = pd.get_dummies(labels).values  # one-hot编码
+            videos.append((entry['key'], label, entry['frames']))
         
         # 保存标签映射
-        label_map = {i: label for i, label in enumerate(pd.get_dummies(labels).columns)}
+        label_names = sorted({label for _, label, _ in videos})
+        label_map = {i: label for i, label in enumerate(label_names)}
         with open(self.model_dir / 'label_map.json', 'w') as f:
             json.dump(label_map, f)
+        # 输出层和 one-hot 标签的维度与实际类别数一致
+        self.config['num_classes'] = len(label_map)
+        
+        label_index = {label: i for i, label in label_map.items()}
+        entries = [(key, label_index[label], frames) for key, label, frames in videos]
         
-        return train_test_split(X, y, test_size=0.2, random_state=42)
+        # 按视频划分，避免同一视频的窗口同时出现在训练集和验证集
+        return train_test_split(entries, test_size=0.2, random_state=42)
 
     def _extract_pose_sequence(self, video_path):
         """从视频中提取姿态序列"""
-        cap = cv2.VideoCapture(str(video_path))
-        frames = []
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 转换颜色空间
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # 检测姿态
-            results = self.pose.process(frame_rgb)
-            if results.pose_landmarks is None:
-                continue
-            
-            # 提取关键点坐标
-            landmarks = np.array([[lm.x, lm.y, lm.z] for lm in results.pose_landmarks.landmark])
-            frames.append(landmarks.flatten())  # 展平为一维数组
-            
-            if len(frames) >= self.config['sequence_length']:
-                break
-        
-        cap.release()
+        sequence = extract_landmark_sequence(
+            self.pose, video_path, max_frames=self.config['sequence_length']
+        )
         
         # 如果帧数不足，则丢弃该序列
-        if len(frames) < self.config['sequence_length']:
+        if len(sequence) < self.config['sequence_length']:
             return None
         
-        return np.array(frames[:self.config['sequence_length']])
+        return sequence
 
     def build_model(self):
         """构建LSTM模型"""
@@ -115,7 +221,9 @@ class PoseModelTrainer:
     def train(self, data_dir):
         """训练模型"""
         print("准备数据集...")
-        X_train, X_test, y_train, y_test = self.prepare_dataset(data_dir)
+        train_entries, val_entries = self.prepare_dataset(data_dir)
+        train_dataset = build_window_dataset(self.feature_store, train_entries, self.config, training=True)
+        val_dataset = build_window_dataset(self.feature_store, val_entries, self.config, training=False)
         
         print("构建模型...")
         model = self.build_model()
@@ -136,10 +244,9 @@ class PoseModelTrainer:
         
         print("开始训练...")
         history = model.fit(
-            X_train, y_train,
-            validation_data=(X_test, y_test),
+            train_dataset,
+            validation_data=val_dataset,
             epochs=self.config['epochs'],
-            batch_size=self.config['batch_size'],
             callbacks=callbacks
         )
         
@@ -149,38 +256,101 @@ class PoseModelTrainer:
         
         # 评估模型
         print("\n评估模型...")
-        test_loss, test_accuracy = model.evaluate(X_test, y_test)
+        test_loss, test_accuracy = model.evaluate(val_dataset)
         print(f"测试集准确率: {test_accuracy:.4f}")
         
         return history
 
     def evaluate_model(self, test_dir):
         """评估模型在测试集上的表现"""
-        model = tf.keras.models.load_model(str(self.model_dir / 'archery_pose_model.h5'))
+        model_path = self.model_dir / 'archery_pose_model.h5'
+        model = tf.keras.models.load_model(str(model_path))
         
         # 加载标签映射
         with open(self.model_dir / 'label_map.json', 'r') as f:
             label_map = json.load(f)
         
+        # 提取（或复用）测试视频的关键点特征
+        self.extract_features(test_dir)
+        
+        videos = []
+        sequences = []
+        for video_path in sorted(Path(test_dir).glob('**/*.mp4')):
+            entry = self.feature_store.lookup(video_path)
+            if entry is None or entry['frames'] < self.config['sequence_length']:
+                continue
+            videos.append(video_path)
+            sequences.append(np.array(self.feature_store.load(entry['key'])[:self.config['sequence_length']]))
+        
+        # 编译为图执行，批次维度可变，避免逐样本调用 predict
+        predict = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(
+                [None, self.config['sequence_length'], self.config['num_features']], tf.float32
+            )]
+        )
+        predictions, timing = run_batched(
+            lambda batch: list(predict(np.stack(batch)).numpy()),
+            sequences,
+            self.config['batch_size']
+        )
+        
         results = []
-        for video_path in Path(test_dir).glob('**/*.mp4'):
-            sequence = self._extract_pose_sequence(video_path)
-            if sequence is not None:
-                prediction = model.predict(np.expand_dims(sequence, axis=0))
-                predicted_class = label_map[str(np.argmax(prediction[0]))]
-                true_class = video_path.parent.name
-                
-                results.append({
-                    'video': str(video_path),
-                    'true_class': true_class,
-                    'predicted_class': predicted_class,
-                    'confidence': float(np.max(prediction[0]))
-                })
+        for video_path, prediction in zip(videos, predictions):
+            results.append({
+                'video': str(video_path),
+                'true_class': video_path.parent.name,
+                'predicted_class': label_map[str(np.argmax(prediction))],
+                'confidence': float(np.max(prediction))
+            })
         
         # 保存评估结果
         pd.DataFrame(results).to_csv(self.model_dir / 'evaluation_results.csv', index=False)
+        
+        known_labels = [label_map[str(i)] for i in range(len(label_map))]
+        unknown_labels = sorted({r['true_class'] for r in results} - set(known_labels))
+        metrics = classification_metrics(
+            [r['true_class'] for r in results],
+            [r['predicted_class'] for r in results],
+            labels=known_labels + unknown_labels
+        )
+        write_report(
+            self.model_dir / 'evaluation_report.json',
+            'pose_classification', model_path, metrics, timing, self.config
+        )
+        print(f"宏平均F1: {metrics['macro_f1']:.4f}, 吞吐量: {timing['throughput'] or 0:.1f} 序列/秒")
         return results
 
+    def publish_model(self, promote=False):
+        """发布到模型注册表
+        
+        已有当前版本时新版本默认作为影子候选，确认影子对比结果后再切换：
+        python -m utils.model_registry promote pose
+        """
+        model_path = self.model_dir / 'archery_pose_model.h5'
+        
+        # 预先转换TFLite模型一并发布，服务加载新版本时无需各自转换
+        PoseClassifier.load(model_path, {
+            'sequence_length': self.config['sequence_length'],
+            'num_features': self.config['num_features'],
+            'backend': 'auto'
+        })
+        files = [model_path, self.model_dir / 'label_map.json']
+        if model_path.with_suffix('.tflite').exists():
+            files.append(model_path.with_suffix('.tflite'))
+        
+        metadata = {'config': self.config}
+        report_path = self.model_dir / 'evaluation_report.json'
+        if report_path.exists():
+            with open(report_path, 'r') as f:
+                metadata['evaluation'] = json.load(f)['metrics']
+        
+        registry = ModelRegistry.from_env()
+        version = registry.publish('pose', files, metadata, promote=promote)
+        role = '当前版本' if registry.current('pose') == version else '影子候选版本'
+        print(f"已发布姿态模型 {version}（{role}）")
+        return version
+
 if __name__ == '__main__':
     trainer = PoseModelTrainer()
     
@@ -195,4 +365,7 @@ if __name__ == '__main__':
     accuracy = (df['true_class'] == df['predicted_class']).mean()
     print(f"\n模型准确率: {accuracy:.4f}")
     print("\n分类报告:")
-    print(pd.crosstab(df['true_class'], df['predicted_class'])) 
\ No newline at end of file
+    print(pd.crosstab(df['true_class'], df['predicted_class']))
+    
+    # 发布到模型注册表
+    trainer.publish_model() 
\ No newline at end of file
@@ -0,0 +1,79 @@
+from functools import lru_cache
+
+import numpy as np
+import tensorflow as tf
+
+
+def window_index(entries, sequence_length, stride):
+    """枚举所有滑动窗口，返回 (视频序号, 起始帧, 最大起始帧) 三列"""
+    video_ids, starts, max_starts = [], [], []
+    for i, (_, _, num_frames) in enumerate(entries):
+        max_start = num_frames - sequence_length
+        if max_start < 0:
+            continue
+        window_starts = np.arange(0, max_start + 1, stride)
+        video_ids.append(np.full(len(window_starts), i))
+        starts.append(window_starts)
+        max_starts.append(np.full(len(window_starts), max_start))
+
+    if not video_ids:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return (
+        np.concatenate(video_ids).astype(np.int64),
+        np.concatenate(starts).astype(np.int64),
+        np.concatenate(max_starts).astype(np.int64)
+    )
+
+
+def build_window_dataset(store, entries, config, training=True):
+    """构建流式滑动窗口数据集
+
+    entries: [(特征键, 类别序号, 帧数)]，关键点序列从特征库内存映射读取，
+    每个视频按 window_stride 产生多个长度为 sequence_length 的窗口。
+    训练时每轮对窗口起点做随机抖动并打乱顺序，内存中只保存窗口索引。
+    """
+    sequence_length = config['sequence_length']
+    stride = config['window_stride']
+    num_features = config['num_features']
+    num_classes = config['num_classes']
+
+    keys = [key for key, _, _ in entries]
+    label_ids = [label for _, label, _ in entries]
+    if label_ids and max(label_ids) >= num_classes:
+        raise ValueError(f'类别序号 {max(label_ids)} 超出类别数 {num_classes}')
+    labels = np.eye(num_classes, dtype=np.float32)[label_ids]
+    video_ids, starts, max_starts = window_index(entries, sequence_length, stride)
+
+    @lru_cache(maxsize=config.get('open_sequences', 256))
+    def open_sequence(video_id):
+        return store.load(keys[video_id])
+
+    def load_window(video_id, start):
+        sequence = open_sequence(int(video_id))
+        window = np.asarray(sequence[start:start + sequence_length], dtype=np.float32)
+        return window, labels[video_id]
+
+    def to_window(video_id, start, max_start):
+        if training:
+            # 在相邻窗口起点之间随机抖动，每轮看到不同的切片
+            start = tf.minimum(
+                start + tf.random.uniform([], 0, stride, dtype=tf.int64),
+                max_start
+            )
+        window, label = tf.numpy_function(
+            load_window, [video_id, start], (tf.float32, tf.float32)
+        )
+        window.set_shape((sequence_length, num_features))
+        label.set_shape((num_classes,))
+        return window, label
+
+    dataset = tf.data.Dataset.from_tensor_slices((video_ids, starts, max_starts))
+    if training:
+        dataset = dataset.shuffle(
+            min(config['shuffle_buffer'], max(len(video_ids), 1)),
+            reshuffle_each_iteration=True
+        )
+    dataset = dataset.map(to_window, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    dataset = dataset.batch(config['batch_size'])
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -11,13 +11,16 @@ DATA_DIR="$AI_SERVICE_DIR/data"
 LOG_DIR="$AI_SERVICE_DIR/logs"
 mkdir -p $LOG_DIR
 
+# 以ai-service为工作目录，训练脚本以模块方式运行
+cd "$AI_SERVICE_DIR"
+
 # 记录开始时间
 START_TIME=$(date +%s)
 echo "开始训练流程：$(date)"
 
 # 准备数据
 echo "1. 开始准备训练数据..."
-python $AI_SERVICE_DIR/utils/prepare_data.py > $LOG_DIR/data_prep.log 2>&1
+python -m utils.prepare_data > $LOG_DIR/data_prep.log 2>&1
 if [ $? -ne 0 ]; then
     echo "数据准备失败，请查看日志：$LOG_DIR/data_prep.log"
     exit 1
@@ -26,7 +29,7 @@ echo "数据准备完成。"
 
 # 训练姿态分析模型
 echo "2. 开始训练姿态分析模型..."
-python $AI_SERVICE_DIR/pose_analysis/train_model.py > $LOG_DIR/pose_training.log 2>&1
+python -m pose_analysis.train_model > $LOG_DIR/pose_training.log 2>&1
 if [ $? -ne 0 ]; then
     echo "姿态分析模型训练失败，请查看日志：$LOG_DIR/pose_training.log"
     exit 1
@@ -35,7 +38,7 @@ echo "姿态分析模型训练完成。"
 
 # 训练箭靶检测模型
 echo "3. 开始训练箭靶检测模型..."
-python $AI_SERVICE_DIR/target_analysis/train_model.py > $LOG_DIR/target_training.log 2>&1
+python -m target_analysis.train_model > $LOG_DIR/target_training.log 2>&1
 if [ $? -ne 0 ]; then
     echo "箭靶检测模型训练失败，请查看日志：$LOG_DIR/target_training.log"
     exit 1
@@ -0,0 +1,209 @@
+import cv2
+import numpy as np
+
+
+def arrow_centers(arrows):
+    """箭矢检测框 (x0, y0, x1, y1) 的中心点，(箭数, 2)"""
+    boxes = np.asarray([np.asarray(arrow, dtype=np.float64)[:4] for arrow in arrows]).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+def normalize_impacts(centers, target_box):
+    """像素落点换算为靶面归一化坐标：靶心为原点，靶面半径为1（与计分的归一化距离一致），y轴向下"""
+    target = np.asarray(target_box, dtype=np.float64)[:4]
+    target_center = (target[:2] + target[2:]) / 2
+    target_radius = min(target[2] - target[0], target[3] - target[1]) / 2
+    if target_radius <= 0:
+        raise ValueError('箭靶框无效')
+    return (np.asarray(centers, dtype=np.float64) - target_center) / target_radius
+
+
+def convex_hull(points):
+    """落点的凸包顶点，少于3个点时返回去重后的点"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 3:
+        return np.unique(points, axis=0)
+    # 按索引取回原坐标，避免 cv2 的 float32 精度损失
+    indices = cv2.convexHull(points.astype(np.float32), returnPoints=False).ravel()
+    return points[indices]
+
+
+def hull_diameter(hull):
+    """凸包顶点两两之间的最大距离（箭群直径）"""
+    if len(hull) < 2:
+        return 0.0
+    diff = hull[:, None, :] - hull[None, :, :]
+    return float(np.sqrt(np.max(np.einsum('ijk,ijk->ij', diff, diff))))
+
+
+def collect_impacts(impacts=None, analysis=None):
+    """一组的落点：impacts 为归一化坐标 [[x, y], ...]，或由箭靶分析结果的箭靶框和箭矢框换算"""
+    if impacts is not None:
+        points = np.asarray(impacts, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError('落点格式应为 [[x, y], ...]')
+    elif analysis is not None:
+        arrows = [arrow['box'] for arrow in analysis['arrows']]
+        points = normalize_impacts(arrow_centers(arrows), analysis['target']['box'])
+    else:
+        raise ValueError('需要 impacts 或 analysis')
+    if not len(points):
+        raise ValueError('本组没有落点')
+    if not np.all(np.isfinite(points)):
+        raise ValueError('落点坐标无效')
+    return points
+
+
+class SessionGrouping:
+    """一次训练的箭群统计，每组（end）到达时增量更新
+
+    落点为靶面归一化坐标。新的一组只与累计状态合并：凸包由上一组的凸包顶点和新落点重算，
+    离散椭圆由合并的均值和离差矩阵得到，热力图累加本组的直方图，各组重心用于漂移分析。
+    状态可序列化（to_state / from_state），由调用方在各组之间保存。
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            'confidence': 0.95,     # 离散椭圆的置信水平
+            'heatmap_bins': 20,     # 热力图每个方向的格数
+            'heatmap_extent': 1.2,  # 热力图覆盖 [-extent, extent]，范围外的落点计入边缘格
+            'drift_window': 3       # 近期重心取最近几组
+        }
+        if config:
+            self.config.update(config)
+
+        self.count = 0
+        self.mean = np.zeros(2)
+        self.m2 = np.zeros((2, 2))  # 离差平方和矩阵
+        self.hull = np.empty((0, 2))
+        bins = self.config['heatmap_bins']
+        self.heatmap = np.zeros((bins, bins), dtype=np.int64)
+        self.ends = []
+
+    @classmethod
+    def from_state(cls, state, config=None):
+        """由 to_state 的结果恢复"""
+        grouping = cls({
+            **(config or {}),
+            'heatmap_bins': int(state['heatmap_bins']),
+            'heatmap_extent': float(state['heatmap_extent'])
+        })
+        bins = grouping.config['heatmap_bins']
+        grouping.count = int(state['count'])
+        grouping.mean = np.asarray(state['mean'], dtype=np.float64).reshape(2)
+        grouping.m2 = np.asarray(state['m2'], dtype=np.float64).reshape(2, 2)
+        grouping.hull = np.asarray(state['hull'], dtype=np.float64).reshape(-1, 2)
+        grouping.heatmap = np.asarray(state['heatmap'], dtype=np.int64).reshape(bins, bins)
+        grouping.ends = list(state['ends'])
+        if grouping.count != sum(end['arrows'] for end in grouping.ends):
+            raise ValueError('箭群状态不一致')
+        return grouping
+
+    def to_state(self):
+        return {
+            'count': self.count,
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist(),
+            'hull': self.hull.tolist(),
+            'heatmap_bins': self.config['heatmap_bins'],
+            'heatmap_extent': self.config['heatmap_extent'],
+            'heatmap': self.heatmap.tolist(),
+            'ends': self.ends
+        }
+
+    def add_end(self, points):
+        """合并一组落点 (箭数, 2)，返回本组的统计"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not len(points):
+            raise ValueError('本组没有落点')
+        k = len(points)
+        end_mean = points.mean(axis=0)
+        deviation = points - end_mean
+
+        # 均值和离差矩阵按两组合并的公式更新
+        delta = end_mean - self.mean
+        total = self.count + k
+        self.m2 += deviation.T @ deviation + np.outer(delta, delta) * (self.count * k / total)
+        self.mean += delta * (k / total)
+        self.count = total
+
+        end_hull = convex_hull(points)
+        self.hull = convex_hull(np.concatenate([self.hull, end_hull]))
+
+        extent = self.config['heatmap_extent']
+        bins = self.config['heatmap_bins']
+        # 行为y、列为x，与图像方向一致
+        clipped = np.clip(points, -extent, extent)
+        counts, _, _ = np.histogram2d(
+            clipped[:, 1], clipped[:, 0], bins=bins, range=[[-extent, extent], [-extent, extent]]
+        )
+        self.heatmap += counts.astype(np.int64)
+
+        end = {
+            'end': len(self.ends),
+            'arrows': k,
+            'center': end_mean.tolist(),
+            'diameter': hull_diameter(end_hull),
+            'dispersion': float(np.mean(np.linalg.norm(deviation, axis=1)))
+        }
+        self.ends.append(end)
+        return end
+
+    def _ellipse(self):
+        """离散椭圆：样本协方差的特征分解，半轴按置信水平（自由度2的卡方分位数）缩放"""
+        if self.count < 3:
+            return None
+        covariance = self.m2 / (self.count - 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        scale = -2 * np.log(1 - self.config['confidence'])
+        minor, major = np.sqrt(np.maximum(eigenvalues, 0) * scale)
+        direction = eigenvectors[:, 1]
+        return {
+            'confidence': self.config['confidence'],
+            'center': self.mean.tolist(),
+            'semi_major': float(major),
+            'semi_minor': float(minor),
+            'angle': float(np.degrees(np.arctan2(direction[1], direction[0])) % 180),  # 长轴与x轴的夹角
+            'area': float(np.pi * major * minor)
+        }
+
+    def _drift(self):
+        """各组重心随时间的变化：首末组位移、按箭数加权的每组线性漂移速度和近期重心的偏移"""
+        centers = np.array([end['center'] for end in self.ends])
+        weights = np.array([end['arrows'] for end in self.ends], dtype=np.float64)
+        drift = {
+            'centers': centers.tolist(),
+            'displacement': (centers[-1] - centers[0]).tolist(),
+            'rate': None
+        }
+        if len(centers) >= 2:
+            t = np.arange(len(centers)) - np.average(np.arange(len(centers)), weights=weights)
+            rate = (weights * t) @ (centers - self.mean) / ((weights * t) @ t)
+            drift['rate'] = rate.tolist()
+            drift['speed'] = float(np.linalg.norm(rate))
+        recent = slice(-self.config['drift_window'], None)
+        recent_center = np.average(centers[recent], axis=0, weights=weights[recent])
+        drift['recent_offset'] = (recent_center - self.mean).tolist()
+        return drift
+
+    def summary(self):
+        """当前训练的箭群统计"""
+        if not self.count:
+            raise ValueError('没有落点')
+        return {
+            'arrows': self.count,
+            'ends': len(self.ends),
+            'center': self.mean.tolist(),
+            'offset': float(np.linalg.norm(self.mean)),  # 箭群重心偏离靶心的距离
+            'diameter': hull_diameter(self.hull),
+            'hull': self.hull.tolist(),
+            'rms_radius': float(np.sqrt(np.trace(self.m2) / self.count)),  # 到重心的均方根距离
+            'ellipse': self._ellipse(),
+            'drift': self._drift(),
+            'heatmap': {
+                'bins': self.config['heatmap_bins'],
+                'extent': self.config['heatmap_extent'],
+                'counts': self.heatmap.tolist()
+            },
+            'per_end': self.ends
+        }
@@ -1,37 +1,104 @@
 import cv2
 import numpy as np
 from pathlib import Path
-import torch
-from torchvision import transforms
 from PIL import Image
 import json
+import time
+
+from inference.client import InferenceClient, RemoteModel
+from target_analysis.session_grouping import (
+    SessionGrouping, arrow_centers, convex_hull, hull_diameter, normalize_impacts
+)
+from utils.evaluation import box_iou
+from utils.metrics import observe_batch_size, stage
+from utils.model_registry import ReloadableModel
+from utils.thread_budget import configure_torch
+
+
+def compare_detections(primary, candidate, iou_threshold=0.5):
+    """影子模式下比较两个版本的检测结果：同类别框按IoU贪心匹配（批量推理时逐图匹配）"""
+    matched = 0
+    ious = []
+    primary_count = candidate_count = 0
+    for primary_pred, candidate_pred in zip(primary.pred, candidate.pred):
+        primary_boxes = primary_pred.cpu().numpy()
+        candidate_boxes = candidate_pred.cpu().numpy()
+        primary_count += len(primary_boxes)
+        candidate_count += len(candidate_boxes)
+        for cls in np.union1d(primary_boxes[:, 5], candidate_boxes[:, 5]):
+            a = primary_boxes[primary_boxes[:, 5] == cls, :4]
+            b = candidate_boxes[candidate_boxes[:, 5] == cls, :4]
+            if not len(a) or not len(b):
+                continue
+            iou = box_iou(a, b)
+            while iou.size and iou.max() >= iou_threshold:
+                i, j = np.unravel_index(np.argmax(iou), iou.shape)
+                ious.append(float(iou[i, j]))
+                matched += 1
+                iou[i, :] = -1
+                iou[:, j] = -1
+    
+    return {
+        'agree': matched == primary_count == candidate_count,
+        'primary_boxes': primary_count,
+        'candidate_boxes': candidate_count,
+        'matched_boxes': matched,
+        'mean_iou': float(np.mean(ious)) if ious else None
+    }
+
 
 class TargetAnalyzer:
     def __init__(self):
-        # 加载目标检测模型
-        self.model = self._load_model()
-        
-        # 图像预处理
-        self.transform = transforms.Compose([
-            transforms.Resize((640, 640)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                              std=[0.229, 0.224, 0.225])
-        ])
+        # 设置 INFERENCE_SERVER_SOCKET 时检测由本机推理服务执行，本进程不导入 PyTorch
+        self.inference = InferenceClient.from_env()
+        if self.inference is not None:
+            self.transform = None
+            self.models = RemoteModel(self.inference, 'target', self.inference)
+        else:
+            from torchvision import transforms
+            
+            # 图像预处理
+            self.transform = transforms.Compose([
+                transforms.Resize((640, 640)),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                  std=[0.229, 0.224, 0.225])
+            ])
+            
+            # 加载目标检测模型：模型注册表的当前版本，后台检测到新版本时预热后切换
+            self.models = ReloadableModel(
+                'target', self._load_model,
+                fallback_dir=Path(__file__).parent / 'models',
+                warmup=self._warmup_model,
+                compare=compare_detections
+            )
+            self.models.start()
         
         # 靶型配置
         self.target_configs = self._load_target_configs()
 
-    def _load_model(self):
+    @property
+    def model(self):
+        return self.models.model
+
+    def _load_model(self, model_dir):
         """加载预训练的目标检测模型"""
-        model_path = Path(__file__).parent / 'models' / 'target_detection_model.pt'
+        model_path = model_dir / 'target_detection_model.pt'
         if model_path.exists():
+            import torch
+            configure_torch(torch)
+            
+            # 使用本地缓存的 yolov5 代码，热更新时不重新下载
             model = torch.hub.load('ultralytics/yolov5', 'custom', 
-                                 path=str(model_path), force_reload=True)
+                                 path=str(model_path), force_reload=False)
             model.eval()
             return model
         return None
 
+    def _warmup_model(self, model):
+        """切换前先执行一次推理"""
+        self._infer(model, self.transform(Image.new('RGB', (640, 640))).unsqueeze(0))
+
     def _load_target_configs(self):
         """加载靶型配置"""
         config_path = Path(__file__).parent / 'configs' / 'target_configs.json'
@@ -47,10 +114,12 @@ class TargetAnalyzer:
     def analyze_image(self, image_file, params):
         """分析箭靶图片"""
         # 读取图片
-        if isinstance(image_file, (str, Path)):
-            image = Image.open(image_file)
-        else:
-            image = Image.open(image_file.stream)
+        with stage('target', 'decode'):
+            if isinstance(image_file, (str, Path)):
+                image = Image.open(image_file)
+            else:
+                image = Image.open(image_file.stream)
+            image.load()
         
         # 获取靶型配置
         target_config = self.target_configs.get(params['target_type'])
@@ -65,36 +134,63 @@ class TargetAnalyzer:
             raise ValueError('未检测到箭靶')
         
         # 分析结果
-        analysis = self._analyze_results(results, target_config, params)
+        with stage('target', 'postprocess'):
+            analysis = self._analyze_results(results, target_config, params)
         
         return analysis
 
     def analyze_frame(self, frame):
         """分析实时帧"""
-        if isinstance(frame, (str, Path)):
-            frame = Image.open(frame)
-        else:
-            frame = Image.open(frame.stream)
+        with stage('target', 'decode'):
+            if isinstance(frame, (str, Path)):
+                frame = Image.open(frame)
+            else:
+                frame = Image.open(frame.stream)
+            frame.load()
         
         # 检测箭靶和箭矢
         results = self._detect_objects(frame)
         
         # 快速分析（仅返回基本信息）
-        quick_analysis = self._quick_analyze(results)
+        with stage('target', 'postprocess'):
+            quick_analysis = self._quick_analyze(results)
         
         return quick_analysis
 
     def _detect_objects(self, image):
         """检测图像中的箭靶和箭矢"""
+        if self.inference is not None:
+            with stage('target', 'inference'):
+                return self.inference.detect_targets(image)
+        return self.detect_batch([image])
+
+    def detect_batch(self, images):
+        """批量检测多张图像，results.pred 与 images 一一对应"""
+        import torch
+        
         # 预处理图像
-        img = self.transform(image).unsqueeze(0)
+        with stage('target', 'preprocess'):
+            img = torch.stack([self.transform(image) for image in images])
         
-        # 执行检测
-        with torch.no_grad():
-            results = self.model(img)
+        # 执行检测（同一批只取一次模型，热更新不影响进行中的请求）
+        _, model = self.models.get()
+        observe_batch_size('target', img.shape[0])
+        with stage('target', 'inference'):
+            start = time.perf_counter()
+            results = self._infer(model, img)
+            elapsed = time.perf_counter() - start
+        
+        # 影子模式：按抽样在后台用候选版本重复检测并记录差异
+        self.models.shadow(lambda candidate: self._infer(candidate, img), results, elapsed)
         
         return results
 
+    def _infer(self, model, img):
+        import torch
+        
+        with torch.no_grad():
+            return model(img)
+
     def _analyze_results(self, results, target_config, params):
         """详细分析检测结果"""
         # 提取箭靶和箭矢的位置
@@ -117,7 +213,7 @@ class TargetAnalyzer:
             scores.append(score)
         
         # 分析箭群
-        grouping_analysis = self._analyze_grouping(arrows) if arrows else None
+        grouping_analysis = self._analyze_grouping(arrows, target_box) if arrows else None
         
         # 生成分析结果
         analysis = {
@@ -192,42 +288,44 @@ class TargetAnalyzer:
                 return int(ring)
         return 0
 
-    def _analyze_grouping(self, arrows):
-        """分析箭群"""
+    def _analyze_grouping(self, arrows, target_box=None):
+        """分析箭群，给出箭靶框时附带靶面归一化坐标下的结果"""
         if len(arrows) < 2:
             return None
         
         # 计算箭矢中心点
-        centers = np.array([
-            [(arrow[0] + arrow[2]) / 2, (arrow[1] + arrow[3]) / 2]
-            for arrow in arrows
-        ])
-        
-        # 计算箭群直径（最远两点间距离）
-        max_distance = 0
-        for i in range(len(centers)):
-            for j in range(i + 1, len(centers)):
-                distance = np.sqrt(
-                    (centers[i][0] - centers[j][0]) ** 2 +
-                    (centers[i][1] - centers[j][1]) ** 2
-                )
-                max_distance = max(max_distance, distance)
+        centers = arrow_centers(arrows)
+        grouping = self._grouping_stats(centers)
+        if target_box is not None:
+            grouping['normalized'] = self._grouping_stats(normalize_impacts(centers, target_box))
+        return grouping
+
+    def _grouping_stats(self, centers):
+        # 箭群直径：凸包顶点间的最大距离
+        diameter = hull_diameter(convex_hull(centers))
         
         # 计算箭群中心
         center = np.mean(centers, axis=0)
         
         # 计算离散度（到中心点的平均距离）
-        dispersion = np.mean([
-            np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2)
-            for x, y in centers
-        ])
+        dispersion = np.mean(np.linalg.norm(centers - center, axis=1))
         
         return {
-            'diameter': max_distance,
+            'diameter': diameter,
             'dispersion': dispersion,
             'center': center.tolist()
         }
 
+    def analyze_session_end(self, points, state=None):
+        """将一组落点（靶面归一化坐标）合并到训练的箭群统计，state 为上一组返回的状态"""
+        grouping = SessionGrouping.from_state(state) if state else SessionGrouping()
+        end = grouping.add_end(points)
+        return {
+            'end': end,
+            'session': grouping.summary(),
+            'state': grouping.to_state()
+        }
+
     def _generate_recommendations(self, analysis):
         """生成改进建议"""
         recommendations = []
@@ -243,8 +341,9 @@ class TargetAnalyzer:
         
         # 分析箭群
         if analysis['grouping']:
-            dispersion = analysis['grouping']['dispersion']
-            if dispersion > 0.2:  # 假设0.2是一个合理的阈值
+            # 阈值按靶面半径为1的归一化离散度，没有归一化结果时使用像素离散度
+            grouping = analysis['grouping'].get('normalized') or analysis['grouping']
+            if grouping['dispersion'] > 0.2:
                 recommendations.append({
                     'type': 'warning',
                     'title': '箭群紧密度',
@@ -1,10 +1,21 @@
 import torch
+import numpy as np
 import yaml
+import json
 from pathlib import Path
 import shutil
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 from sklearn.model_selection import train_test_split
 
+from utils.evaluation import detection_metrics, run_batched, write_report
+from utils.model_registry import ModelRegistry
+
+# 检测类别：箭靶和箭矢
+CLASS_NAMES = ['target', 'arrow']
+
 class TargetModelTrainer:
     def __init__(self):
         # 模型保存路径
@@ -17,7 +28,8 @@ class TargetModelTrainer:
             'batch_size': 16,
             'epochs': 100,
             'weights': 'yolov5s.pt',  # 预训练权重
-            'device': 'cuda' if torch.cuda.is_available() else 'cpu'
+            'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+            'num_workers': min(32, (os.cpu_count() or 1) * 4)  # 数据集转换线程数
         }
 
     def prepare_dataset(self, data_dir):
@@ -33,12 +45,16 @@ class TargetModelTrainer:
             (dataset_dir / split / 'images').mkdir(parents=True)
             (dataset_dir / split / 'labels').mkdir(parents=True)
         
-        # 读取标注文件
+        # 读取标注文件，按图片分组
         annotations = pd.read_csv(data_dir / 'annotations.csv')
+        images = [
+            (image_file, list(zip(group['class_id'], group['bbox'])))
+            for image_file, group in annotations.groupby('image_file', sort=False)
+        ]
         
-        # 分割训练集和验证集
+        # 按图片分割训练集和验证集，同一图片的所有目标落在同一划分
         train_data, val_data = train_test_split(
-            annotations, test_size=0.2, random_state=42
+            images, test_size=0.2, random_state=42
         )
         
         # 处理训练集
@@ -52,24 +68,40 @@ class TargetModelTrainer:
         
         return dataset_dir
 
-    def _process_split(self, data, source_dir, target_dir):
-        """处理数据集分割"""
-        for _, row in data.iterrows():
-            # 复制图片
-            shutil.copy2(
-                source_dir / 'images' / row['image_file'],
-                target_dir / 'images' / row['image_file']
-            )
-            
-            # 转换并保存标注
-            label_file = Path(row['image_file']).stem + '.txt'
-            self._convert_annotations(
-                row['bbox'],
-                row['class_id'],
-                target_dir / 'labels' / label_file
-            )
+    def _process_split(self, images, source_dir, target_dir):
+        """并行处理数据集分割"""
+        with ThreadPoolExecutor(max_workers=self.config['num_workers']) as executor:
+            list(executor.map(
+                lambda item: self._process_image(item[0], item[1], source_dir, target_dir),
+                images
+            ))
+
+    def _process_image(self, image_file, objects, source_dir, target_dir):
+        """放置单张图片并一次性写入其全部目标的YOLO标注"""
+        source_path = source_dir / 'images' / image_file
+        target_path = target_dir / 'images' / image_file
+        
+        # 优先使用硬链接，跨设备时回退为复制
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copy2(source_path, target_path)
+        
+        # 仅读取文件头获取图像尺寸，不解码像素
+        with Image.open(source_path) as image:
+            width, height = image.size
+        
+        lines = [
+            self._convert_annotations(bbox, class_id, width, height)
+            for class_id, bbox in objects
+        ]
+        
+        # 保存标注
+        label_file = Path(image_file).stem + '.txt'
+        with open(target_dir / 'labels' / label_file, 'w') as f:
+            f.writelines(lines)
 
-    def _convert_annotations(self, bbox, class_id, output_path):
+    def _convert_annotations(self, bbox, class_id, image_width, image_height):
         """转换标注格式为YOLO格式"""
         # bbox格式: x1,y1,x2,y2
         x1, y1, x2, y2 = map(float, bbox.split(','))
@@ -80,15 +112,13 @@ class TargetModelTrainer:
         x_center = x1 + width / 2
         y_center = y1 + height / 2
         
-        # 归一化坐标
-        x_center /= 640  # 假设图像宽度为640
-        y_center /= 640  # 假设图像高度为640
-        width /= 640
-        height /= 640
+        # 按实际图像尺寸归一化坐标
+        x_center /= image_width
+        y_center /= image_height
+        width /= image_width
+        height /= image_height
         
-        # 保存标注
-        with open(output_path, 'w') as f:
-            f.write(f"{class_id} {x_center} {y_center} {width} {height}\n")
+        return f"{class_id} {x_center} {y_center} {width} {height}\n"
 
     def _create_dataset_yaml(self, dataset_dir):
         """创建数据集配置文件"""
@@ -96,8 +126,8 @@ class TargetModelTrainer:
             'path': str(dataset_dir),
             'train': 'train/images',
             'val': 'val/images',
-            'nc': 2,  # 类别数：箭靶和箭矢
-            'names': ['target', 'arrow']
+            'nc': len(CLASS_NAMES),  # 类别数：箭靶和箭矢
+            'names': CLASS_NAMES
         }
         
         with open(dataset_dir / 'dataset.yaml', 'w') as f:
@@ -146,23 +176,35 @@ class TargetModelTrainer:
     def evaluate_model(self, test_dir):
         """评估模型在测试集上的表现"""
         test_dir = Path(test_dir)
+        model_path = self.model_dir / 'target_detection_model.pt'
         
         # 加载模型
         model = torch.hub.load(
             'ultralytics/yolov5',
             'custom',
-            path=str(self.model_dir / 'target_detection_model.pt')
+            path=str(model_path)
         )
         
+        # 以低置信度阈值推理，计算mAP时需要完整的PR曲线
+        report_conf = model.conf
+        model.conf = 0.001
+        
+        image_paths = sorted(test_dir.glob('*.jpg')) or sorted((test_dir / 'images').glob('*.jpg'))
+        
+        # 批量执行检测
+        def predict_batch(batch):
+            pred = model([str(p) for p in batch], size=self.config['img_size'])
+            return [boxes.cpu().numpy() for boxes in pred.xyxy]
+        
+        predictions, timing = run_batched(predict_batch, image_paths, self.config['batch_size'])
+        
+        # 获取检测结果
         results = []
-        for img_path in test_dir.glob('*.jpg'):
-            # 执行检测
-            pred = model(str(img_path))
-            
-            # 获取检测结果
-            boxes = pred.xyxy[0].cpu().numpy()
+        for img_path, boxes in zip(image_paths, predictions):
             for box in boxes:
                 x1, y1, x2, y2, conf, cls = box
+                if conf < report_conf:
+                    continue
                 results.append({
                     'image': str(img_path),
                     'class': model.names[int(cls)],
@@ -175,8 +217,54 @@ class TargetModelTrainer:
             self.model_dir / 'evaluation_results.csv',
             index=False
         )
+        
+        # 有标注时计算精度指标
+        ground_truths = self._load_ground_truths(test_dir, image_paths)
+        metrics = {}
+        if ground_truths is not None:
+            metrics = detection_metrics(predictions, ground_truths, CLASS_NAMES, conf_threshold=report_conf)
+            print(f"mAP@0.5: {metrics['mAP50']:.4f}, mAP@0.5:0.95: {metrics['mAP50_95']:.4f}")
+        
+        write_report(
+            self.model_dir / 'evaluation_report.json',
+            'target_detection', model_path, metrics, timing, self.config
+        )
         return results
 
+    def publish_model(self, promote=False):
+        """发布到模型注册表
+        
+        已有当前版本时新版本默认作为影子候选，确认影子对比结果后再切换：
+        python -m utils.model_registry promote target
+        """
+        metadata = {'config': self.config}
+        report_path = self.model_dir / 'evaluation_report.json'
+        if report_path.exists():
+            with open(report_path, 'r') as f:
+                metadata['evaluation'] = json.load(f)['metrics']
+        
+        registry = ModelRegistry.from_env()
+        version = registry.publish(
+            'target', [self.model_dir / 'target_detection_model.pt'], metadata, promote=promote
+        )
+        role = '当前版本' if registry.current('target') == version else '影子候选版本'
+        print(f"已发布箭靶检测模型 {version}（{role}）")
+        return version
+
+    def _load_ground_truths(self, test_dir, image_paths):
+        """读取测试集标注 annotations.csv（格式同训练集），返回每张图片的 [cls, x1, y1, x2, y2] 数组"""
+        annotation_path = test_dir / 'annotations.csv'
+        if not annotation_path.exists():
+            return None
+        
+        annotations = pd.read_csv(annotation_path)
+        boxes = {}
+        for row in annotations.to_dict('records'):
+            box = [row['class_id'], *map(float, row['bbox'].split(','))]
+            boxes.setdefault(row['image_file'], []).append(box)
+        
+        return [np.array(boxes.get(path.name, []), dtype=np.float64).reshape(-1, 5) for path in image_paths]
+
 if __name__ == '__main__':
     trainer = TargetModelTrainer()
     
@@ -189,4 +277,7 @@ if __name__ == '__main__':
     # 打印评估结果
     df = pd.DataFrame(results)
     print("\n检测结果统计:")
-    print(df.groupby('class')['confidence'].describe()) 
\ No newline at end of file
+    print(df.groupby('class')['confidence'].describe())
+    
+    # 发布到模型注册表
+    trainer.publish_model() 
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试与服务代码相同，以 ai-service 目录为导入根（from utils.x import ...）
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+
+from pose_analysis.frame_store import JOINTS, AnalysisStore, FrameColumns
+from pose_analysis.scoring import DEFAULT_RULES, score_angles
+from utils.serialization import dumps_json
+
+
+def reject_constant(name):
+    raise ValueError(f'JSON 中出现 {name}')
+
+
+def make_columns(rng, frames, rules=DEFAULT_RULES):
+    """按评分规则逐帧追加随机角度（与 _evaluate_pose 相同，没有理想角度的关节不计分）"""
+    angles = rng.uniform(0, 180, size=(frames, len(JOINTS)))
+    joint_scores, stability = score_angles(angles, JOINTS, rules)
+    columns = FrameColumns()
+    for i in range(frames):
+        columns.append(i, i / 30, rng.uniform(size=(33, 4)), {
+            'angles': dict(zip(JOINTS, angles[i])),
+            'scores': {
+                'joint_scores': {
+                    joint: score for joint, score in zip(JOINTS, joint_scores[i]) if not np.isnan(score)
+                },
+                'stability': stability[i]
+            }
+        })
+    return columns
+
+
+def test_unscored_joints_are_omitted_from_responses():
+    rules = {**DEFAULT_RULES, 'ideal_angles': {**DEFAULT_RULES['ideal_angles'], 'wrist': None}}
+    columns = make_columns(np.random.default_rng(0), 10, rules)
+
+    posture_scores = columns.posture_scores()
+    assert all(set(score['joint_scores']) == {'shoulder', 'elbow'} for score in posture_scores)
+    frames = columns.to_dict()
+    assert set(frames['joint_scores']) == {'shoulder', 'elbow'}
+
+    for data in (posture_scores, frames, columns.frame_series()):
+        # 严格解析：出现 NaN 时报错
+        json.loads(dumps_json(data), parse_constant=reject_constant)
+
+
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_export_round_trip(tmp_path, fmt):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.compute as pc
+    rng = np.random.default_rng(1)
+    store = AnalysisStore(tmp_path / 'store')
+    saved = {}
+    for frames in (12, 7):
+        columns = make_columns(rng, frames)
+        saved[store.save(columns)] = columns
+    analysis_ids = list(saved)
+
+    output = store.export_file(analysis_ids, fmt)
+    with output:
+        if fmt == 'arrow':
+            table = pa.ipc.open_file(output).read_all()
+        else:
+            import pyarrow.parquet as pq
+            table = pq.read_table(output)
+
+    assert table.num_rows == 19
+    assert table.column('analysis_id').to_pylist() == [analysis_ids[0]] * 12 + [analysis_ids[1]] * 7
+    for analysis_id, columns in saved.items():
+        rows = table.filter(pc.equal(table.column('analysis_id').cast(pa.string()), analysis_id))
+        np.testing.assert_array_equal(rows.column('frame_index').to_numpy(), columns['frame_index'])
+        for j, joint in enumerate(JOINTS):
+            np.testing.assert_allclose(rows.column(f'angle_{joint}').to_numpy(), columns['angles'][:, j])
+            # 评分和关键点以 float16 保存
+            scores = rows.column(f'score_{joint}').to_numpy().astype(np.float32)
+            np.testing.assert_allclose(scores, columns['joint_scores'][:, j], atol=0.05)
+        landmarks = np.stack(rows.column('landmarks').to_numpy(zero_copy_only=False)).reshape(-1, 33, 4)
+        np.testing.assert_allclose(landmarks.astype(np.float32), columns['landmarks'], atol=1e-3)
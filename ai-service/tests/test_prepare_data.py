@@ -0,0 +1,30 @@
+from utils.prepare_data import DatasetManifest, sync_files, verify_manifest
+
+
+def test_sync_files_removes_stale_outputs(tmp_path):
+    source = tmp_path / 'videos'
+    source.mkdir()
+    for name in ('a.mp4', 'b.mp4'):
+        (source / name).write_bytes(name.encode() * 100)
+    output = tmp_path / 'pose'
+    # 与 prepare_pose_data 一样预先创建类别目录
+    for category in ('good', 'poor', 'perfect'):
+        (output / 'training' / category).mkdir(parents=True)
+
+    sync_files([
+        (source / 'a.mp4', 'training/good/a.mp4'),
+        (source / 'b.mp4', 'training/poor/b.mp4')
+    ], output, mode='copy', workers=2)
+    assert (output / 'training/poor/b.mp4').exists()
+
+    # 标注中 b.mp4 改为另一个类别
+    sync_files([
+        (source / 'a.mp4', 'training/good/a.mp4'),
+        (source / 'b.mp4', 'training/perfect/b.mp4')
+    ], output, mode='copy', workers=2)
+    assert not (output / 'training/poor/b.mp4').exists()
+    assert (output / 'training/perfect/b.mp4').read_bytes() == b'b.mp4' * 100
+    assert set(DatasetManifest(output).files) == {'training/good/a.mp4', 'training/perfect/b.mp4'}
+
+    stats, problems = verify_manifest(output, deep=True)
+    assert stats == {'training': 2} and problems == []
@@ -0,0 +1,166 @@
+import json
+
+import numpy as np
+import pytest
+
+from pose_analysis.frame_store import AnalysisStore, FrameColumns
+from pose_analysis.rescore import rescore
+from pose_analysis.scoring import (
+    DEFAULT_RULES, generate_recommendations, load_rules, overall_analysis, rules_version,
+    score_angles, segment_analysis
+)
+
+JOINTS = ('shoulder', 'elbow', 'wrist')
+
+
+def evaluate_pose(angles, ideal_angles):
+    """原 PoseAnalyzer._evaluate_pose：每偏差1度扣2分，稳定性为关节评分的平均值"""
+    scores = {}
+    for joint, angle in angles.items():
+        ideal = ideal_angles.get(joint)
+        if ideal is not None:
+            scores[joint] = max(0, 100 - abs(angle - ideal) * 2)
+    return {'joint_scores': scores, 'stability': sum(scores.values()) / len(scores)}
+
+
+def calculate_overall_analysis(frame_scores):
+    """原 PoseAnalyzer._calculate_overall_analysis"""
+    stabilities = [score['stability'] for score in frame_scores]
+    accuracies = [
+        sum(score['joint_scores'].values()) / len(score['joint_scores'])
+        for score in frame_scores
+    ]
+    return {
+        'stability': np.mean(stabilities),
+        'consistency': 100 - np.std(stabilities) * 10,
+        'accuracy': np.mean(accuracies)
+    }
+
+
+def random_angles(rng, frames, joints=len(JOINTS)):
+    return rng.uniform(0, 180, size=(frames, joints))
+
+
+def test_score_angles_matches_baseline():
+    rng = np.random.default_rng(0)
+    angles = random_angles(rng, 200)
+
+    joint_scores, stability = score_angles(angles, JOINTS, DEFAULT_RULES)
+    for frame, scores, frame_stability in zip(angles, joint_scores, stability):
+        expected = evaluate_pose(dict(zip(JOINTS, frame)), DEFAULT_RULES['ideal_angles'])
+        np.testing.assert_allclose(scores, [expected['joint_scores'][j] for j in JOINTS])
+        assert frame_stability == pytest.approx(expected['stability'])
+
+
+def test_score_angles_skips_joints_without_ideal_angle():
+    rng = np.random.default_rng(1)
+    joints = ('shoulder', 'hip', 'elbow')
+    angles = random_angles(rng, 50, len(joints))
+
+    joint_scores, stability = score_angles(angles, joints, DEFAULT_RULES)
+    assert np.isnan(joint_scores[:, 1]).all()
+    for frame, frame_stability in zip(angles, stability):
+        expected = evaluate_pose(dict(zip(joints, frame)), DEFAULT_RULES['ideal_angles'])
+        assert frame_stability == pytest.approx(expected['stability'])
+
+
+def test_overall_analysis_matches_baseline():
+    rng = np.random.default_rng(2)
+    angles = random_angles(rng, 300)
+    joint_scores, stability = score_angles(angles, JOINTS, DEFAULT_RULES)
+    frame_scores = [
+        evaluate_pose(dict(zip(JOINTS, frame)), DEFAULT_RULES['ideal_angles']) for frame in angles
+    ]
+
+    analysis = overall_analysis(stability, joint_scores, DEFAULT_RULES)
+    expected = calculate_overall_analysis(frame_scores)
+    for metric in ('stability', 'consistency', 'accuracy'):
+        assert analysis[metric] == pytest.approx(expected[metric])
+
+
+def test_overall_analysis_without_frames_is_nan():
+    analysis = overall_analysis(np.empty(0), np.empty((0, len(JOINTS))), DEFAULT_RULES)
+    assert all(np.isnan(value) for value in analysis.values())
+
+
+def test_segment_analysis_matches_per_segment_overall():
+    rng = np.random.default_rng(3)
+    counts = [1, 40, 7, 120]
+    angles = random_angles(rng, sum(counts))
+    joint_scores, stability = score_angles(angles, JOINTS, DEFAULT_RULES)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    analyses = segment_analysis(stability, joint_scores, offsets, DEFAULT_RULES)
+    for i, (start, count) in enumerate(zip(offsets, counts)):
+        frames = slice(start, start + count)
+        expected = overall_analysis(stability[frames], joint_scores[frames], DEFAULT_RULES)
+        for metric, value in expected.items():
+            assert analyses[metric][i] == pytest.approx(value)
+
+
+@pytest.mark.parametrize('analysis, titles', [
+    ({'stability': 90, 'consistency': 85, 'accuracy': 95}, []),
+    ({'stability': 80, 'consistency': 90, 'accuracy': 95}, ['姿势稳定性']),
+    ({'stability': 90, 'consistency': 70, 'accuracy': 80}, ['动作一致性', '姿势准确性']),
+    ({'stability': 85, 'consistency': 80, 'accuracy': 90}, [])
+])
+def test_recommendations_use_baseline_thresholds(analysis, titles):
+    recommendations = generate_recommendations(analysis, DEFAULT_RULES)
+    assert [r['title'] for r in recommendations] == titles
+    assert all(r['type'] == 'warning' for r in recommendations)
+
+
+def test_load_rules_merges_overrides(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'ideal_angles': {'elbow': 170, 'knee': None}, 'degree_penalty': 1}))
+
+    rules = load_rules(str(path))
+    assert rules['ideal_angles']['elbow'] == 170
+    assert rules['ideal_angles']['knee'] is None
+    assert rules['ideal_angles']['shoulder'] == DEFAULT_RULES['ideal_angles']['shoulder']
+    assert rules['degree_penalty'] == 1
+    assert rules_version(rules) != rules_version(DEFAULT_RULES)
+
+    path.write_text(json.dumps({'unknown': 1}))
+    with pytest.raises(ValueError):
+        load_rules(str(path))
+
+
+def test_rescore_rewrites_stored_scores(tmp_path):
+    rng = np.random.default_rng(4)
+    store = AnalysisStore(tmp_path)
+    saved = {}
+    for frames in (30, 55):
+        angles = random_angles(rng, frames)
+        columns = FrameColumns(JOINTS)
+        for i, frame in enumerate(angles):
+            frame_result = {
+                'angles': dict(zip(JOINTS, frame)),
+                'scores': evaluate_pose(dict(zip(JOINTS, frame)), DEFAULT_RULES['ideal_angles'])
+            }
+            columns.append(i, i / 30, np.zeros((33, 4)), frame_result)
+        analysis_id = store.save(columns, {'scoring_version': rules_version(DEFAULT_RULES)})
+        saved[analysis_id] = columns['angles'].astype(np.float64)
+
+    # 规则未变化时跳过
+    assert rescore(store, list(saved), DEFAULT_RULES)['skipped'] == 2
+
+    rules = load_rules()
+    rules['ideal_angles']['elbow'] = 170
+    totals = rescore(store, list(saved), rules, chunk_size=1)
+    assert totals['rescored'] == 2 and totals['frames'] == 85
+
+    ideal_angles = rules['ideal_angles']
+    for analysis_id, angles in saved.items():
+        meta, columns = store.load(analysis_id)
+        frame_scores = [evaluate_pose(dict(zip(JOINTS, frame)), ideal_angles) for frame in angles]
+        expected = calculate_overall_analysis(frame_scores)
+        assert meta['scoring_version'] == rules_version(rules)
+        for metric in ('stability', 'consistency', 'accuracy'):
+            assert meta['analysis'][metric] == pytest.approx(expected[metric])
+        # 关节评分以 float16 保存
+        np.testing.assert_allclose(
+            columns['joint_scores'].astype(np.float64),
+            [[score['joint_scores'][j] for j in JOINTS] for score in frame_scores],
+            atol=0.05
+        )
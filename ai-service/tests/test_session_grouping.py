@@ -0,0 +1,120 @@
+import json
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from target_analysis.session_grouping import SessionGrouping, collect_impacts, normalize_impacts
+
+
+def make_ends(seed, num_ends=20, arrows_per_end=6):
+    """各组落点：重心随组缓慢漂移，另加单箭组和靶面外的落点"""
+    rng = np.random.default_rng(seed)
+    ends = [
+        rng.normal([0.05 + 0.01 * i, -0.02 * i], 0.15, size=(arrows_per_end, 2))
+        for i in range(num_ends)
+    ]
+    return ends + [np.array([[0.5, 0.5]]), np.array([[2.0, -3.0], [0.1, 0.1]])]
+
+
+def brute_force(points, ends, config):
+    """由全部落点直接计算的统计"""
+    center = points.mean(axis=0)
+    expected = {
+        'center': center,
+        'diameter': max((np.linalg.norm(p - q) for p, q in combinations(points, 2)), default=0.0),
+        'rms_radius': np.sqrt(((points - center) ** 2).sum(axis=1).mean())
+    }
+    extent, bins = config['heatmap_extent'], config['heatmap_bins']
+    clipped = np.clip(points, -extent, extent)
+    expected['heatmap'], _, _ = np.histogram2d(
+        clipped[:, 1], clipped[:, 0], bins=bins, range=[[-extent, extent], [-extent, extent]]
+    )
+    if len(points) >= 3:
+        scale = -2 * np.log(1 - config['confidence'])
+        expected['axes'] = np.sqrt(np.linalg.eigvalsh(np.cov(points.T)) * scale)
+    if len(ends) >= 2:
+        # 各组重心对组序号的加权最小二乘斜率
+        centers = np.array([end.mean(axis=0) for end in ends])
+        weights = np.array([len(end) for end in ends])
+        expected['rate'] = [
+            np.polyfit(np.arange(len(ends)), centers[:, axis], 1, w=np.sqrt(weights))[0]
+            for axis in range(2)
+        ]
+    return expected
+
+
+def test_incremental_summary_matches_brute_force():
+    ends = make_ends(0)
+    state = None
+    for i, points in enumerate(ends):
+        # 每组之间状态经过一次 JSON 序列化，与服务端的用法一致
+        grouping = SessionGrouping() if state is None else SessionGrouping.from_state(state)
+        end = grouping.add_end(points)
+        state = json.loads(json.dumps(grouping.to_state()))
+        summary = grouping.summary()
+
+        assert end['end'] == i and end['arrows'] == len(points)
+        np.testing.assert_allclose(end['center'], points.mean(axis=0))
+
+        seen = ends[:i + 1]
+        all_points = np.concatenate(seen)
+        expected = brute_force(all_points, seen, grouping.config)
+        assert summary['arrows'] == len(all_points) and summary['ends'] == i + 1
+        np.testing.assert_allclose(summary['center'], expected['center'])
+        assert summary['diameter'] == pytest.approx(expected['diameter'])
+        assert summary['rms_radius'] == pytest.approx(expected['rms_radius'])
+        np.testing.assert_array_equal(summary['heatmap']['counts'], expected['heatmap'])
+        if 'axes' in expected:
+            ellipse = summary['ellipse']
+            np.testing.assert_allclose([ellipse['semi_minor'], ellipse['semi_major']], expected['axes'])
+        else:
+            assert summary['ellipse'] is None
+        if 'rate' in expected:
+            np.testing.assert_allclose(summary['drift']['rate'], expected['rate'], atol=1e-12)
+
+
+def test_state_round_trip_continues_identically():
+    ends = make_ends(1, num_ends=8)
+    direct = SessionGrouping({'heatmap_bins': 10})
+    for points in ends[:4]:
+        direct.add_end(points)
+    restored = SessionGrouping.from_state(json.loads(json.dumps(direct.to_state())))
+    assert restored.config['heatmap_bins'] == 10
+
+    for points in ends[4:]:
+        direct.add_end(points)
+        restored.add_end(points)
+    assert json.dumps(restored.summary()) == json.dumps(direct.summary())
+
+
+def test_from_state_rejects_inconsistent_counts():
+    grouping = SessionGrouping()
+    grouping.add_end([[0, 0], [0.1, 0.2]])
+    state = grouping.to_state()
+    state['count'] = 5
+    with pytest.raises(ValueError):
+        SessionGrouping.from_state(state)
+
+
+def test_heatmap_rows_are_y_and_clip_to_edges():
+    grouping = SessionGrouping({'heatmap_bins': 4, 'heatmap_extent': 1})
+    grouping.add_end([[0.9, 0.9], [5, -5]])
+    heatmap = grouping.heatmap
+    # 右下方的落点在最后一行最后一列，靶面外的落点计入右上角的边缘格
+    assert heatmap[3, 3] == 1 and heatmap[0, 3] == 1 and heatmap.sum() == 2
+
+
+def test_collect_impacts_from_analysis():
+    analysis = {
+        'target': {'box': [100, 100, 300, 300]},
+        'arrows': [{'box': [190, 190, 210, 210]}, {'box': [290, 190, 310, 210]}]
+    }
+    np.testing.assert_allclose(collect_impacts(analysis=analysis), [[0, 0], [1, 0]])
+    np.testing.assert_allclose(normalize_impacts([[200, 100]], [100, 100, 300, 300]), [[0, -1]])
+
+    for impacts in ([1, 2], [], [[np.nan, 0]]):
+        with pytest.raises(ValueError):
+            collect_impacts(impacts=impacts)
+    with pytest.raises(ValueError):
+        collect_impacts()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from pose_analysis.shot_consistency import ShotConsistencyAnalyzer, banded_dtw, dtw_align
+
+
+def naive_dtw(a, b, radius):
+    """逐格计算的 O(n²) 参考DTW，a、b 为 (帧数, 关节数)，|i - j| > radius 的格不可达"""
+    length = len(a)
+    accumulated = np.full((length + 1, length + 1), np.inf)
+    accumulated[0, 0] = 0
+    for i in range(1, length + 1):
+        for j in range(1, length + 1):
+            if abs(i - j) > radius:
+                continue
+            cost = np.abs(a[i - 1] - b[j - 1]).mean()
+            accumulated[i, j] = cost + min(
+                accumulated[i - 1, j - 1], accumulated[i - 1, j], accumulated[i, j - 1]
+            )
+    return accumulated[length, length]
+
+
+def random_pairs(rng, pairs, length, joints):
+    """(对数, 帧数, 关节数) 的随机角度序列，角度量级与实际一致"""
+    a = rng.normal(90, 30, size=(pairs, length, joints)).astype(np.float32)
+    b = rng.normal(90, 30, size=(pairs, length, joints)).astype(np.float32)
+    return a, b
+
+
+@pytest.mark.parametrize('length, radius', [(30, 1), (30, 4), (47, 7), (20, 19)])
+def test_banded_dtw_matches_naive(length, radius):
+    rng = np.random.default_rng(length * 100 + radius)
+    a, b = random_pairs(rng, 12, length, 3)
+
+    got = banded_dtw(a.transpose(2, 1, 0), b.transpose(2, 1, 0), radius)
+    expected = [naive_dtw(a[p], b[p], radius) for p in range(len(a))]
+    np.testing.assert_allclose(got, expected, rtol=1e-5)
+
+
+def test_banded_dtw_keep_cost_ends_at_distance():
+    rng = np.random.default_rng(1)
+    a, b = random_pairs(rng, 5, 24, 2)
+    planes_a, planes_b = a.transpose(2, 1, 0), b.transpose(2, 1, 0)
+
+    distance, accumulated = banded_dtw(planes_a, planes_b, 3, keep_cost=True)
+    assert accumulated.shape == (24, 7, 5)
+    np.testing.assert_array_equal(accumulated[-1, 3], distance)
+    np.testing.assert_array_equal(banded_dtw(planes_a, planes_b, 3), distance)
+
+
+def test_banded_dtw_identical_sequences_is_zero():
+    rng = np.random.default_rng(2)
+    a, _ = random_pairs(rng, 4, 16, 3)
+    planes = a.transpose(2, 1, 0)
+    np.testing.assert_array_equal(banded_dtw(planes, planes, 2), 0)
+
+
+def test_dtw_align_recovers_time_shift():
+    t = np.linspace(0, 3, 64)
+    template = np.sin(t)[None, :].astype(np.float32)
+    shifted = np.sin(t - 0.1)[None, :].astype(np.float32)
+    sequences = np.stack([template, shifted], axis=2)
+
+    aligned = dtw_align(template, sequences, 6)
+    np.testing.assert_allclose(aligned[0, :, 0], template[0], atol=1e-6)
+    # 对齐后的偏差应明显小于未对齐时
+    assert np.abs(aligned[1, :, 0] - template[0]).mean() < np.abs(shifted - template).mean() / 3
+
+
+def test_distance_matrix_matches_pairwise_dtw():
+    rng = np.random.default_rng(3)
+    planes = rng.normal(90, 30, size=(3, 20, 6)).astype(np.float32)
+    analyzer = ShotConsistencyAnalyzer({'pair_chunk': 4})
+
+    distances = analyzer.distance_matrix(planes, 2)
+    np.testing.assert_array_equal(distances, distances.T)
+    np.testing.assert_array_equal(np.diag(distances), 0)
+    for i in range(6):
+        for j in range(i + 1, 6):
+            expected = naive_dtw(planes[:, :, i].T, planes[:, :, j].T, 2) / 20
+            assert distances[i, j] == pytest.approx(expected, rel=1e-5)
@@ -0,0 +1,165 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.error_handler import APIError
+from utils.metrics import count_admission_rejected, observe_admission_wait, set_admission_state
+
+# 优先级从高到低
+PRIORITIES = ('realtime', 'target', 'video')
+
+
+class Overloaded(APIError):
+    """服务过载，请求未被接受"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, 503, {'retry_after': retry_after})
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """已获得的执行槽位"""
+
+    def __init__(self, priority, waited):
+        self.priority = priority
+        self.waited = waited
+        self.started_at = time.monotonic()
+
+
+class _Waiter:
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.granted = False
+        self.event = threading.Event()
+
+
+class AdmissionController:
+    """分析请求的准入控制
+
+    同一worker进程内的分析请求共享 capacity 个执行槽位，每个优先级另有并发上限
+    （如限制视频分析最多占用的槽位，为实时分析留出余量）。槽位不足时请求排队，
+    空出槽位时按优先级（realtime > target > video）、同级先到先得分配。
+    排队超过期限的请求被丢弃，队列已满时立即拒绝，均返回503和 Retry-After。
+    """
+
+    def __init__(self, capacity, limits, queue_sizes, queue_timeouts):
+        self.capacity = capacity
+        self.limits = limits
+        self.queue_sizes = queue_sizes
+        self.queue_timeouts = queue_timeouts
+
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        # 各优先级单个请求占用槽位时间的滑动平均，用于估计 Retry-After
+        self._service_seconds = {priority: None for priority in PRIORITIES}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量创建，capacity 应小于 gunicorn 每个worker的线程数，留出线程快速返回503"""
+        capacity = int(os.getenv('ADMISSION_CAPACITY', 4))
+        # (并发上限, 队列长度, 排队期限秒)
+        defaults = {
+            'realtime': (capacity, 8, 0.5),
+            'target': (capacity, 16, 10),
+            'video': (max(capacity - 1, 1), 4, 30)
+        }
+        env = lambda priority, name, default: os.getenv(f'ADMISSION_{name}_{priority.upper()}', default)
+        return cls(
+            capacity,
+            limits={p: int(env(p, 'LIMIT', d[0])) for p, d in defaults.items()},
+            queue_sizes={p: int(env(p, 'QUEUE', d[1])) for p, d in defaults.items()},
+            queue_timeouts={p: float(env(p, 'TIMEOUT', d[2])) for p, d in defaults.items()}
+        )
+
+    def acquire(self, priority, timeout=None):
+        """获取执行槽位，timeout 为请求自身的期限（秒），与该优先级的排队期限取较小值
+
+        返回 Ticket，无法在期限内获得槽位时抛出 Overloaded。
+        """
+        queue_timeout = self.queue_timeouts[priority]
+        if timeout is not None:
+            queue_timeout = min(queue_timeout, timeout)
+        start = time.monotonic()
+
+        with self._lock:
+            if self._can_run(priority):
+                self._running[priority] += 1
+                self._update_state(priority)
+                observe_admission_wait(priority, 0.0)
+                return Ticket(priority, 0.0)
+
+            queue = self._queues[priority]
+            if len(queue) >= self.queue_sizes[priority] or queue_timeout <= 0:
+                count_admission_rejected(priority, 'queue_full')
+                raise Overloaded('服务繁忙，请稍后重试', self._retry_after(priority))
+
+            waiter = _Waiter(start + queue_timeout)
+            queue.append(waiter)
+            self._update_state(priority)
+
+        waiter.event.wait(queue_timeout)
+
+        with self._lock:
+            if not waiter.granted:
+                # 期限已过，从队列中丢弃
+                if waiter in queue:
+                    queue.remove(waiter)
+                self._update_state(priority)
+                count_admission_rejected(priority, 'expired')
+                raise Overloaded('服务繁忙，请稍后重试', self._retry_after(priority))
+
+        waited = time.monotonic() - start
+        observe_admission_wait(priority, waited)
+        return Ticket(priority, waited)
+
+    def release(self, ticket):
+        """归还槽位，并分配给排队中优先级最高的请求"""
+        elapsed = time.monotonic() - ticket.started_at
+        with self._lock:
+            self._running[ticket.priority] -= 1
+            average = self._service_seconds[ticket.priority]
+            self._service_seconds[ticket.priority] = (
+                elapsed if average is None else 0.8 * average + 0.2 * elapsed
+            )
+            self._dispatch()
+            self._update_state(ticket.priority)
+
+    @contextmanager
+    def admit(self, priority, timeout=None):
+        """在执行槽位内执行"""
+        ticket = self.acquire(priority, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _can_run(self, priority):
+        return (sum(self._running.values()) < self.capacity
+                and self._running[priority] < self.limits[priority])
+
+    def _dispatch(self):
+        """持锁调用：按优先级唤醒可以执行的排队请求，跳过已过期的"""
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_run(priority):
+                waiter = queue.popleft()
+                if waiter.deadline <= now:
+                    continue
+                waiter.granted = True
+                self._running[priority] += 1
+                waiter.event.set()
+            self._update_state(priority)
+
+    def _update_state(self, priority):
+        set_admission_state(priority, len(self._queues[priority]), self._running[priority])
+
+    def _retry_after(self, priority):
+        """按排队长度和平均占用时间估计的重试等待秒数"""
+        service = self._service_seconds[priority] or 1.0
+        waiting = len(self._queues[priority]) + 1
+        return max(1, math.ceil(service * waiting / max(self.limits[priority], 1)))
@@ -18,4 +18,7 @@ def error_handler(error):
     """错误处理器"""
     response = jsonify(error.to_dict())
     response.status_code = error.status_code
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
     return response 
\ No newline at end of file
@@ -0,0 +1,253 @@
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from utils.file_hash import hash_file
+
+
+def batched(items, batch_size):
+    """按批次切分列表"""
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+def latency_percentiles(latencies_ms):
+    """计算延迟分位数（毫秒）"""
+    if len(latencies_ms) == 0:
+        return {}
+    latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p90, p95, p99 = np.percentile(latencies_ms, [50, 90, 95, 99])
+    return {
+        'mean': float(latencies_ms.mean()),
+        'p50': float(p50),
+        'p90': float(p90),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(latencies_ms.max())
+    }
+
+
+def run_batched(predict_fn, inputs, batch_size, warmup_batches=1):
+    """按批次执行推理并统计吞吐量与延迟
+
+    predict_fn(batch) 返回与 batch 等长的输出列表。预热批次的输出会保留，
+    但不计入计时（避免把图编译、权重加载算进延迟）。
+    """
+    batches = list(batched(inputs, batch_size))
+    outputs = []
+    latencies_ms = []
+    timed_items = 0
+
+    start = None
+    for i, batch in enumerate(batches):
+        if i == warmup_batches:
+            start = time.perf_counter()
+
+        batch_start = time.perf_counter()
+        outputs.extend(predict_fn(batch))
+        elapsed_ms = (time.perf_counter() - batch_start) * 1000
+
+        if i >= warmup_batches:
+            latencies_ms.append(elapsed_ms)
+            timed_items += len(batch)
+
+    total_seconds = time.perf_counter() - start if start is not None else 0.0
+    per_item_ms = [
+        latency / len(batch)
+        for latency, batch in zip(latencies_ms, batches[warmup_batches:])
+    ]
+
+    return outputs, {
+        'items': len(inputs),
+        'batch_size': batch_size,
+        'batches': len(batches),
+        'warmup_batches': min(warmup_batches, len(batches)),
+        'timed_items': timed_items,
+        'total_seconds': total_seconds,
+        'throughput': timed_items / total_seconds if total_seconds > 0 else None,
+        'batch_latency_ms': latency_percentiles(latencies_ms),
+        'item_latency_ms': latency_percentiles(per_item_ms)
+    }
+
+
+def classification_metrics(y_true, y_pred, labels=None):
+    """分类指标：准确率、混淆矩阵（行为真实类别）和各类别 precision/recall/F1"""
+    if labels is None:
+        labels = sorted(set(y_true) | set(y_pred))
+    index = {label: i for i, label in enumerate(labels)}
+
+    matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for true, pred in zip(y_true, y_pred):
+        matrix[index[true], index[pred]] += 1
+
+    true_positive = np.diag(matrix).astype(np.float64)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+    precision = np.divide(true_positive, predicted, out=np.zeros_like(true_positive), where=predicted > 0)
+    recall = np.divide(true_positive, support, out=np.zeros_like(true_positive), where=support > 0)
+    denominator = precision + recall
+    f1 = np.divide(2 * precision * recall, denominator, out=np.zeros_like(true_positive), where=denominator > 0)
+
+    total = matrix.sum()
+    return {
+        'accuracy': float(true_positive.sum() / total) if total else 0.0,
+        'macro_f1': float(f1[support > 0].mean()) if (support > 0).any() else 0.0,
+        'labels': list(labels),
+        'confusion_matrix': matrix.tolist(),
+        'per_class': {
+            label: {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(support[i])
+            }
+            for i, label in enumerate(labels)
+        }
+    }
+
+
+def box_iou(boxes_a, boxes_b):
+    """两组 [x1, y1, x2, y2] 框的IoU矩阵"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _average_precision(recall, precision):
+    """全点插值的AP（PR曲线下面积）"""
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    changes = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[changes + 1] - recall[changes]) * precision[changes + 1]))
+
+
+def _match_detections(predictions, ground_truths, class_id, iou_thresholds):
+    """按置信度贪心匹配某一类别的检测框，返回 (置信度, 各IoU阈值下是否为TP, 真实框数)"""
+    confidences = []
+    true_positives = []
+    num_ground_truth = 0
+
+    for pred, truth in zip(predictions, ground_truths):
+        pred = pred[pred[:, 5] == class_id]
+        truth = truth[truth[:, 0] == class_id]
+        num_ground_truth += len(truth)
+        if len(pred) == 0:
+            continue
+
+        pred = pred[np.argsort(-pred[:, 4])]
+        matched = np.zeros((len(iou_thresholds), len(pred)), dtype=bool)
+        if len(truth):
+            ious = box_iou(pred[:, :4], truth[:, 1:5])
+            for t, threshold in enumerate(iou_thresholds):
+                used = np.zeros(len(truth), dtype=bool)
+                for i in range(len(pred)):
+                    candidates = np.where((ious[i] >= threshold) & ~used)[0]
+                    if len(candidates):
+                        best = candidates[np.argmax(ious[i, candidates])]
+                        used[best] = True
+                        matched[t, i] = True
+
+        confidences.append(pred[:, 4])
+        true_positives.append(matched)
+
+    if confidences:
+        confidences = np.concatenate(confidences)
+        true_positives = np.concatenate(true_positives, axis=1)
+    else:
+        confidences = np.zeros(0)
+        true_positives = np.zeros((len(iou_thresholds), 0), dtype=bool)
+    return confidences, true_positives, num_ground_truth
+
+
+def detection_metrics(predictions, ground_truths, class_names, conf_threshold=0.25,
+                      iou_thresholds=None):
+    """目标检测指标：mAP@0.5、mAP@0.5:0.95 及各类别在置信度阈值下的 precision/recall
+
+    predictions: 每张图片一个 (K, 6) 数组 [x1, y1, x2, y2, conf, cls]
+    ground_truths: 每张图片一个 (G, 5) 数组 [cls, x1, y1, x2, y2]
+    """
+    if iou_thresholds is None:
+        iou_thresholds = np.linspace(0.5, 0.95, 10)
+    predictions = [np.asarray(p, dtype=np.float64).reshape(-1, 6) for p in predictions]
+    ground_truths = [np.asarray(g, dtype=np.float64).reshape(-1, 5) for g in ground_truths]
+
+    per_class = {}
+    for class_id, name in enumerate(class_names):
+        confidences, true_positives, num_ground_truth = _match_detections(
+            predictions, ground_truths, class_id, iou_thresholds
+        )
+        order = np.argsort(-confidences)
+        true_positives = true_positives[:, order]
+        confidences = confidences[order]
+
+        aps = []
+        for t in range(len(iou_thresholds)):
+            tp_cumsum = np.cumsum(true_positives[t])
+            fp_cumsum = np.cumsum(~true_positives[t])
+            recall = tp_cumsum / num_ground_truth if num_ground_truth else np.zeros_like(tp_cumsum, dtype=np.float64)
+            precision = tp_cumsum / np.maximum(tp_cumsum + fp_cumsum, 1)
+            aps.append(_average_precision(recall, precision) if num_ground_truth else 0.0)
+
+        kept = confidences >= conf_threshold
+        tp = int(true_positives[0, kept].sum())
+        fp = int(kept.sum()) - tp
+        per_class[name] = {
+            'ap50': aps[0],
+            'ap50_95': float(np.mean(aps)),
+            'precision': tp / (tp + fp) if tp + fp else 0.0,
+            'recall': tp / num_ground_truth if num_ground_truth else 0.0,
+            'ground_truth': num_ground_truth,
+            'detections': int(len(confidences))
+        }
+
+    evaluated = [m for m in per_class.values() if m['ground_truth'] > 0]
+    return {
+        'mAP50': float(np.mean([m['ap50'] for m in evaluated])) if evaluated else 0.0,
+        'mAP50_95': float(np.mean([m['ap50_95'] for m in evaluated])) if evaluated else 0.0,
+        'conf_threshold': conf_threshold,
+        'per_class': per_class
+    }
+
+
+def _file_fingerprint(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return {
+        'path': str(path),
+        'sha1': hash_file(path),
+        'size': path.stat().st_size
+    }
+
+
+def write_report(path, task, model_path, metrics, timing, config=None):
+    """写出统一格式的评估报告JSON，便于比较不同候选模型的速度与精度"""
+    report = {
+        'task': task,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'model': _file_fingerprint(model_path),
+        'host': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version()
+        },
+        'config': config or {},
+        'metrics': metrics,
+        'timing': timing
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -0,0 +1,10 @@
+import hashlib
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """计算文件内容的SHA1哈希"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,169 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+
+# 设置 PROMETHEUS_MULTIPROC_DIR 后，各gunicorn worker的指标写入共享目录并在 /metrics 汇总
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    'ai_stage_duration_seconds', '分析各阶段耗时',
+    ['analyzer', 'stage'], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'ai_request_duration_seconds', '接口请求耗时',
+    ['endpoint', 'status'], buckets=STAGE_BUCKETS
+)
+FRAMES_PROCESSED = Counter(
+    'ai_frames_processed_total', '已处理的视频帧数',
+    ['analyzer', 'mode']
+)
+DETECTOR_BATCH_SIZE = Histogram(
+    'ai_detector_batch_size', '检测模型每次推理的批大小',
+    ['analyzer'], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+CACHE_REQUESTS = Counter(
+    'ai_cache_requests_total', '结果缓存查询次数',
+    ['cache', 'result']
+)
+CACHE_EVICTIONS = Counter(
+    'ai_cache_evictions_total', '结果缓存淘汰次数',
+    ['cache', 'tier']
+)
+MODEL_RELOADS = Counter(
+    'ai_model_reloads_total', '模型热更新次数',
+    ['model', 'result']
+)
+SHADOW_SECONDS = Histogram(
+    'ai_shadow_duration_seconds', '影子模式下主模型与候选模型的推理耗时',
+    ['model', 'role'], buckets=STAGE_BUCKETS
+)
+SHADOW_COMPARISONS = Counter(
+    'ai_shadow_comparisons_total', '影子模式输出对比次数',
+    ['model', 'agree']
+)
+ADMISSION_QUEUED = Gauge(
+    'ai_admission_queued', '等待执行槽位的请求数',
+    ['priority'], multiprocess_mode='livesum'
+)
+ADMISSION_RUNNING = Gauge(
+    'ai_admission_running', '正在执行的分析请求数',
+    ['priority'], multiprocess_mode='livesum'
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    'ai_admission_wait_seconds', '请求排队等待执行槽位的时间',
+    ['priority'], buckets=STAGE_BUCKETS
+)
+ADMISSION_REJECTED = Counter(
+    'ai_admission_rejected_total', '准入控制拒绝的请求数',
+    ['priority', 'reason']
+)
+
+# 当前请求的阶段耗时累计，未开启 Server-Timing 时为 None
+_request_timings = ContextVar('request_timings', default=None)
+
+# 缓存带标签的子指标，避免热路径上重复查找
+_stage_children = {}
+
+
+def _stage_histogram(analyzer, name):
+    key = (analyzer, name)
+    child = _stage_children.get(key)
+    if child is None:
+        child = _stage_children[key] = STAGE_SECONDS.labels(analyzer, name)
+    return child
+
+
+@contextmanager
+def stage(analyzer, name):
+    """记录一个分析阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stage_histogram(analyzer, name).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def count_frames(analyzer, mode, count=1):
+    """记录处理的帧数"""
+    FRAMES_PROCESSED.labels(analyzer, mode).inc(count)
+
+
+def observe_batch_size(analyzer, size):
+    """记录检测模型的批大小"""
+    DETECTOR_BATCH_SIZE.labels(analyzer).observe(size)
+
+
+def count_cache_request(cache, result):
+    """记录缓存查询结果：hit_memory / hit_disk / coalesced / miss"""
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def count_cache_eviction(cache, tier):
+    CACHE_EVICTIONS.labels(cache, tier).inc()
+
+
+def count_model_reload(model, result):
+    """记录模型热更新：swapped / failed"""
+    MODEL_RELOADS.labels(model, result).inc()
+
+
+def observe_shadow(model, primary_seconds, candidate_seconds, agree):
+    """记录一次影子对比"""
+    SHADOW_SECONDS.labels(model, 'primary').observe(primary_seconds)
+    if candidate_seconds is not None:
+        SHADOW_SECONDS.labels(model, 'candidate').observe(candidate_seconds)
+    SHADOW_COMPARISONS.labels(model, 'true' if agree else 'false').inc()
+
+
+def set_admission_state(priority, queued, running):
+    """记录某优先级的排队数和执行数"""
+    ADMISSION_QUEUED.labels(priority).set(queued)
+    ADMISSION_RUNNING.labels(priority).set(running)
+
+
+def observe_admission_wait(priority, seconds):
+    ADMISSION_WAIT_SECONDS.labels(priority).observe(seconds)
+
+
+def count_admission_rejected(priority, reason):
+    """记录准入拒绝：queue_full / expired"""
+    ADMISSION_REJECTED.labels(priority, reason).inc()
+
+
+def begin_request(collect_timings):
+    """请求开始，按需开启阶段耗时收集"""
+    _request_timings.set({} if collect_timings else None)
+
+
+def server_timing_header():
+    """生成当前请求的 Server-Timing 头（毫秒），未收集时返回 None"""
+    timings = _request_timings.get()
+    if not timings:
+        return None
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+
+def observe_request(endpoint, status, seconds):
+    REQUEST_SECONDS.labels(endpoint, str(status)).observe(seconds)
+
+
+def render_metrics():
+    """导出 Prometheus 文本格式的指标，返回 (内容, Content-Type)"""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,405 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.file_hash import hash_file
+from utils.metrics import count_model_reload, observe_shadow
+
+DEFAULT_ROOT = Path(__file__).resolve().parents[1] / 'model_registry'
+
+logger = logging.getLogger(__name__)
+
+
+def _atomic_write_json(path, data):
+    """写入临时文件后重命名，读取方不会看到写了一半的内容"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ModelRegistry:
+    """本地版本化模型注册表
+
+    目录结构：
+        <root>/<name>/versions/<version>/   模型文件和 metadata.json，发布后不再修改
+        <root>/<name>/current.json          当前服务的版本
+        <root>/<name>/candidate.json        影子模式的候选版本
+        <root>/<name>/shadow/<version>.jsonl 候选版本的影子对比记录
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量创建"""
+        return cls(os.getenv('MODEL_REGISTRY_DIR') or DEFAULT_ROOT)
+
+    def _versions_dir(self, name):
+        return self.root / name / 'versions'
+
+    def version_dir(self, name, version):
+        return self._versions_dir(name) / version
+
+    def versions(self, name):
+        """已发布的版本，按发布时间排序"""
+        versions_dir = self._versions_dir(name)
+        if not versions_dir.exists():
+            return []
+        return sorted(p.name for p in versions_dir.iterdir() if p.is_dir() and not p.name.startswith('.'))
+
+    def metadata(self, name, version):
+        return _read_json(self.version_dir(name, version) / 'metadata.json')
+
+    def publish(self, name, files, metadata=None, promote=False):
+        """发布新版本，返回版本号
+
+        文件先复制到临时目录，再整体重命名为版本目录。
+        promote 为 True 或尚无当前版本时直接切换为当前版本，否则设为影子候选。
+        """
+        files = [Path(f) for f in files]
+        digest = hashlib.sha1()
+        file_info = {}
+        for path in files:
+            file_sha1 = hash_file(path)
+            # 版本号由各文件哈希的原始字节合并计算
+            digest.update(bytes.fromhex(file_sha1))
+            file_info[path.name] = {'sha1': file_sha1, 'size': path.stat().st_size}
+
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest.hexdigest()[:8]}"
+        versions_dir = self._versions_dir(name)
+        versions_dir.mkdir(parents=True, exist_ok=True)
+
+        staging = Path(tempfile.mkdtemp(dir=versions_dir, prefix='.tmp-'))
+        try:
+            for path in files:
+                shutil.copy2(path, staging / path.name)
+            _atomic_write_json(staging / 'metadata.json', {
+                'name': name,
+                'version': version,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'files': file_info,
+                **(metadata or {})
+            })
+            os.rename(staging, versions_dir / version)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if promote or self.current(name) is None:
+            self.set_current(name, version)
+        else:
+            self.set_candidate(name, version)
+        return version
+
+    def current(self, name):
+        pointer = _read_json(self.root / name / 'current.json')
+        return pointer['version'] if pointer else None
+
+    def candidate(self, name):
+        pointer = _read_json(self.root / name / 'candidate.json')
+        return pointer['version'] if pointer else None
+
+    def _check_version(self, name, version):
+        if not self.version_dir(name, version).is_dir():
+            raise ValueError(f'模型 {name} 不存在版本 {version}')
+
+    def set_current(self, name, version):
+        """切换当前版本，各worker在下次轮询时加载"""
+        self._check_version(name, version)
+        pointer = _read_json(self.root / name / 'current.json') or {}
+        previous = pointer.get('version')
+        _atomic_write_json(self.root / name / 'current.json', {
+            'version': version,
+            'previous': previous if previous != version else pointer.get('previous'),
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+        if self.candidate(name) == version:
+            self.set_candidate(name, None)
+
+    def set_candidate(self, name, version):
+        """设置影子候选版本，None 表示关闭影子模式"""
+        path = self.root / name / 'candidate.json'
+        if version is None:
+            path.unlink(missing_ok=True)
+            return
+        self._check_version(name, version)
+        _atomic_write_json(path, {
+            'version': version,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+
+    def rollback(self, name):
+        """回滚到上一个当前版本"""
+        pointer = _read_json(self.root / name / 'current.json')
+        if not pointer or not pointer.get('previous'):
+            raise ValueError(f'模型 {name} 没有可回滚的版本')
+        self.set_current(name, pointer['previous'])
+        return pointer['previous']
+
+    def shadow_log_path(self, name, version):
+        return self.root / name / 'shadow' / f'{version}.jsonl'
+
+    def shadow_report(self, name, version):
+        """汇总候选版本的影子对比记录"""
+        path = self.shadow_log_path(name, version)
+        if not path.exists():
+            return None
+        with open(path, 'r') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if not records:
+            return None
+
+        def percentile(values, q):
+            values = sorted(values)
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        primary = [r['primary_seconds'] for r in records]
+        candidate = [r['candidate_seconds'] for r in records if r.get('candidate_seconds') is not None]
+        return {
+            'samples': len(records),
+            'errors': sum(1 for r in records if r.get('error')),
+            'agreement': sum(1 for r in records if r.get('agree')) / len(records),
+            'primary_p50': percentile(primary, 0.5),
+            'primary_p95': percentile(primary, 0.95),
+            'candidate_p50': percentile(candidate, 0.5) if candidate else None,
+            'candidate_p95': percentile(candidate, 0.95) if candidate else None
+        }
+
+
+class ReloadableModel:
+    """可热更新的模型
+
+    从注册表加载当前版本，后台线程轮询版本指针：新版本在后台加载并预热后
+    通过一次引用赋值原子切换，进行中的请求继续使用旧版本。
+    注册表中没有该模型时从 fallback_dir 加载（版本记为 legacy）。
+    设置了候选版本时同时加载候选模型，按抽样比例在后台用候选模型重复执行请求，
+    记录延迟和输出差异（影子模式），不影响响应。
+    """
+
+    def __init__(self, name, loader, fallback_dir=None, warmup=None, compare=None,
+                 registry=None, poll_interval=None, shadow_sample_rate=None):
+        # loader(模型目录) -> 模型或None；compare(主模型输出, 候选输出) -> 差异字典，包含 agree
+        self.name = name
+        self.loader = loader
+        self.fallback_dir = fallback_dir
+        self.warmup = warmup
+        self.compare = compare
+        self.registry = registry or ModelRegistry.from_env()
+        self.poll_interval = float(os.getenv('MODEL_POLL_INTERVAL', 10) if poll_interval is None else poll_interval)
+        self.shadow_sample_rate = float(
+            os.getenv('SHADOW_SAMPLE_RATE', 0.1) if shadow_sample_rate is None else shadow_sample_rate
+        )
+
+        self._active = (None, None)  # (版本, 模型)
+        self._shadow = (None, None)
+        self._failed = set()  # 加载失败的版本，不再重试
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # 影子请求在单个后台线程执行，繁忙时丢弃新的抽样
+        self._shadow_executor = None
+        self._shadow_busy = threading.Semaphore(1)
+
+        self.refresh()
+
+    def get(self):
+        """返回 (版本, 模型)，同一请求内应只取一次以保证使用同一版本"""
+        return self._active
+
+    @property
+    def model(self):
+        return self._active[1]
+
+    @property
+    def version(self):
+        return self._active[0]
+
+    @property
+    def shadow_version(self):
+        return self._shadow[0]
+
+    def _load(self, version):
+        if version == 'legacy':
+            model_dir = self.fallback_dir
+        else:
+            model_dir = self.registry.version_dir(self.name, version)
+        model = self.loader(Path(model_dir)) if model_dir else None
+        if model is not None and self.warmup is not None:
+            self.warmup(model)
+        return model
+
+    def refresh(self):
+        """检查版本指针，有变化时加载新版本并切换，返回是否切换了当前版本"""
+        with self._reload_lock:
+            current = self.registry.current(self.name) or 'legacy'
+            candidate = self.registry.candidate(self.name)
+            swapped = False
+
+            if current != self._active[0] and current == self._shadow[0] and self._shadow[1] is not None:
+                # 提升影子候选时直接复用已加载并预热的实例
+                self._active = self._shadow
+                swapped = True
+                count_model_reload(self.name, 'swapped')
+            elif current != self._active[0] and current not in self._failed:
+                try:
+                    model = self._load(current)
+                except Exception as e:
+                    # 加载失败时继续使用旧版本
+                    logger.error('模型 %s 版本 %s 加载失败: %s', self.name, current, e)
+                    self._failed.add(current)
+                    count_model_reload(self.name, 'failed')
+                else:
+                    self._active = (current, model)
+                    swapped = True
+                    count_model_reload(self.name, 'swapped')
+
+            if candidate != self._shadow[0]:
+                if candidate is None or candidate == current:
+                    self._shadow = (None, None)
+                else:
+                    try:
+                        self._shadow = (candidate, self._load(candidate))
+                    except Exception as e:
+                        logger.error('候选模型 %s 版本 %s 加载失败: %s', self.name, candidate, e)
+                        self._shadow = (candidate, None)
+
+            return swapped
+
+    def start(self):
+        """启动后台轮询线程"""
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._poll, name=f'{self.name}-model-reload', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error('模型 %s 版本检查失败: %s', self.name, e)
+
+    def shadow(self, run, primary_output, primary_seconds):
+        """按抽样比例在后台用候选模型执行 run(model)，记录延迟和输出差异"""
+        version, candidate = self._shadow
+        if candidate is None or self.compare is None or random.random() >= self.shadow_sample_rate:
+            return
+        if not self._shadow_busy.acquire(blocking=False):
+            return
+        if self._shadow_executor is None:
+            self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{self.name}-shadow')
+        self._shadow_executor.submit(
+            self._run_shadow, version, candidate, run, primary_output, primary_seconds
+        )
+
+    def _run_shadow(self, version, candidate, run, primary_output, primary_seconds):
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'primary_version': self.version,
+            'candidate_version': version,
+            'primary_seconds': primary_seconds
+        }
+        try:
+            start = time.perf_counter()
+            candidate_output = run(candidate)
+            record['candidate_seconds'] = time.perf_counter() - start
+            record.update(self.compare(primary_output, candidate_output))
+        except Exception as e:
+            record['error'] = str(e)
+            record['agree'] = False
+        finally:
+            self._shadow_busy.release()
+
+        observe_shadow(self.name, primary_seconds, record.get('candidate_seconds'), record.get('agree', False))
+        path = self.registry.shadow_log_path(self.name, version)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=float) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模型注册表管理')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='列出已发布的版本')
+    list_parser.add_argument('name', help='模型名称，如 pose / target')
+
+    promote_parser = subparsers.add_parser('promote', help='切换当前版本（默认为影子候选版本）')
+    promote_parser.add_argument('name')
+    promote_parser.add_argument('version', nargs='?')
+
+    shadow_parser = subparsers.add_parser('shadow', help='设置影子候选版本')
+    shadow_parser.add_argument('name')
+    shadow_parser.add_argument('version', nargs='?')
+    shadow_parser.add_argument('--clear', action='store_true', help='关闭影子模式')
+
+    rollback_parser = subparsers.add_parser('rollback', help='回滚到上一个版本')
+    rollback_parser.add_argument('name')
+
+    report_parser = subparsers.add_parser('report', help='汇总影子对比记录')
+    report_parser.add_argument('name')
+    report_parser.add_argument('version', nargs='?')
+
+    args = parser.parse_args()
+    registry = ModelRegistry.from_env()
+
+    if args.command == 'list':
+        current = registry.current(args.name)
+        candidate = registry.candidate(args.name)
+        for version in registry.versions(args.name):
+            marker = '*' if version == current else ('s' if version == candidate else ' ')
+            metadata = registry.metadata(args.name, version) or {}
+            print(f"{marker} {version}  {metadata.get('created_at', '')}")
+    elif args.command == 'promote':
+        version = args.version or registry.candidate(args.name)
+        if version is None:
+            parser.error('未指定版本且没有影子候选版本')
+        registry.set_current(args.name, version)
+        print(f"{args.name} 当前版本: {version}")
+    elif args.command == 'shadow':
+        if args.clear:
+            registry.set_candidate(args.name, None)
+            print(f"{args.name} 已关闭影子模式")
+        elif args.version:
+            registry.set_candidate(args.name, args.version)
+            print(f"{args.name} 影子候选版本: {args.version}")
+        else:
+            parser.error('需要指定版本或 --clear')
+    elif args.command == 'rollback':
+        print(f"{args.name} 已回滚到: {registry.rollback(args.name)}")
+    elif args.command == 'report':
+        version = args.version or registry.candidate(args.name)
+        if version is None:
+            parser.error('未指定版本且没有影子候选版本')
+        print(json.dumps(registry.shadow_report(args.name, version), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
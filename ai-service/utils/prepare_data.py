@@ -3,10 +3,141 @@ import numpy as np
 from pathlib import Path
 import shutil
 import json
+import os
+import argparse
+import tempfile
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
-def prepare_pose_data(source_dir, output_dir):
+from utils.file_hash import hash_file
+
+# 文件落盘方式：auto 依次尝试 reflink -> hardlink -> copy
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'symlink', 'copy')
+
+# Linux FICLONE ioctl（btrfs/xfs等支持写时复制的文件系统）
+FICLONE = 0x40049409
+
+def _reflink(src, dst):
+    """写时复制克隆文件，不支持时抛出OSError"""
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+def link_file(src, dst, mode='auto'):
+    """将源文件放入数据集目录，返回实际使用的方式"""
+    src = Path(src)
+    dst = Path(dst)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    
+    if mode in ('auto', 'reflink'):
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except (OSError, ImportError):
+            if dst.exists():
+                dst.unlink()
+            if mode == 'reflink':
+                raise
+    
+    if mode in ('auto', 'hardlink'):
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            # 跨设备等情况无法建立硬链接
+            if mode == 'hardlink':
+                raise
+    
+    if mode == 'symlink':
+        os.symlink(src.resolve(), dst)
+        return 'symlink'
+    
+    shutil.copy2(src, dst)
+    return 'copy'
+
+class DatasetManifest:
+    """数据集清单：记录每个输出文件的来源、大小、修改时间和内容哈希"""
+    
+    def __init__(self, dataset_dir):
+        self.dataset_dir = Path(dataset_dir)
+        self.path = self.dataset_dir / 'manifest.json'
+        self.files = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.files = json.load(f)['files']
+    
+    def exists(self):
+        return self.path.exists()
+    
+    def is_current(self, src, rel_path):
+        """源文件自上次处理后未变化且输出文件仍存在"""
+        entry = self.files.get(rel_path)
+        if entry is None or entry['source'] != str(src):
+            return False
+        if not (self.dataset_dir / rel_path).exists():
+            return False
+        stat = os.stat(src)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+    
+    def update(self, src, rel_path, sha1, mode):
+        stat = os.stat(src)
+        self.files[rel_path] = {
+            'source': str(src),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': sha1,
+            'mode': mode
+        }
+    
+    def remove(self, rel_path):
+        """删除清单条目及其输出文件"""
+        path = self.dataset_dir / rel_path
+        if path.exists() or path.is_symlink():
+            path.unlink()
+        del self.files[rel_path]
+    
+    def save(self):
+        """原子地保存清单"""
+        self.dataset_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.dataset_dir, prefix='.manifest-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'files': self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+def sync_files(tasks, output_dir, mode='auto', workers=8, desc='同步文件'):
+    """并行将 (源文件, 相对输出路径) 列表同步到输出目录，跳过未变化的文件
+
+    tasks 为完整的文件集合：清单中不在 tasks 里的条目（如标注中的划分或类别已修改）连同输出文件一并删除。
+    """
+    manifest = DatasetManifest(output_dir)
+    wanted = {rel_path for _, rel_path in tasks}
+    stale = [rel_path for rel_path in manifest.files if rel_path not in wanted]
+    pending = [(src, rel_path) for src, rel_path in tasks if not manifest.is_current(src, rel_path)]
+    print(f"{desc}: 共 {len(tasks)} 个文件，{len(tasks) - len(pending)} 个未变化，需处理 {len(pending)} 个，"
+          f"删除 {len(stale)} 个过期文件")
+    
+    def process(task):
+        src, rel_path = task
+        used_mode = link_file(src, Path(output_dir) / rel_path, mode)
+        return src, rel_path, hash_file(src), used_mode
+    
+    try:
+        for rel_path in stale:
+            manifest.remove(rel_path)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for src, rel_path, sha1, used_mode in tqdm(
+                executor.map(process, pending), total=len(pending), desc=desc
+            ):
+                manifest.update(src, rel_path, sha1, used_mode)
+    finally:
+        # 中断时保留已完成的部分
+        manifest.save()
+    
+    return manifest
+
+def prepare_pose_data(source_dir, output_dir, mode='auto', workers=8):
     """准备姿态分析训练数据"""
     source_dir = Path(source_dir)
     output_dir = Path(output_dir)
@@ -19,20 +150,21 @@ def prepare_pose_data(source_dir, output_dir):
     # 读取视频标注
     annotations = pd.read_csv(source_dir / 'pose_annotations.csv')
     
-    # 处理每个视频
-    for _, row in tqdm(annotations.iterrows(), desc="处理姿态视频"):
+    # 收集每个视频的目标路径
+    tasks = []
+    for row in annotations.to_dict('records'):
         video_path = source_dir / 'videos' / row['video_file']
         if not video_path.exists():
             print(f"警告: 找不到视频文件 {video_path}")
             continue
         
         # 确定目标目录
-        target_dir = output_dir / row['split'] / row['category']
-        
-        # 复制视频
-        shutil.copy2(video_path, target_dir / video_path.name)
+        rel_path = f"{row['split']}/{row['category']}/{video_path.name}"
+        tasks.append((video_path, rel_path))
+    
+    sync_files(tasks, output_dir, mode, workers, desc="处理姿态视频")
 
-def prepare_target_data(source_dir, output_dir):
+def prepare_target_data(source_dir, output_dir, mode='auto', workers=8):
     """准备箭靶检测训练数据"""
     source_dir = Path(source_dir)
     output_dir = Path(output_dir)
@@ -46,18 +178,16 @@ def prepare_target_data(source_dir, output_dir):
     annotations = pd.read_csv(source_dir / 'target_annotations.csv')
     
     # 处理每张图片
+    tasks = []
     processed_data = []
-    for _, row in tqdm(annotations.iterrows(), desc="处理箭靶图片"):
+    for row in annotations.to_dict('records'):
         img_path = source_dir / 'images' / row['image_file']
         if not img_path.exists():
             print(f"警告: 找不到图片文件 {img_path}")
             continue
         
         # 确定目标目录
-        target_dir = output_dir / row['split']
-        
-        # 复制图片
-        shutil.copy2(img_path, target_dir / 'images' / img_path.name)
+        tasks.append((img_path, f"{row['split']}/images/{img_path.name}"))
         
         # 处理标注数据
         for obj in json.loads(row['annotations']):
@@ -68,37 +198,66 @@ def prepare_target_data(source_dir, output_dir):
                 'bbox': ','.join(map(str, obj['bbox']))
             })
     
+    sync_files(tasks, output_dir, mode, workers, desc="处理箭靶图片")
+    
     # 保存处理后的标注
     pd.DataFrame(processed_data).to_csv(output_dir / 'annotations.csv', index=False)
 
-def verify_data(data_dir):
+def verify_manifest(dataset_dir, deep=False):
+    """根据清单校验数据集，返回 (各划分统计, 问题列表)"""
+    manifest = DatasetManifest(dataset_dir)
+    stats = {}
+    problems = []
+    
+    for rel_path, entry in manifest.files.items():
+        split = rel_path.split('/', 1)[0]
+        stats[split] = stats.get(split, 0) + 1
+        
+        path = Path(dataset_dir) / rel_path
+        if not path.exists():
+            problems.append(f"缺失: {rel_path}")
+        elif path.stat().st_size != entry['size']:
+            problems.append(f"大小不符: {rel_path}")
+        elif deep and hash_file(path) != entry['sha1']:
+            problems.append(f"哈希不符: {rel_path}")
+    
+    return stats, problems
+
+def verify_data(data_dir, deep=False):
     """验证数据集完整性"""
     data_dir = Path(data_dir)
+    ok = True
+    
+    for name, title in [('pose', '姿态数据'), ('target', '箭靶数据')]:
+        dataset_dir = data_dir / name
+        if not dataset_dir.exists():
+            continue
+        
+        print(f"\n验证{title}:")
+        if not DatasetManifest(dataset_dir).exists():
+            print("警告: 未找到清单文件 manifest.json，请重新运行数据准备")
+            ok = False
+            continue
+        
+        stats, problems = verify_manifest(dataset_dir, deep)
+        for split, count in sorted(stats.items()):
+            print(f"{split}: {count} 个文件")
+        for problem in problems[:20]:
+            print(problem)
+        if problems:
+            print(f"共 {len(problems)} 个文件校验失败")
+            ok = False
     
-    # 验证姿态数据
-    pose_dir = data_dir / 'pose'
-    if pose_dir.exists():
-        print("\n验证姿态数据:")
-        for split in ['training', 'testing']:
-            split_dir = pose_dir / split
-            if split_dir.exists():
-                categories = [d.name for d in split_dir.iterdir() if d.is_dir()]
-                videos = sum(len(list((split_dir / cat).glob('*.mp4'))) 
-                           for cat in categories)
-                print(f"{split}: {videos} 个视频, 类别: {categories}")
-    
-    # 验证箭靶数据
-    target_dir = data_dir / 'target'
-    if target_dir.exists():
-        print("\n验证箭靶数据:")
-        for split in ['training', 'testing']:
-            split_dir = target_dir / split
-            if split_dir.exists():
-                images = len(list((split_dir / 'images').glob('*.jpg')))
-                labels = len(list((split_dir / 'labels').glob('*.txt')))
-                print(f"{split}: {images} 张图片, {labels} 个标注文件")
+    return ok
 
 def main():
+    parser = argparse.ArgumentParser(description='准备训练数据')
+    parser.add_argument('--mode', choices=LINK_MODES, default='auto',
+                        help='文件落盘方式，auto 依次尝试 reflink、hardlink、copy')
+    parser.add_argument('--workers', type=int, default=8, help='并行处理线程数')
+    parser.add_argument('--deep-verify', action='store_true', help='校验时重新计算内容哈希')
+    args = parser.parse_args()
+    
     # 设置数据目录
     raw_data_dir = Path('data/raw')
     processed_data_dir = Path('data/processed')
@@ -106,16 +265,17 @@ def main():
     # 准备姿态数据
     pose_output_dir = processed_data_dir / 'pose'
     print("准备姿态分析训练数据...")
-    prepare_pose_data(raw_data_dir / 'pose', pose_output_dir)
+    prepare_pose_data(raw_data_dir / 'pose', pose_output_dir, args.mode, args.workers)
     
     # 准备箭靶数据
     target_output_dir = processed_data_dir / 'target'
     print("\n准备箭靶检测训练数据...")
-    prepare_target_data(raw_data_dir / 'target', target_output_dir)
+    prepare_target_data(raw_data_dir / 'target', target_output_dir, args.mode, args.workers)
     
     # 验证数据集
     print("\n验证数据集完整性...")
-    verify_data(processed_data_dir)
+    if not verify_data(processed_data_dir, args.deep_verify):
+        raise SystemExit(1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,144 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_MODES = ('cpu', 'memory')
+
+
+class RequestProfiler:
+    """按需请求剖析
+
+    通过管理员请求头（X-Profile + X-Profile-Token）或按比例抽样触发，
+    用 cProfile 记录CPU耗时、用 tracemalloc 记录内存分配热点，
+    结果以请求ID命名保存到有容量上限的本地目录。
+    """
+
+    def __init__(self, output_dir, admin_token=None, sample_rate=0.0, sample_modes=('cpu',),
+                 max_files=300, max_bytes=512 * 1024 * 1024, top_allocations=30, trace_frames=10):
+        self.output_dir = Path(output_dir)
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.sample_modes = tuple(sample_modes)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.top_allocations = top_allocations
+        self.trace_frames = trace_frames
+
+        # cProfile 与 tracemalloc 都是进程级资源，同一时间只剖析一个请求
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量创建"""
+        return cls(
+            output_dir=os.getenv('PROFILE_DIR', 'logs/profiles'),
+            admin_token=os.getenv('PROFILE_ADMIN_TOKEN') or None,
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+            sample_modes=[m for m in os.getenv('PROFILE_SAMPLE_MODES', 'cpu').split(',') if m in PROFILE_MODES],
+            max_files=int(os.getenv('PROFILE_MAX_FILES', 300)),
+            max_bytes=int(os.getenv('PROFILE_MAX_MB', 512)) * 1024 * 1024
+        )
+
+    def requested_modes(self, headers):
+        """根据请求头和抽样比例决定剖析模式，返回空元组表示不剖析"""
+        requested = headers.get('X-Profile')
+        if requested and self.admin_token and headers.get('X-Profile-Token') == self.admin_token:
+            if requested == 'all':
+                return PROFILE_MODES
+            return tuple(m for m in requested.split(',') if m in PROFILE_MODES)
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return self.sample_modes
+        return ()
+
+    @contextmanager
+    def profile(self, request_id, label, modes):
+        """剖析代码块；未请求或已有请求在剖析时直接执行。产出剖析结果的文件前缀或None"""
+        if not modes or not self._lock.acquire(blocking=False):
+            yield None
+            return
+
+        # 请求ID来自客户端请求头，用作文件名前需过滤
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '', str(request_id))[:64] or 'unknown'
+        prefix = f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_id}_{label}"
+        profiler = None
+        started_tracing = False
+        start = time.perf_counter()
+        try:
+            if 'memory' in modes and not tracemalloc.is_tracing():
+                tracemalloc.start(self.trace_frames)
+                started_tracing = True
+            if 'cpu' in modes:
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+            yield prefix
+        finally:
+            try:
+                elapsed = time.perf_counter() - start
+                if profiler is not None:
+                    profiler.disable()
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+
+                if profiler is not None:
+                    self._write_cpu_profile(profiler, prefix)
+                if started_tracing:
+                    self._write_allocations(prefix, request_id, label, elapsed)
+                    tracemalloc.stop()
+                self._prune()
+            finally:
+                self._lock.release()
+
+    def _write_cpu_profile(self, profiler, prefix):
+        """保存 .prof（可用 snakeviz / flameprof 等工具生成火焰图）和文本摘要"""
+        profiler.dump_stats(str(self.output_dir / f'{prefix}.prof'))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+        (self.output_dir / f'{prefix}.cpu.txt').write_text(summary.getvalue())
+
+    def _write_allocations(self, prefix, request_id, label, elapsed):
+        """保存分配量最大的代码位置"""
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            'request_id': request_id,
+            'label': label,
+            'elapsed_seconds': elapsed,
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'top_allocations': [
+                {
+                    'size_bytes': stat.size,
+                    'count': stat.count,
+                    'traceback': stat.traceback.format()
+                }
+                for stat in snapshot.statistics('traceback')[:self.top_allocations]
+            ]
+        }
+        with open(self.output_dir / f'{prefix}.alloc.json', 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def _prune(self):
+        """按文件数和总大小限制删除最旧的剖析结果"""
+        files = sorted(
+            (p for p in self.output_dir.iterdir() if p.is_file()),
+            key=lambda p: p.stat().st_mtime
+        )
+        total = sum(p.stat().st_size for p in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            oldest = files.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink(missing_ok=True)
@@ -0,0 +1,191 @@
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.metrics import count_cache_eviction, count_cache_request
+
+
+class _Flight:
+    """进行中的一次计算，相同键的并发请求等待其结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """分析结果缓存
+
+    以 (输入内容哈希, 参数) 为键，进程内为有界LRU，可选的磁盘层在同一节点的
+    各gunicorn worker之间共享。相同键的并发请求只执行一次计算：
+    进程内通过等待进行中的计算，跨进程通过文件锁。
+    """
+
+    def __init__(self, name, max_entries=256, ttl=3600, disk_dir=None,
+                 disk_max_bytes=1024 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) / name if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries = OrderedDict()  # key -> (过期时间, 结果)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, name):
+        """从环境变量创建"""
+        return cls(
+            name,
+            max_entries=int(os.getenv('RESULT_CACHE_SIZE', 256)),
+            ttl=float(os.getenv('RESULT_CACHE_TTL', 3600)),
+            disk_dir=os.getenv('RESULT_CACHE_DIR') or None,
+            disk_max_bytes=int(os.getenv('RESULT_CACHE_DISK_MB', 1024)) * 1024 * 1024
+        )
+
+    @staticmethod
+    def make_key(data, params, namespace=''):
+        """根据输入字节和参数生成缓存键"""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(namespace.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_or_compute(self, key, compute):
+        """返回 (结果, 来源)，来源为 memory / disk / coalesced / computed"""
+        with self._lock:
+            value = self._get_memory(key)
+            if value is not None:
+                count_cache_request(self.name, 'hit_memory')
+                return value, 'memory'
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            # 相同请求正在计算，等待其结果
+            flight.done.wait()
+            count_cache_request(self.name, 'coalesced')
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        source = 'computed'
+        try:
+            if self.disk_dir:
+                with self._disk_lock(key):
+                    value = self._get_disk(key)
+                    if value is not None:
+                        source = 'disk'
+                    else:
+                        value = compute()
+                        self._put_disk(key, value)
+            else:
+                value = compute()
+
+            with self._lock:
+                self._put_memory(key, value)
+            flight.value = value
+            count_cache_request(self.name, 'hit_disk' if source == 'disk' else 'miss')
+            return value, source
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            count_cache_eviction(self.name, 'memory')
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f'{key}.pkl'
+
+    @contextmanager
+    def _disk_lock(self, key):
+        """文件锁，保证同一节点上只有一个worker计算该键
+
+        锁文件按键前缀分为4096组且不删除，避免删除锁文件导致两个进程同时持锁。
+        """
+        lock_path = self.disk_dir / 'locks' / f'{key[:3]}.lock'
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _get_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _put_disk(self, key, value):
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        self._disk_writes += 1
+        if self._disk_writes % 32 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """磁盘层超过容量时删除最旧的条目"""
+        files = []
+        for path in self.disk_dir.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # 已被其他worker删除
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            count_cache_eviction(self.name, 'disk')
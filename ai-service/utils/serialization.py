@@ -0,0 +1,135 @@
+import json
+import numbers
+
+import msgpack
+import numpy as np
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# 数值列表长度达到该值时在二进制格式中打包为定长数组
+PACK_MIN_LENGTH = 8
+
+
+def _json_default(obj):
+    """JSON编码NumPy类型"""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_json(data, pretty=False):
+    """编码为JSON字节
+
+    与 Flask jsonify 的默认输出逐字节一致（键排序、ASCII转义、紧凑分隔符、末尾换行），
+    并直接处理NumPy标量和数组，使用标准库的C编码器。
+    """
+    if pretty:
+        text = json.dumps(data, indent=2, separators=(', ', ': '), sort_keys=True,
+                          ensure_ascii=True, default=_json_default)
+    else:
+        text = json.dumps(data, separators=(',', ':'), sort_keys=True,
+                          ensure_ascii=True, default=_json_default)
+    return (text + '\n').encode('ascii')
+
+
+def _pack_array(array):
+    """定长数组：{'dtype', 'shape', 'data'}，data 为小端字节"""
+    array = np.ascontiguousarray(array)
+    if array.dtype == np.float64:
+        array = array.astype('<f4')
+    elif array.dtype == np.int64:
+        array = array.astype('<i4') if np.abs(array).max(initial=0) < 2 ** 31 else array.astype('<i8')
+    elif array.dtype == np.bool_:
+        array = array.astype('u1')
+    array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+    return {
+        'dtype': array.dtype.name,
+        'shape': list(array.shape),
+        'data': array.tobytes()
+    }
+
+
+def _is_number(value):
+    return isinstance(value, (numbers.Real, np.number, np.bool_))
+
+
+def _columnar(records):
+    """结构相同的字典列表转为列式 {'records': n, 'columns': {...}}，不满足条件时返回None"""
+    first = records[0]
+    keys = first.keys()
+    if not all(isinstance(r, dict) and r.keys() == keys for r in records):
+        return None
+
+    columns = {}
+    for key in keys:
+        values = [r[key] for r in records]
+        if all(_is_number(v) for v in values):
+            columns[key] = _pack_array(np.asarray(values))
+        elif all(isinstance(v, dict) for v in values):
+            nested = _columnar(values)
+            if nested is None:
+                return None
+            columns[key] = nested
+        else:
+            return None
+    return {'records': len(records), 'columns': columns}
+
+
+def pack(obj):
+    """将结果中的逐帧序列转为紧凑表示，用于二进制响应
+
+    - NumPy数组和长度不小于 PACK_MIN_LENGTH 的数值列表 -> 定长数组
+    - 结构相同的数值字典列表（如 posture_scores）-> 列式数组
+    """
+    if isinstance(obj, np.ndarray):
+        return _pack_array(obj)
+    if isinstance(obj, dict):
+        return {key: pack(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        if len(obj) >= PACK_MIN_LENGTH:
+            if all(_is_number(v) for v in obj):
+                return _pack_array(np.asarray(obj))
+            if isinstance(obj[0], dict):
+                columns = _columnar(obj)
+                if columns is not None:
+                    return columns
+        return [pack(value) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def dumps_msgpack(data):
+    """编码为msgpack字节，逐帧序列打包为定长数组"""
+    return msgpack.packb(pack(data), use_bin_type=True)
+
+
+def negotiate(accept_mimetypes):
+    """根据 Accept 头选择响应格式，默认JSON"""
+    best = accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return best if best in MSGPACK_MIMETYPES else JSON_MIMETYPE
+
+
+def wants_ndjson(accept_mimetypes):
+    """客户端是否通过 Accept 头请求 NDJSON 流"""
+    return accept_mimetypes.best_match((JSON_MIMETYPE, NDJSON_MIMETYPE)) == NDJSON_MIMETYPE
+
+
+def dumps_ndjson(event):
+    """编码为一行JSON（以换行结尾），用于NDJSON流"""
+    return dumps_json(event)
+
+
+def serialize(data, mimetype, pretty=False):
+    """按指定格式编码，返回字节"""
+    if mimetype in MSGPACK_MIMETYPES:
+        return dumps_msgpack(data)
+    return dumps_json(data, pretty)
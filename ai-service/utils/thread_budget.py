@@ -0,0 +1,170 @@
+import math
+import os
+from pathlib import Path
+
+# 在库导入时读取线程数的环境变量（OpenMP/BLAS 线程池、TensorFlow 线程池）
+BLAS_ENV_VARS = (
+    'OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS'
+)
+
+POLICIES = ('balanced', 'throughput', 'latency')
+
+# 当前进程生效的预算
+_applied = None
+
+
+def cpu_quota():
+    """容器可用的CPU数：cgroup CPU配额、CPU亲和性和核数中的最小值（可为小数）"""
+    limits = [float(os.cpu_count() or 1)]
+    if hasattr(os, 'sched_getaffinity'):
+        limits.append(float(len(os.sched_getaffinity(0))))
+
+    # cgroup v2: "配额 周期" 或 "max 周期"
+    cpu_max = Path('/sys/fs/cgroup/cpu.max')
+    # cgroup v1
+    quota_path = Path('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period_path = Path('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    try:
+        if cpu_max.exists():
+            quota, period = cpu_max.read_text().split()[:2]
+            if quota != 'max':
+                limits.append(int(quota) / int(period))
+        elif quota_path.exists() and period_path.exists():
+            quota = int(quota_path.read_text())
+            if quota > 0:
+                limits.append(quota / int(period_path.read_text()))
+    except (OSError, ValueError):
+        pass
+    return min(limits)
+
+
+def available_cpus():
+    """线程预算使用的CPU数，CPU_BUDGET 覆盖检测值"""
+    return float(os.getenv('CPU_BUDGET') or cpu_quota())
+
+
+class ThreadBudget:
+    """CPU线程预算：按可用CPU和worker进程数为各库分配线程
+
+    - balanced：每个worker的库线程数为 CPU/worker 数，单个请求可用满本worker的份额
+    - throughput：库内不并行（1线程），并行来自多个worker和gthread线程上的并发请求
+    - latency：在 balanced 基础上允许2个 inter-op 线程，降低单个请求的延迟
+    MediaPipe 没有线程数接口，开启 pin 时将各worker绑定到互不重叠的CPU上以限制其执行器。
+    """
+
+    def __init__(self, cpus, workers=1, policy='balanced', pin=False, overrides=None):
+        if policy not in POLICIES:
+            raise ValueError(f'不支持的线程策略: {policy}')
+        self.cpus = cpus
+        self.workers = max(1, workers)
+        self.policy = policy
+        self.pin = pin
+
+        share = max(1, math.floor(cpus / self.workers))
+        threads = 1 if policy == 'throughput' else share
+        self.config = {
+            'intra_op': threads,                                   # TF/PyTorch 算子内并行、OpenMP/BLAS
+            'inter_op': min(2, share) if policy == 'latency' else 1,  # TF/PyTorch 算子间并行
+            'opencv': threads,                                     # OpenCV 线程池
+            'classifier': threads                                  # 姿态分类 TFLite 解释器
+        }
+        if overrides:
+            self.config.update({k: v for k, v in overrides.items() if v})
+
+    @classmethod
+    def from_env(cls, workers=None, role='worker'):
+        """从环境变量创建
+
+        CPU_BUDGET 覆盖检测到的CPU数，THREAD_POLICY 选择策略，THREAD_PIN=1 开启CPU绑定，
+        THREADS_INTRA_OP / THREADS_INTER_OP / THREADS_OPENCV 直接指定线程数。
+        启用推理服务时推理服务进程（role='inference_server'）获得全部预算，web worker 各1线程。
+        """
+        cpus = available_cpus()
+        if workers is None:
+            workers = int(os.getenv('WEB_CONCURRENCY', 1))
+        overrides = {
+            'intra_op': int(os.getenv('THREADS_INTRA_OP', 0)),
+            'inter_op': int(os.getenv('THREADS_INTER_OP', 0)),
+            'opencv': int(os.getenv('THREADS_OPENCV', 0))
+        }
+        if role == 'inference_server':
+            workers = 1
+        elif os.getenv('INFERENCE_SERVER_SOCKET'):
+            # 模型推理在推理服务中执行，worker 只做解码和后处理
+            overrides = {'intra_op': 1, 'inter_op': 1, 'opencv': 1, 'classifier': 1}
+        return cls(
+            cpus, workers,
+            policy=os.getenv('THREAD_POLICY', 'balanced'),
+            pin=os.getenv('THREAD_PIN', '0') == '1',
+            overrides=overrides
+        )
+
+    def environ(self):
+        """库导入前需要设置的环境变量"""
+        env = {name: str(self.config['intra_op']) for name in BLAS_ENV_VARS}
+        env.update({
+            'TF_NUM_INTRAOP_THREADS': str(self.config['intra_op']),
+            'TF_NUM_INTEROP_THREADS': str(self.config['inter_op']),
+            'POSE_CLASSIFIER_THREADS': str(self.config['classifier'])
+        })
+        return env
+
+    def cpu_set(self, slot):
+        """第 slot 个worker绑定的CPU集合"""
+        available = sorted(os.sched_getaffinity(0))
+        share = max(1, len(available) // self.workers)
+        start = (slot % self.workers) * share
+        return set(available[start:start + share]) or set(available)
+
+    def apply(self, slot=None, override=False):
+        """在本进程生效：设置环境变量（已显式设置的保留，override 时覆盖）、OpenCV 线程数和CPU绑定
+
+        需在导入 TensorFlow、PyTorch 和 numpy 之前调用。
+        """
+        global _applied
+        for name, value in self.environ().items():
+            if override:
+                os.environ[name] = value
+            else:
+                os.environ.setdefault(name, value)
+
+        import cv2
+        cv2.setNumThreads(self.config['opencv'])
+
+        if self.pin and slot is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpu_set(slot))
+        _applied = self
+        return self
+
+    def to_dict(self):
+        return {'cpus': self.cpus, 'workers': self.workers, 'policy': self.policy,
+                'pin': self.pin, **self.config}
+
+
+def configure_torch(torch):
+    """按当前预算设置 PyTorch 线程数，在导入 torch 后、首次推理前调用"""
+    if _applied is None:
+        return
+    torch.set_num_threads(_applied.config['intra_op'])
+    try:
+        torch.set_num_interop_threads(_applied.config['inter_op'])
+    except RuntimeError:
+        # inter-op 线程池已启动后不能再修改
+        pass
+
+
+def candidate_splits(cpus):
+    """自动调优的候选划分：(worker数, 每worker库线程数)，乘积不超过CPU数"""
+    total = max(1, math.floor(cpus))
+    splits = []
+    for workers in range(1, total + 1):
+        threads = total // workers
+        if (workers, threads) not in splits and (workers == total or total % workers == 0):
+            splits.append((workers, threads))
+    return splits
+
+
+def current():
+    """本进程生效的预算，未设置时为None"""
+    return _applied
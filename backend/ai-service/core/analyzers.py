@@ -0,0 +1,131 @@
+"""
+分析器执行池
+
+分析器实现位于仓库的 ai-service 目录，CPU密集的推理在有界线程池中执行。
+每个池共用一个分析器实例（与 Flask 服务相同）：PoseAnalyzer 为每个并发调用分配独立的
+MediaPipe 实例，模型权重、热更新轮询线程和推理服务会话不随线程数重复创建。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 分析器代码目录，默认为仓库根目录下的 ai-service
+ANALYZER_ROOT = Path(
+    os.environ.get("AI_ANALYZER_ROOT", Path(__file__).resolve().parents[3] / "ai-service")
+)
+if str(ANALYZER_ROOT) not in sys.path:
+    sys.path.insert(0, str(ANALYZER_ROOT))
+
+
+def _create_pose_analyzer():
+    from pose_analysis.pose_analyzer import PoseAnalyzer
+
+    return PoseAnalyzer()
+
+
+def _create_target_analyzer():
+    from target_analysis.target_analyzer import TargetAnalyzer
+
+    return TargetAnalyzer()
+
+
+class AnalyzerPool:
+    """有界推理线程池，池内线程共用一个懒加载的分析器实例"""
+
+    def __init__(self, name: str, factory, max_workers: int):
+        self.name = name
+        self.factory = factory
+        self.max_workers = max_workers
+        self._instance = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-analyzer"
+        )
+
+    def _analyzer(self):
+        if self._instance is None:
+            with self._lock:
+                # 首批并发请求只创建一个实例
+                if self._instance is None:
+                    self._instance = self.factory()
+        return self._instance
+
+    def _call(self, method: str, args):
+        return getattr(self._analyzer(), method)(*args)
+
+    async def run(self, method: str, *args):
+        """在推理线程中调用分析器方法，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, method, args)
+
+    async def call(self, fn, *args):
+        """在推理线程中执行 fn(analyzer, *args)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: fn(self._analyzer(), *args)
+        )
+
+    async def stream(self, fn, *args, buffer: int = 16):
+        """在推理线程中迭代 fn(analyzer, *args) 返回的生成器，异步逐项产出
+
+        整个生成器在同一个推理线程中执行（生成器持有的跟踪实例不可跨线程使用），
+        通过有界队列转交给事件循环；消费方提前退出时停止生成。
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=buffer)
+        stopped = threading.Event()
+        end = object()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            iterator = None
+            try:
+                # 分析器创建失败或生成器首项之前的异常同样转交给消费方，避免其一直等待
+                iterator = fn(self._analyzer(), *args)
+                for item in iterator:
+                    if stopped.is_set():
+                        return
+                    put((item, None))
+            except Exception as e:
+                if not stopped.is_set():
+                    put((end, e))
+                return
+            finally:
+                # 生成器提前结束时释放其持有的跟踪实例
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            if not stopped.is_set():
+                put((end, None))
+
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is end:
+                    if error is not None:
+                        raise error
+                    break
+                yield item
+        finally:
+            stopped.set()
+            # 释放可能阻塞在队列上的生产线程
+            while not queue.empty():
+                queue.get_nowait()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+pose_pool = AnalyzerPool(
+    "pose", _create_pose_analyzer, int(os.environ.get("POSE_WORKERS", 2))
+)
+target_pool = AnalyzerPool(
+    "target", _create_target_analyzer, int(os.environ.get("TARGET_WORKERS", 2))
+)
@@ -0,0 +1,27 @@
+"""
+错误处理，响应格式与 Flask 版 AI 服务的 APIError 一致
+"""
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+class APIError(Exception):
+    """API错误基类"""
+
+    def __init__(self, message: str, status_code: int = 400, payload: dict = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.payload = payload
+
+    def to_dict(self):
+        rv = dict(self.payload or ())
+        rv["message"] = self.message
+        rv["status"] = "error"
+        return rv
+
+
+async def api_error_handler(request: Request, error: APIError):
+    """错误处理器"""
+    return JSONResponse(error.to_dict(), status_code=error.status_code)
@@ -0,0 +1,31 @@
+"""
+分析结果响应，复用 ai-service 的序列化层（JSON 与 Flask 输出逐字节一致，可选 msgpack）
+"""
+
+from fastapi import Request
+from fastapi.responses import Response
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import core.analyzers  # noqa: F401  确保分析器代码目录已加入 sys.path
+from utils import serialization
+
+
+def accept_mimetypes(request: Request) -> MIMEAccept:
+    """解析 Accept 头（含 q 值），与 Flask 的 request.accept_mimetypes 一致"""
+    return parse_accept_header(request.headers.get("accept"), MIMEAccept)
+
+
+def negotiate(request: Request) -> str:
+    """根据 Accept 头选择响应格式"""
+    return serialization.negotiate(accept_mimetypes(request))
+
+
+def analysis_response(request: Request, result) -> Response:
+    """序列化分析结果"""
+    mimetype = negotiate(request)
+    return Response(
+        content=serialization.serialize(result, mimetype),
+        media_type=mimetype,
+        headers={"Vary": "Accept"},
+    )
@@ -0,0 +1,94 @@
+"""
+上传文件处理
+
+分块读取上传内容，并适配分析器期望的 werkzeug 文件接口（save() / stream）。
+"""
+
+import io
+import os
+import shutil
+import tempfile
+
+from fastapi import UploadFile
+
+from core.errors import APIError
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SavedUpload:
+    """已落盘的上传文件，save() 通过重命名移交给分析器，避免再次复制"""
+
+    def __init__(self, path: str, filename: str):
+        self.path = path
+        self.filename = filename
+
+    def save(self, destination: str):
+        try:
+            os.replace(self.path, destination)
+        except OSError:
+            shutil.move(self.path, destination)
+
+    def cleanup(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class MemoryUpload:
+    """内存中的上传文件（图片、帧）"""
+
+    def __init__(self, data: bytes, filename: str):
+        self.data = data
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+
+def require_file(upload: UploadFile, missing_message: str):
+    """校验上传文件，与 Flask 接口的错误信息保持一致"""
+    if upload is None:
+        raise APIError(missing_message, 400)
+    if not upload.filename:
+        raise APIError("未选择文件", 400)
+
+
+async def save_upload(upload: UploadFile, suffix: str = "") -> SavedUpload:
+    """分块将上传内容写入临时文件"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        await upload.close()
+    return SavedUpload(path, upload.filename)
+
+
+async def read_upload(upload: UploadFile) -> MemoryUpload:
+    """分块读取上传内容到内存"""
+    buffer = io.BytesIO()
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.write(chunk)
+    finally:
+        await upload.close()
+    return MemoryUpload(buffer.getvalue(), upload.filename)
+
+
+def decode_image(data: bytes):
+    """解码图片字节为 BGR 数组"""
+    import cv2
+    import numpy as np
+
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("无法解码图像")
+    return frame
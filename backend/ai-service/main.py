@@ -15,10 +15,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 # 导入各个模块的路由
-from pose.router import router as pose_router
-from motion.router import router as motion_router
-from target.router import router as target_router
+from pose.router import (
+    router as pose_router,
+    analyze_pose,
+    analyze_pose_consistency,
+    analyze_pose_lanes,
+    export_pose_analyses,
+)
+from motion.router import router as motion_router, analyze_realtime, realtime_stream
+from target.router import router as target_router, analyze_target, analyze_target_session
 from recommendation.router import router as recommendation_router
+from core.analyzers import pose_pool, target_pool
+from core.errors import APIError, api_error_handler
 
 # 配置日志
 logging.basicConfig(
@@ -49,6 +57,29 @@ app.include_router(motion_router, prefix="/api/motion", tags=["动作分析"])
 app.include_router(target_router, prefix="/api/target", tags=["箭靶分析"])
 app.include_router(recommendation_router, prefix="/api/recommendation", tags=["建议生成"])
 
+# 兼容 Flask 版 AI 服务的接口路径（后端通过这些路径调用）
+app.add_api_route("/analyze/pose", analyze_pose, methods=["POST"], tags=["姿态估计"])
+app.add_api_route("/analyze/target", analyze_target, methods=["POST"], tags=["箭靶分析"])
+app.add_api_route("/analyze/target/session", analyze_target_session, methods=["POST"], tags=["箭靶分析"])
+app.add_api_route("/analyze/realtime", analyze_realtime, methods=["POST"], tags=["动作分析"])
+app.add_api_route("/analyze/lanes", analyze_pose_lanes, methods=["POST"], tags=["姿态估计"])
+app.add_api_route("/analyze/consistency", analyze_pose_consistency, methods=["POST"], tags=["姿态估计"])
+app.add_api_route("/analyses/export", export_pose_analyses, methods=["GET"], tags=["姿态估计"])
+app.add_api_route("/analyses/{analysis_id}/export", export_pose_analyses, methods=["GET"], tags=["姿态估计"])
+app.add_api_websocket_route("/ws/realtime", realtime_stream)
+
+# 注册错误处理器
+app.add_exception_handler(APIError, api_error_handler)
+
+
+@app.on_event("shutdown")
+async def shutdown_analyzers():
+    """
+    关闭推理线程池
+    """
+    pose_pool.shutdown()
+    target_pool.shutdown()
+
 
 class HealthResponse(BaseModel):
     status: str
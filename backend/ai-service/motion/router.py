@@ -0,0 +1,175 @@
+"""
+动作分析路由（实时帧分析）
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import APIRouter, File, Form, Request, UploadFile, WebSocket, WebSocketDisconnect
+
+from core.analyzers import pose_pool, target_pool
+from core.errors import APIError
+from core.uploads import MemoryUpload
+from motion.streaming import LatestFrameSlot, PendingFrame, StreamStats
+from pose.router import _analyze_frame_bytes, analyze_pose_frame
+from target.router import analyze_target_frame
+from utils import serialization
+
+logger = logging.getLogger("ai-service")
+
+router = APIRouter()
+
+STREAM_TYPES = ("pose", "target")
+
+
+@router.post("/realtime")
+async def analyze_realtime(
+    request: Request,
+    frame: UploadFile = File(None),
+    type: str = Form("pose"),
+):
+    """
+    实时分析接口
+    """
+    if type == "pose":
+        return await analyze_pose_frame(request, frame)
+    if type == "target":
+        return await analyze_target_frame(request, frame)
+    raise APIError("不支持的分析类型", 400)
+
+
+async def _analyze_stream_frame(analysis_type: str, data: bytes):
+    """在推理线程池中分析一帧"""
+    if analysis_type == "pose":
+        return await pose_pool.call(_analyze_frame_bytes, data)
+    return await target_pool.run("analyze_frame", MemoryUpload(data, "frame"))
+
+
+class _StreamSession:
+    """一个 WebSocket 实时分析会话"""
+
+    def __init__(self, websocket: WebSocket, analysis_type: str, mimetype: str):
+        self.websocket = websocket
+        self.analysis_type = analysis_type
+        self.mimetype = mimetype
+        self.slot = LatestFrameSlot()
+        self.stats = StreamStats()
+        self._send_lock = asyncio.Lock()
+        self._seq = 0
+
+    async def send(self, message: dict):
+        data = serialization.serialize(message, self.mimetype)
+        async with self._send_lock:
+            if self.mimetype == serialization.JSON_MIMETYPE:
+                await self.websocket.send_text(data.decode("ascii"))
+            else:
+                await self.websocket.send_bytes(data)
+
+    async def receive_frames(self):
+        """接收帧写入单槽缓冲，处理跟不上时覆盖旧帧"""
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    self._seq += 1
+                    now = time.monotonic()
+                    self.stats.frame_received(now)
+                    if self.slot.put(PendingFrame(self._seq, message["bytes"], now)) is not None:
+                        self.stats.frame_dropped()
+                elif message.get("text") is not None:
+                    await self.handle_control(message["text"])
+        finally:
+            self.slot.close()
+
+    async def handle_control(self, text: str):
+        """控制消息：{"type": "pose"|"target"} 切换分析类型，{"action": "stats"} 查询统计"""
+        try:
+            control = json.loads(text)
+        except ValueError:
+            await self.send({"status": "error", "message": "无效的控制消息"})
+            return
+
+        analysis_type = control.get("type")
+        if analysis_type is not None:
+            if analysis_type not in STREAM_TYPES:
+                await self.send({"status": "error", "message": "不支持的分析类型"})
+                return
+            self.analysis_type = analysis_type
+        if control.get("action") == "stats":
+            await self.send({"status": "stats", "stats": self.stats.to_dict()})
+
+    async def process_frames(self):
+        """逐个处理最新帧并推送结果"""
+        while True:
+            frame = await self.slot.get()
+            if frame is None:
+                break
+
+            start = time.monotonic()
+            try:
+                result = await _analyze_stream_frame(self.analysis_type, frame.data)
+            except Exception as e:
+                self.stats.frame_failed()
+                logger.debug(f"实时分析失败: {str(e)}")
+                await self.send({"status": "error", "frame": frame.seq, "message": "实时分析失败"})
+                continue
+
+            now = time.monotonic()
+            self.stats.frame_processed(
+                now, (now - start) * 1000, (now - frame.received_at) * 1000
+            )
+            await self.send({
+                "status": "success",
+                "frame": frame.seq,
+                "type": self.analysis_type,
+                "result": result,
+                "stats": self.stats.to_dict(),
+            })
+
+
+@router.websocket("/ws")
+async def realtime_stream(websocket: WebSocket, type: str = "pose", format: str = "json"):
+    """
+    实时分析流接口
+
+    客户端以二进制消息推送编码后的帧（JPEG/PNG），服务端逐帧返回分析结果及会话统计。
+    推理跟不上时只处理最新一帧，其余帧丢弃并计入 dropped。
+    """
+    await websocket.accept()
+    mimetype = (
+        serialization.MSGPACK_MIMETYPES[0] if format == "msgpack" else serialization.JSON_MIMETYPE
+    )
+    session = _StreamSession(websocket, type, mimetype)
+    if type not in STREAM_TYPES:
+        await session.send({"status": "error", "message": "不支持的分析类型"})
+        await websocket.close(code=1008)
+        return
+
+    # 接收与推理并行：推理期间到达的帧只保留最新一帧
+    receiver = asyncio.create_task(session.receive_frames())
+    processor = asyncio.create_task(session.process_frames())
+    try:
+        # 客户端断开或推送结果出错时结束会话，不再接收无人应答的帧
+        await asyncio.wait((receiver, processor), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        failed = False
+        for task in (receiver, processor):
+            task.cancel()
+        for task in (receiver, processor):
+            try:
+                await task
+            except (asyncio.CancelledError, WebSocketDisconnect):
+                pass
+            except Exception:
+                failed = True
+                logger.exception("实时分析会话异常")
+        if failed:
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+        logger.info(f"实时分析会话结束: {session.stats.to_dict()}")
@@ -0,0 +1,113 @@
+"""
+实时帧流会话
+
+客户端通过 WebSocket 持续推送编码后的帧，每个会话只保留最新的一帧待处理：
+推理跟不上时旧帧直接丢弃（最新帧优先），反馈延迟不会随排队增长。
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass
+class PendingFrame:
+    """待处理的帧"""
+
+    seq: int
+    data: bytes
+    received_at: float
+
+
+class LatestFrameSlot:
+    """单槽缓冲：写入新帧时覆盖尚未处理的旧帧"""
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def put(self, frame: PendingFrame):
+        """放入新帧，返回被覆盖丢弃的旧帧（没有则为 None）"""
+        dropped = self._frame
+        self._frame = frame
+        self._ready.set()
+        return dropped
+
+    async def get(self):
+        """等待并取出最新帧，会话关闭且无待处理帧时返回 None"""
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+
+
+class StreamStats:
+    """会话统计：接收/处理/丢弃帧数、帧率和延迟"""
+
+    def __init__(self, window: float = 2.0):
+        self.window = window
+        self.started_at = time.monotonic()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self._received_times = deque()
+        self._processed_times = deque()
+        self._inference_ms = 0.0
+        self._latency_ms = 0.0
+
+    def _trim(self, times: deque, now: float):
+        while times and now - times[0] > self.window:
+            times.popleft()
+
+    def _fps(self, times: deque, now: float) -> float:
+        """最近窗口内的帧率，按首末帧间隔计算"""
+        self._trim(times, now)
+        if len(times) < 2:
+            return 0.0
+        span = times[-1] - times[0]
+        return (len(times) - 1) / span if span > 0 else 0.0
+
+    def frame_received(self, now: float):
+        self.received += 1
+        self._received_times.append(now)
+        self._trim(self._received_times, now)
+
+    def frame_dropped(self):
+        self.dropped += 1
+
+    def frame_processed(self, now: float, inference_ms: float, latency_ms: float):
+        self.processed += 1
+        self._processed_times.append(now)
+        self._trim(self._processed_times, now)
+        # 指数滑动平均
+        alpha = 0.2 if self.processed > 1 else 1.0
+        self._inference_ms += alpha * (inference_ms - self._inference_ms)
+        self._latency_ms += alpha * (latency_ms - self._latency_ms)
+
+    def frame_failed(self):
+        self.errors += 1
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "drop_rate": self.dropped / self.received if self.received else 0.0,
+            "input_fps": round(self._fps(self._received_times, now), 2),
+            "output_fps": round(self._fps(self._processed_times, now), 2),
+            "inference_ms": round(self._inference_ms, 2),
+            "latency_ms": round(self._latency_ms, 2),
+            "duration_seconds": round(now - self.started_at, 2),
+        }
@@ -0,0 +1,217 @@
+"""
+姿态估计路由
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, File, Form, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+from core.analyzers import pose_pool
+from core.errors import APIError
+from core.responses import accept_mimetypes, analysis_response
+from core.uploads import decode_image, read_upload, require_file, save_upload
+from pose_analysis.frame_store import EXPORT_MIMETYPES
+from pose_analysis.lane_analyzer import parse_lanes
+from pose_analysis.shot_consistency import collect_shots
+from utils import serialization
+
+logger = logging.getLogger("ai-service")
+
+router = APIRouter()
+
+
+def _iter_video_analysis(analyzer, upload, params):
+    return analyzer.iter_video_analysis(upload, params)
+
+
+async def _stream_events(label: str, events):
+    """将分析事件逐行编码为NDJSON，出错时以 error 事件结束"""
+    try:
+        async for event in events:
+            yield serialization.dumps_ndjson(event)
+    except Exception as e:
+        logger.error(f"{label}失败: {str(e)}")
+        yield serialization.dumps_ndjson({"event": "error", "message": f"{label}失败"})
+
+
+def _wants_stream(request: Request, stream: str) -> bool:
+    """stream=true 或 Accept 头请求 NDJSON 时使用流式响应"""
+    if stream.lower() == "true":
+        return True
+    return serialization.wants_ndjson(accept_mimetypes(request))
+
+
+def _analyze_frame_bytes(analyzer, data: bytes):
+    """在推理线程中解码并分析单帧"""
+    return analyzer.analyze_frame(decode_image(data))
+
+
+@router.post("/analyze")
+async def analyze_pose(
+    request: Request,
+    video: UploadFile = File(None),
+    extract_frames: str = Form("true"),
+    frame_rate: int = Form(30),
+    save_keyframes: str = Form("true"),
+    tracking: str = Form("full"),
+    anchor_interval: int = Form(10),
+    stream: str = Form("false"),
+    deadline: float = Form(None),
+    frame_format: str = Form("records"),
+):
+    """
+    姿态分析接口（视频）
+    """
+    require_file(video, "未找到视频文件")
+
+    # 分析参数
+    params = {
+        "extract_frames": extract_frames.lower() == "true",
+        "frame_rate": frame_rate,
+        "save_keyframes": save_keyframes.lower() == "true",
+        "tracking": tracking,
+        "anchor_interval": anchor_interval,
+        "deadline": deadline,  # 限时（秒），到期返回已分析部分的结果
+        "frame_format": frame_format,  # records: 逐帧字典列表, columnar: 列式数组
+    }
+
+    upload = await save_upload(video, suffix=".mp4")
+
+    # 流式模式：逐帧以NDJSON返回分数和角度，最后返回总体分析和建议
+    if _wants_stream(request, stream):
+        events = pose_pool.stream(_iter_video_analysis, upload, params)
+        return StreamingResponse(
+            _stream_events("姿态分析", events),
+            media_type=serialization.NDJSON_MIMETYPE,
+            headers={"X-Accel-Buffering": "no"},
+            background=BackgroundTask(upload.cleanup),
+        )
+
+    try:
+        result = await pose_pool.run("analyze_video", upload, params)
+    except Exception as e:
+        logger.error(f"姿态分析失败: {str(e)}")
+        raise APIError("姿态分析失败", 500)
+    finally:
+        upload.cleanup()
+
+    return analysis_response(request, result)
+
+
+@router.post("/frame")
+async def analyze_pose_frame(request: Request, frame: UploadFile = File(None)):
+    """
+    单帧姿态分析接口
+    """
+    require_file(frame, "未找到帧图像")
+    upload = await read_upload(frame)
+
+    try:
+        result = await pose_pool.call(_analyze_frame_bytes, upload.data)
+    except Exception as e:
+        logger.error(f"实时分析失败: {str(e)}")
+        raise APIError("实时分析失败", 500)
+
+    return analysis_response(request, result)
+
+
+def _analyze_lanes_bytes(analyzer, data: bytes, lanes):
+    """在推理线程中解码并做多人泳道分析"""
+    return analyzer.analyze_lanes(decode_image(data), lanes)
+
+
+@router.post("/lanes")
+async def analyze_pose_lanes(
+    request: Request,
+    frame: UploadFile = File(None),
+    lanes: str = Form(None),
+):
+    """
+    多人泳道姿态分析接口：lanes 为泳道归一化区域的JSON数组，省略时自动检测射手
+    """
+    require_file(frame, "未找到帧图像")
+    try:
+        parsed_lanes = parse_lanes(lanes)
+    except (ValueError, TypeError) as e:
+        raise APIError(f"泳道配置无效: {str(e)}", 400)
+    upload = await read_upload(frame)
+
+    try:
+        result = await pose_pool.call(_analyze_lanes_bytes, upload.data, parsed_lanes)
+    except ValueError as e:
+        raise APIError(str(e), 400)
+    except Exception as e:
+        logger.error(f"泳道分析失败: {str(e)}")
+        raise APIError("泳道分析失败", 500)
+
+    return analysis_response(request, result)
+
+
+class ConsistencyRequest(BaseModel):
+    shots: Optional[List[Dict[str, Any]]] = None
+    analyses: Optional[List[Dict[str, Any]]] = None
+    phases: Optional[List[Tuple[str, float]]] = None
+
+
+def _analyze_consistency(analyzer, body: ConsistencyRequest):
+    """在推理线程中整理射次并做一致性比较"""
+    shots = collect_shots(body.shots, body.analyses)
+    return analyzer.analyze_consistency(shots, body.phases)
+
+
+@router.post("/consistency")
+async def analyze_pose_consistency(request: Request, body: ConsistencyRequest):
+    """
+    多射次一致性比较接口：shots 为各射次的关节角度序列，analyses 为带逐帧角度序列的姿态分析结果
+    """
+    try:
+        result = await pose_pool.call(_analyze_consistency, body)
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f"射次数据无效: {str(e)}", 400)
+    except Exception as e:
+        logger.error(f"一致性分析失败: {str(e)}")
+        raise APIError("一致性分析失败", 500)
+
+    return analysis_response(request, result)
+
+
+def _export_analyses(analyzer, analysis_ids, fmt: str):
+    """在推理线程中将逐帧分析结果导出到临时文件"""
+    if analyzer.store is None:
+        raise KeyError("未启用分析结果存储")
+    return analyzer.store.export_file(analysis_ids or analyzer.store.ids(), fmt)
+
+
+@router.get("/analyses/export")
+@router.get("/analyses/{analysis_id}/export")
+async def export_pose_analyses(analysis_id: str = None, ids: str = "", format: str = "arrow"):
+    """
+    导出逐帧分析结果：format 为 arrow（Arrow IPC 文件）或 parquet，ids 为逗号分隔的分析ID，省略时导出全部
+    """
+    if format not in EXPORT_MIMETYPES:
+        raise APIError("不支持的导出格式", 400)
+    analysis_ids = [analysis_id] if analysis_id else [i for i in ids.split(",") if i]
+
+    try:
+        output = await pose_pool.call(_export_analyses, analysis_ids, format)
+    except KeyError as e:
+        raise APIError(e.args[0], 404)
+    except ValueError as e:
+        raise APIError(str(e), 400)
+    except ImportError as e:
+        raise APIError(str(e), 501)
+    except Exception as e:
+        logger.error(f"导出分析结果失败: {str(e)}")
+        raise APIError("导出分析结果失败", 500)
+
+    # 临时文件在响应结束后关闭并删除
+    return StreamingResponse(
+        iter(lambda: output.read(1 << 20), b""),
+        media_type=EXPORT_MIMETYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{analysis_id or "analyses"}.{format}"'},
+        background=BackgroundTask(output.close),
+    )
@@ -0,0 +1,47 @@
+"""
+建议生成路由
+"""
+
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter
+from pydantic import BaseModel
+
+from core.analyzers import pose_pool, target_pool
+
+router = APIRouter()
+
+
+class PoseAnalysis(BaseModel):
+    stability: float
+    consistency: float
+    accuracy: float
+
+
+class TargetAnalysis(BaseModel):
+    average_score: float
+    grouping: Optional[Dict[str, Any]] = None
+
+
+@router.post("/pose")
+async def pose_recommendations(analysis: PoseAnalysis):
+    """
+    根据视频总体分析结果生成姿态建议
+    """
+    recommendations = await pose_pool.call(
+        lambda analyzer, data: analyzer._generate_recommendations(data),
+        analysis.model_dump(),
+    )
+    return {"recommendations": recommendations}
+
+
+@router.post("/target")
+async def target_recommendations(analysis: TargetAnalysis):
+    """
+    根据箭靶分析结果生成建议
+    """
+    recommendations = await target_pool.call(
+        lambda analyzer, data: analyzer._generate_recommendations(data),
+        analysis.model_dump(),
+    )
+    return {"recommendations": recommendations}
@@ -0,0 +1,98 @@
+"""
+箭靶分析路由
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, File, Form, Request, UploadFile
+from pydantic import BaseModel
+
+from core.analyzers import target_pool
+from core.errors import APIError
+from core.responses import analysis_response
+from core.uploads import read_upload, require_file
+from target_analysis.session_grouping import collect_impacts
+
+logger = logging.getLogger("ai-service")
+
+router = APIRouter()
+
+
+@router.post("/analyze")
+async def analyze_target(
+    request: Request,
+    image: UploadFile = File(None),
+    distance: float = Form(18),
+    target_type: str = Form("standard"),
+    detect_arrows: str = Form("true"),
+):
+    """
+    箭靶分析接口
+    """
+    require_file(image, "未找到图片文件")
+
+    # 分析参数
+    params = {
+        "distance": distance,  # 默认18米
+        "target_type": target_type,  # 靶型
+        "detect_arrows": detect_arrows.lower() == "true",
+    }
+
+    upload = await read_upload(image)
+    try:
+        result = await target_pool.run("analyze_image", upload, params)
+    except Exception as e:
+        logger.error(f"箭靶分析失败: {str(e)}")
+        raise APIError("箭靶分析失败", 500)
+
+    return analysis_response(request, result)
+
+
+@router.post("/frame")
+async def analyze_target_frame(request: Request, frame: UploadFile = File(None)):
+    """
+    箭靶实时帧分析接口
+    """
+    require_file(frame, "未找到帧图像")
+    upload = await read_upload(frame)
+
+    try:
+        result = await target_pool.run("analyze_frame", upload)
+    except Exception as e:
+        logger.error(f"实时分析失败: {str(e)}")
+        raise APIError("实时分析失败", 500)
+
+    return analysis_response(request, result)
+
+
+class SessionEndRequest(BaseModel):
+    impacts: Optional[List[List[float]]] = None
+    analysis: Optional[Dict[str, Any]] = None
+    state: Optional[Dict[str, Any]] = None
+
+
+@router.post("/session")
+async def analyze_target_session(request: Request, body: SessionEndRequest):
+    """
+    训练箭群统计接口：每组调用一次，impacts 为本组的靶面归一化落点或 analysis 为本组的箭靶分析结果，
+    state 为上一组返回的状态
+    """
+    try:
+        points = collect_impacts(body.impacts, body.analysis)
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f"落点数据无效: {str(e)}", 400)
+
+    try:
+        result = await target_pool.call(
+            lambda analyzer, points, state: analyzer.analyze_session_end(points, state),
+            points,
+            body.state,
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        raise APIError(f"箭群状态无效: {str(e)}", 400)
+    except Exception as e:
+        logger.error(f"箭群统计失败: {str(e)}")
+        raise APIError("箭群统计失败", 500)
+
+    return analysis_response(request, result)